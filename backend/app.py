@@ -13,8 +13,14 @@ from fastapi.responses import FileResponse, JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 from starlette.middleware.base import BaseHTTPMiddleware
 
+from bot import close_telegram_client, open_telegram_client
+from broadcast_jobs import broadcast_worker
 from config import settings
+from email_service import smtp_pool
+from local_cache import cache_invalidation_subscriber
+from outbox import outbox_dispatcher
 from redis_cache import redis_cache
+from report_jobs import report_worker
 from routers import (
     admin,
     admin_auth,
@@ -34,6 +40,8 @@ from routers import (
 )
 from dual_database_sync import start_dual_db_sync_background
 from startup_background import run_background_startup
+from statistics_rollups import daily_activity_refresher
+from telegram_dispatcher import telegram_dispatcher
 
 logger = logging.getLogger(__name__)
 
@@ -70,12 +78,19 @@ async def lifespan(app: FastAPI):
     """Сразу отдаёт управление ASGI — порт слушается, миграции идут в фоне."""
     app.state.startup_ready = False
     app.state.startup_error = None
+    await open_telegram_client()
+    await telegram_dispatcher.start()
 
     async def _runner() -> None:
         try:
             await run_background_startup()
             app.state.startup_ready = True
             start_dual_db_sync_background(app)
+            broadcast_worker.start()
+            report_worker.start()
+            daily_activity_refresher.start()
+            outbox_dispatcher.start()
+            cache_invalidation_subscriber.start()
         except Exception:
             logger.exception("Фоновая инициализация не удалась")
             app.state.startup_error = "startup_failed"
@@ -99,11 +114,51 @@ async def lifespan(app: FastAPI):
     except asyncio.CancelledError:
         pass
 
+    try:
+        await broadcast_worker.stop()
+    except Exception as e:
+        logger.error("Ошибка при остановке воркера рассылок: %s", e)
+
+    try:
+        await report_worker.stop()
+    except Exception as e:
+        logger.error("Ошибка при остановке воркера отчётов: %s", e)
+
+    try:
+        await daily_activity_refresher.stop()
+    except Exception as e:
+        logger.error("Ошибка при остановке пересчёта почасовой активности: %s", e)
+
+    try:
+        await outbox_dispatcher.stop()
+    except Exception as e:
+        logger.error("Ошибка при остановке диспетчера outbox: %s", e)
+
+    try:
+        await cache_invalidation_subscriber.stop()
+    except Exception as e:
+        logger.error("Ошибка при остановке подписки на инвалидацию кеша: %s", e)
+
     try:
         await redis_cache.disconnect()
     except Exception as e:
         logger.error("Ошибка при отключении от Redis: %s", e)
 
+    try:
+        await telegram_dispatcher.stop()
+    except Exception as e:
+        logger.error("Ошибка при остановке очереди Telegram: %s", e)
+
+    try:
+        await smtp_pool.close()
+    except Exception as e:
+        logger.error("Ошибка при закрытии SMTP-сессий: %s", e)
+
+    try:
+        await close_telegram_client()
+    except Exception as e:
+        logger.error("Ошибка при закрытии HTTP-клиента Telegram: %s", e)
+
 
 class StartupGateMiddleware(BaseHTTPMiddleware):
     """503 на API до готовности БД; liveness и статика проходят."""
@@ -168,6 +223,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 app.add_middleware(StartupGateMiddleware)
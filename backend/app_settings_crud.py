@@ -1,8 +1,13 @@
+import logging
+
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 import models
 import schemas
+from redis_cache import redis_cache
+
+logger = logging.getLogger(__name__)
 
 
 def app_settings_to_response(row: models.AppSettings) -> schemas.AppSettingsResponse:
@@ -49,4 +54,8 @@ async def update_app_settings(db: AsyncSession, settings_data: schemas.AppSettin
 
     await db.commit()
     await db.refresh(settings_row)
+    try:
+        await redis_cache.clear_all_users_key("app_settings")
+    except Exception as e:
+        logger.warning("Не удалось очистить кеш app_settings: %s", e)
     return settings_row
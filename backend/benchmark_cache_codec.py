@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Сравнение форматов значений RedisCache: прежний JSON-текст, кодеки cache_codec
+и сжатие zstd — размер записи и время кодирования/декодирования.
+
+Данные — синтетические, по форме ответов ленты (200 FeedItem) и списка
+пользователей (UserResponse). С ``--redis`` значения ещё и записываются в Redis
+и печатается MEMORY USAGE ключа (ключи замера удаляются).
+
+    python benchmark_cache_codec.py
+    python benchmark_cache_codec.py --users 5000 --redis
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Добавляем текущую директорию в путь для импорта модулей
+sys.path.append(str(Path(__file__).parent))
+
+import cache_codec
+from config import settings
+from redis_cache import redis_cache
+
+_FIRST_NAMES = ["Анна", "Иван", "Мария", "Алексей", "Ольга", "Дмитрий", "Екатерина", "Сергей"]
+_LAST_NAMES = ["Иванова", "Петров", "Смирнова", "Кузнецов", "Попова", "Соколов", "Лебедева"]
+_POSITIONS = ["Бариста", "Повар", "Официант", "Менеджер", "Администратор", "Кассир"]
+_MESSAGES = ["Спасибо за помощь!", "Выручил на смене", "Лучший наставник", None, "За отличный сервис"]
+
+
+def _user(rng: random.Random, user_id: int) -> dict:
+    registered = datetime(2024, 1, 1) + timedelta(minutes=rng.randrange(800_000))
+    return {
+        "id": user_id,
+        "telegram_id": 100_000_000 + user_id,
+        "telegram_username": f"user_{user_id}",
+        "first_name": rng.choice(_FIRST_NAMES),
+        "last_name": rng.choice(_LAST_NAMES),
+        "position": rng.choice(_POSITIONS),
+        "department": f"Ресторан №{rng.randrange(1, 40)}",
+        "balance": rng.randrange(0, 500),
+        "reserved_balance": 0,
+        "daily_transfer_count": rng.randrange(0, 3),
+        "is_admin": False,
+        "status": "approved",
+        "telegram_photo_url": None,
+        "ticket_parts": rng.randrange(0, 3),
+        "tickets": rng.randrange(0, 5),
+        "card_barcode": None,
+        "card_balance": None,
+        "phone_number": f"+7999{user_id:07d}",
+        "date_of_birth": "1995-05-17",
+        "email": f"user{user_id}@example.com",
+        "has_seen_onboarding": True,
+        "has_interacted_with_bot": True,
+        "login": None,
+        "password_plain": None,
+        "browser_auth_enabled": False,
+        "registration_date": registered.isoformat(),
+    }
+
+
+def _payloads(users: int) -> dict[str, object]:
+    rng = random.Random(42)
+    people = [_user(rng, i) for i in range(1, users + 1)]
+    short = [
+        {k: p[k] for k in ("id", "telegram_id", "first_name", "last_name", "position", "department")}
+        for p in people[:200]
+    ]
+    feed = {
+        "items": [
+            {
+                "id": 10_000 + i,
+                "amount": 1,
+                "message": rng.choice(_MESSAGES),
+                "timestamp": (datetime(2026, 10, 1) + timedelta(minutes=i * 7)).isoformat(),
+                "sender": rng.choice(short),
+                "receiver": rng.choice(short),
+            }
+            for i in range(200)
+        ],
+        "next_cursor": "2026-10-01T00:00:00|10000",
+    }
+    return {"лента (200)": feed, f"пользователи ({users})": people, "настройки": {"id": 1, "season_theme": "summer"}}
+
+
+def _formats() -> list[tuple[str, object, object]]:
+    """(название, encode, decode); первый — прежний формат (json.dumps → str)."""
+    formats = [(
+        "json (прежний)",
+        lambda v: json.dumps(v, ensure_ascii=False).encode("utf-8"),
+        cache_codec.decode,
+    )]
+    for codec in cache_codec.CODECS.values():
+        if codec.name == "raw":
+            continue
+        formats.append((codec.name, lambda v, c=codec: cache_codec.encode(v, c, 0), cache_codec.decode))
+        formats.append((
+            f"{codec.name}+zstd",
+            lambda v, c=codec: cache_codec.encode(v, c, 1),
+            cache_codec.decode,
+        ))
+    return formats
+
+
+def _timeit(fn, arg, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(arg)
+    return (time.perf_counter() - started) / repeat
+
+
+async def main(users: int, repeat: int, use_redis: bool) -> int:
+    client = None
+    if use_redis:
+        if not settings.REDIS_ENABLED:
+            print("❌ REDIS_ENABLED=false — MEMORY USAGE недоступен")
+            return 1
+        await redis_cache.connect()
+        client = redis_cache.redis_client
+    prefix = f"cache:bench_codec_{uuid.uuid4().hex[:8]}"
+
+    header = f"{'данные':<20} | {'формат':<14} | {'байт':>9} | {'encode, мкс':>11} | {'decode, мкс':>11}"
+    if client is not None:
+        header += f" | {'Redis, байт':>11}"
+    print(header)
+    print("-" * len(header))
+    try:
+        for name, payload in _payloads(users).items():
+            for index, (label, encode, decode) in enumerate(_formats()):
+                data = encode(payload)
+                assert decode(data) == payload, f"{label}: значение не совпало после декодирования"
+                line = (
+                    f"{name:<20} | {label:<14} | {len(data):>9} | "
+                    f"{_timeit(encode, payload, repeat) * 1e6:>11.1f} | {_timeit(decode, data, repeat) * 1e6:>11.1f}"
+                )
+                if client is not None:
+                    key = f"{prefix}:{index}"
+                    await client.set(key, data, ex=600)
+                    line += f" | {await client.memory_usage(key):>11}"
+                print(line)
+            print("-" * len(header))
+    finally:
+        if client is not None:
+            await redis_cache.unlink_matching(f"{prefix}:*")
+            await redis_cache.disconnect()
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сравнение форматов значений кеша Redis")
+    parser.add_argument("--users", type=int, default=1000, help="размер списка пользователей")
+    parser.add_argument("--repeat", type=int, default=200, help="повторов для замера времени")
+    parser.add_argument("--redis", action="store_true", help="записать в Redis и показать MEMORY USAGE")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.users, args.repeat, args.redis)))
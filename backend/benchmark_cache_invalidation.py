@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Замер задержки инвалидации кеша: KEYS+DEL, SCAN+UNLINK и INCR поколения.
+
+Заполняет Redis N ключами ``cache:{user_id}:{ключ замера}`` (по умолчанию 10k и
+100k), сбрасывает их каждым способом и печатает время. Ключи замера получают
+уникальное имя и удаляются после прогона; рабочие ключи не затрагиваются.
+
+    python benchmark_cache_invalidation.py
+    python benchmark_cache_invalidation.py --sizes 10000 100000 500000
+"""
+import argparse
+import asyncio
+import sys
+import time
+import uuid
+from pathlib import Path
+
+# Добавляем текущую директорию в путь для импорта модулей
+sys.path.append(str(Path(__file__).parent))
+
+from config import settings
+from redis_cache import _envelope, redis_cache
+
+_PIPELINE_CHUNK = 5000
+_VALUE = b'{"items": [], "next_cursor": null}'
+
+
+async def _populate(key: str, count: int) -> None:
+    client = redis_cache.redis_client
+    generation = await redis_cache.generation(key)
+    value = _envelope(generation, int(time.time()) + 600, _VALUE)
+    for start in range(0, count, _PIPELINE_CHUNK):
+        async with client.pipeline(transaction=False) as pipe:
+            for user_id in range(start, min(start + _PIPELINE_CHUNK, count)):
+                pipe.setex(redis_cache._get_key(user_id, key), 600, value)
+            await pipe.execute()
+
+
+async def _keys_and_delete(key: str) -> int:
+    """Прежняя инвалидация: KEYS блокирует Redis на время обхода всей базы."""
+    client = redis_cache.redis_client
+    keys = await client.keys(f"cache:*:{key}")
+    removed = 0
+    for start in range(0, len(keys), _PIPELINE_CHUNK):
+        removed += await client.delete(*keys[start:start + _PIPELINE_CHUNK])
+    return removed
+
+
+async def _measure(label: str, key: str, count: int, action) -> float:
+    await _populate(key, count)
+    started = time.perf_counter()
+    await action()
+    elapsed = time.perf_counter() - started
+    print(f"{count:>10} | {label:<14} | {elapsed * 1000:>10.1f} мс")
+    return elapsed
+
+
+async def main(sizes: list[int]) -> int:
+    if not settings.REDIS_ENABLED:
+        print("❌ REDIS_ENABLED=false — замер невозможен")
+        return 1
+    await redis_cache.connect()
+    client = redis_cache.redis_client
+    key = f"bench_{uuid.uuid4().hex[:8]}"
+    try:
+        print(f"{'ключей':>10} | {'способ':<14} | {'время':>13}")
+        print("-" * 44)
+        for count in sizes:
+            await _measure("KEYS+DEL", key, count, lambda: _keys_and_delete(key))
+            await _measure(
+                "SCAN+UNLINK", key, count,
+                lambda: redis_cache.unlink_matching(f"cache:*:{key}"),
+            )
+            await _measure("INCR поколения", key, count, lambda: redis_cache.clear_all_users_key(key))
+            # Проверка: после INCR записи старого поколения не читаются
+            entry = await redis_cache.lookup(0, key)
+            assert entry.value is None, "запись старого поколения прочитана после инвалидации"
+            await redis_cache.unlink_matching(f"cache:*:{key}")
+            print("-" * 44)
+    finally:
+        await redis_cache.unlink_matching(f"cache:*:{key}")
+        await client.unlink(f"cache:gen:{key}")
+        await redis_cache.disconnect()
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Замер задержки инвалидации кеша Redis")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.sizes)))
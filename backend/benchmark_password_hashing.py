@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Пропускная способность входа по паролю: прежняя проверка bcrypt прямо в
+event loop (новый CryptContext на каждый вызов) против общего контекста и пула
+``crud._password_executor`` (``crud.verify_password_async``).
+
+Запускается N одновременных «логинов» (только проверка пароля, без БД);
+параллельно тикает задача-пульс, по которой видно, насколько блокируется
+event loop — на это время встают все остальные запросы воркера.
+
+    python benchmark_password_hashing.py
+    python benchmark_password_hashing.py --logins 50 100
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+# Добавляем текущую директорию в путь для импорта модулей
+sys.path.append(str(Path(__file__).parent))
+
+from passlib.context import CryptContext
+
+import crud
+from config import settings
+
+_PASSWORD = "Qwerty12345!"
+_HEARTBEAT_SECONDS = 0.01
+
+
+async def _legacy_verify(plain_password: str, hashed_password: str) -> bool:
+    """Как было: контекст на каждый вызов, bcrypt синхронно в event loop."""
+    context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return context.verify(plain_password, hashed_password)
+
+
+async def _heartbeat(stop: asyncio.Event) -> float:
+    """Максимальная задержка пробуждения пульса — сколько event loop был занят."""
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(_HEARTBEAT_SECONDS)
+        worst = max(worst, time.perf_counter() - started - _HEARTBEAT_SECONDS)
+    return worst
+
+
+async def _measure(label: str, verify, hashed: str, logins: int) -> None:
+    stop = asyncio.Event()
+    heartbeat = asyncio.create_task(_heartbeat(stop))
+    await asyncio.sleep(0)
+    started = time.perf_counter()
+    results = await asyncio.gather(*(verify(_PASSWORD, hashed) for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    worst_lag = await heartbeat
+    assert all(results), f"{label}: пароль не прошёл проверку"
+    print(
+        f"{logins:>7} | {label:<22} | {elapsed:>7.2f} с | "
+        f"{logins / elapsed:>8.1f} вх/с | {worst_lag * 1000:>9.0f} мс"
+    )
+
+
+async def main(sizes: list[int]) -> int:
+    hashed = crud.get_password_hash(_PASSWORD)
+    print(f"bcrypt: {hashed.split('$')[2]} раундов, потоков в пуле: {settings.PASSWORD_HASH_WORKERS}")
+    header = f"{'входов':>7} | {'способ':<22} | {'время':>9} | {'пропускная':>12} | {'блок. loop':>12}"
+    print(header)
+    print("-" * len(header))
+    for logins in sizes:
+        await _measure("в event loop (прежний)", _legacy_verify, hashed, logins)
+        await _measure("пул потоков", crud.verify_password_async, hashed, logins)
+        print("-" * len(header))
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Замер пропускной способности проверки паролей")
+    parser.add_argument("--logins", type=int, nargs="+", default=[20, 100], help="одновременных входов")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.logins)))
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Замер запросов админской статистики: прежние версии (по запросу на метрику,
+id активных пользователей собираются в Python-множества) против текущих
+``crud.get_general_statistics`` / ``get_active_user_ratio`` / ``get_inactive_users``
+(один запрос на эндпоинт).
+
+Данные синтетические: во временной схеме ``bench_stats_*`` создаются users,
+transactions (по умолчанию 1 000 000 переводов за год), market_items и
+purchases с индексами миграции 014. Рабочие таблицы не затрагиваются, схема
+удаляется после прогона. Результаты обеих версий сверяются.
+
+    python benchmark_statistics.py
+    python benchmark_statistics.py --transactions 3000000 --users 20000 --repeat 5
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+# Добавляем текущую директорию в путь для импорта модулей
+sys.path.append(str(Path(__file__).parent))
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import crud
+import models
+from database import Base, engine
+
+_TABLES = [
+    models.User.__table__,
+    models.Transaction.__table__,
+    models.MarketItem.__table__,
+    models.Purchase.__table__,
+]
+# Индексы из migrations/014_add_hot_query_indexes.sql, на которые опираются запросы
+_INDEXES = [
+    "CREATE INDEX ON transactions(timestamp DESC, id DESC)",
+    "CREATE INDEX ON transactions(receiver_id, timestamp)",
+    "CREATE INDEX ON transactions(sender_id, timestamp)",
+    "CREATE INDEX ON purchases(timestamp)",
+]
+
+
+async def _populate(db: AsyncSession, users: int, transactions: int) -> None:
+    # Пятая часть пользователей не переводит и не получает — они «неактивные»
+    active = max(2, users * 4 // 5)
+    await db.execute(text(
+        "INSERT INTO users (first_name, last_name, status, position, department, phone_number, "
+        "is_admin, browser_auth_enabled, registration_date) "
+        "SELECT 'Имя' || g, 'Фамилия' || g, CASE WHEN g % 50 = 0 THEN 'deleted' ELSE 'approved' END, "
+        "'Бариста', 'Ресторан', '+7999' || g, false, false, now() - (g % 365) * interval '1 day' "
+        "FROM generate_series(1, :users) AS g"
+    ), {"users": users})
+    await db.execute(text(
+        "INSERT INTO transactions (sender_id, receiver_id, amount, message, timestamp) "
+        "SELECT 1 + (random() * (:active - 1))::int, 1 + (random() * (:active - 1))::int, 1, NULL, "
+        "now() - random() * interval '365 days' "
+        "FROM generate_series(1, :transactions)"
+    ), {"active": active, "transactions": transactions})
+    await db.execute(text(
+        "INSERT INTO market_items (name, price, price_rub, stock, is_archived, is_auto_issuance, "
+        "is_shared_gift, is_local_purchase) "
+        "SELECT 'Товар ' || g, 10 + g, 100 * g, 100, false, false, false, false FROM generate_series(1, 20) AS g"
+    ))
+    await db.execute(text(
+        "INSERT INTO purchases (user_id, item_id, timestamp) "
+        "SELECT 1 + (random() * (:users - 1))::int, 1 + (random() * 19)::int, "
+        "now() - random() * interval '365 days' "
+        "FROM generate_series(1, :purchases)"
+    ), {"users": users, "purchases": max(1, transactions // 20)})
+    for statement in _INDEXES:
+        await db.execute(text(statement))
+    await db.execute(text("ANALYZE"))
+
+
+# --- Прежние версии (до перехода на один запрос на эндпоинт) ---
+
+async def _legacy_general_statistics(db: AsyncSession, start_date: Optional[date] = None, end_date: Optional[date] = None):
+    start_date, end_date_inclusive = crud._prepare_dates(start_date, end_date)
+    period = models.Transaction.timestamp.between(start_date, end_date_inclusive)
+    new_users_count = (await db.execute(select(func.count(models.User.id)).where(
+        models.User.status != 'deleted',
+        models.User.registration_date.between(start_date, end_date_inclusive)
+    ))).scalar_one()
+    senders = (await db.execute(select(models.Transaction.sender_id).join(
+        models.User, models.User.id == models.Transaction.sender_id
+    ).where(period, models.User.status != 'deleted').distinct())).scalars().all()
+    receivers = (await db.execute(select(models.Transaction.receiver_id).join(
+        models.User, models.User.id == models.Transaction.receiver_id
+    ).where(period, models.User.status != 'deleted').distinct())).scalars().all()
+    transactions_count = (await db.execute(select(func.count(models.Transaction.id)).filter(period))).scalar_one()
+    purchases_period = models.Purchase.timestamp.between(start_date, end_date_inclusive)
+    shop_purchases = (await db.execute(select(func.count(models.Purchase.id)).filter(purchases_period))).scalar_one()
+    total_turnover = (await db.execute(select(func.sum(models.Transaction.amount)).filter(period))).scalar_one_or_none() or 0
+    total_store_spent = (await db.execute(
+        select(func.sum(models.MarketItem.price))
+        .join(models.Purchase, models.Purchase.item_id == models.MarketItem.id)
+        .filter(purchases_period)
+    )).scalar_one_or_none() or 0
+    return {
+        "new_users_count": new_users_count,
+        "active_users_count": len(set(senders).union(set(receivers))),
+        "transactions_count": transactions_count,
+        "store_purchases_count": shop_purchases,
+        "total_turnover": total_turnover,
+        "total_store_spent": total_store_spent,
+    }
+
+
+async def _legacy_active_user_ratio(db: AsyncSession):
+    total_users = (await db.execute(
+        select(func.count(models.User.id)).where(models.User.status != 'deleted')
+    )).scalar_one()
+    senders = (await db.execute(select(models.Transaction.sender_id).join(
+        models.User, models.User.id == models.Transaction.sender_id
+    ).where(models.User.status != 'deleted').distinct())).scalars().all()
+    recipients = (await db.execute(select(models.Transaction.receiver_id).join(
+        models.User, models.User.id == models.Transaction.receiver_id
+    ).where(models.User.status != 'deleted').distinct())).scalars().all()
+    active = len(set(senders).union(set(recipients)))
+    return {"active_users": active, "inactive_users": total_users - active}
+
+
+async def _legacy_inactive_users(db: AsyncSession, start_date: Optional[date] = None, end_date: Optional[date] = None):
+    start_date, end_date_inclusive = crud._prepare_dates(start_date, end_date)
+    period = models.Transaction.timestamp.between(start_date, end_date_inclusive)
+    senders = (await db.execute(select(models.Transaction.sender_id).filter(period).distinct())).scalars().all()
+    recipients = (await db.execute(select(models.Transaction.receiver_id).filter(period).distinct())).scalars().all()
+    active_user_ids = set(senders).union(set(recipients))
+    query = select(models.User).filter(models.User.status != 'deleted')
+    if active_user_ids:
+        query = query.filter(models.User.id.notin_(active_user_ids))
+    return (await db.execute(query)).scalars().all()
+
+
+async def _timed(db: AsyncSession, fn, repeat: int):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        db.expunge_all()
+        started = time.perf_counter()
+        result = await fn(db)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), result
+
+
+def _normalize(result):
+    """Списки пользователей сравниваются по id, словари — как есть."""
+    if isinstance(result, list):
+        return sorted(user.id for user in result)
+    return result
+
+
+async def main(users: int, transactions: int, repeat: int) -> int:
+    schema = f"bench_stats_{uuid.uuid4().hex[:8]}"
+    year_start = datetime.utcnow().date() - timedelta(days=365)
+    cases = [
+        ("общая статистика, 30 дней", _legacy_general_statistics, crud.get_general_statistics),
+        (
+            "общая статистика, год",
+            lambda db: _legacy_general_statistics(db, year_start),
+            lambda db: crud.get_general_statistics(db, year_start),
+        ),
+        ("доля активных, всё время", _legacy_active_user_ratio, crud.get_active_user_ratio),
+        ("неактивные, 30 дней", _legacy_inactive_users, crud.get_inactive_users),
+    ]
+    async with engine.connect() as conn:
+        await conn.execute(text(f"CREATE SCHEMA {schema}"))
+        await conn.execute(text(f"SET search_path TO {schema}"))
+        try:
+            await conn.run_sync(lambda sync_conn: Base.metadata.create_all(sync_conn, tables=_TABLES))
+            db = AsyncSession(bind=conn, expire_on_commit=False)
+            started = time.perf_counter()
+            await _populate(db, users, transactions)
+            print(f"Данные: {users} пользователей, {transactions} переводов ({time.perf_counter() - started:.1f} с)")
+
+            header = f"{'запрос':<28} | {'прежний, мс':>11} | {'один запрос, мс':>15} | {'ускорение':>9}"
+            print(header)
+            print("-" * len(header))
+            for label, legacy, current in cases:
+                legacy_time, legacy_result = await _timed(db, legacy, repeat)
+                current_time, current_result = await _timed(db, current, repeat)
+                assert _normalize(legacy_result) == _normalize(current_result), f"{label}: результаты расходятся"
+                print(
+                    f"{label:<28} | {legacy_time * 1000:>11.1f} | {current_time * 1000:>15.1f} | "
+                    f"{legacy_time / current_time:>8.1f}×"
+                )
+        finally:
+            await conn.rollback()
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+            await conn.commit()
+    await engine.dispose()
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Замер запросов админской статистики")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--transactions", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3, help="повторов на запрос (берётся медиана)")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.users, args.transactions, args.repeat)))
@@ -10,6 +10,56 @@ TELEGRAM_API_URL = f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/"
 
 SEND_MESSAGE_URL = f"{TELEGRAM_API_URL}sendMessage"
 ANSWER_CALLBACK_URL = f"{TELEGRAM_API_URL}answerCallbackQuery"
+GET_FILE_URL = f"{TELEGRAM_API_URL}getFile"
+FILE_DOWNLOAD_URL = f"https://api.telegram.org/file/bot{settings.TELEGRAM_BOT_TOKEN}/"
+
+# Один клиент на процесс: keep-alive + HTTP/2 к api.telegram.org вместо TCP+TLS на каждое сообщение
+TELEGRAM_HTTP_TIMEOUT = httpx.Timeout(30.0, connect=10.0)
+TELEGRAM_HTTP_LIMITS = httpx.Limits(
+    max_connections=50,
+    max_keepalive_connections=20,
+    keepalive_expiry=60.0,
+)
+
+_telegram_client: httpx.AsyncClient | None = None
+
+
+def get_telegram_client() -> httpx.AsyncClient:
+    """Общий httpx-клиент Telegram Bot API.
+
+    Открывается в ``app.lifespan``; в скриптах без lifespan создаётся лениво.
+    """
+    global _telegram_client
+    if _telegram_client is None or _telegram_client.is_closed:
+        _telegram_client = httpx.AsyncClient(
+            http2=True,
+            timeout=TELEGRAM_HTTP_TIMEOUT,
+            limits=TELEGRAM_HTTP_LIMITS,
+        )
+    return _telegram_client
+
+
+async def open_telegram_client() -> None:
+    """Создаёт общий клиент при старте приложения."""
+    get_telegram_client()
+    logger.info("HTTP-клиент Telegram Bot API открыт (HTTP/2, keep-alive)")
+
+
+async def close_telegram_client() -> None:
+    """Закрывает общий клиент и его пул соединений при остановке."""
+    global _telegram_client
+    if _telegram_client is not None:
+        await _telegram_client.aclose()
+        _telegram_client = None
+        logger.info("HTTP-клиент Telegram Bot API закрыт")
+
+class TelegramRetryAfter(Exception):
+    """Telegram ответил 429: повторять не раньше чем через ``retry_after`` секунд."""
+
+    def __init__(self, retry_after: float, message: str):
+        super().__init__(message)
+        self.retry_after = retry_after
+
 
 def escape_markdown(text) -> str:
     """
@@ -64,30 +114,33 @@ async def send_telegram_message(chat_id: int, text: str, reply_markup: dict = No
     if message_thread_id:
         payload['message_thread_id'] = message_thread_id
     
-    timeout = httpx.Timeout(30.0, connect=10.0)
-    async with httpx.AsyncClient(timeout=timeout) as client:
+    client = get_telegram_client()
+    try:
+        response = await client.post(SEND_MESSAGE_URL, json=payload)
+        response.raise_for_status()
+        result = response.json()
+        if result.get('ok'):
+            print(f"Successfully sent message to chat_id: {chat_id}")
+            return result
+        else:
+            error_msg = result.get('description', 'Unknown error')
+            print(f"Telegram API error sending message to {chat_id}: {error_msg}")
+            raise Exception(f"Telegram API error: {error_msg}")
+    except httpx.HTTPStatusError as e:
+        error_data = {}
         try:
-            response = await client.post(SEND_MESSAGE_URL, json=payload)
-            response.raise_for_status()
-            result = response.json()
-            if result.get('ok'):
-                print(f"Successfully sent message to chat_id: {chat_id}")
-                return result
-            else:
-                error_msg = result.get('description', 'Unknown error')
-                print(f"Telegram API error sending message to {chat_id}: {error_msg}")
-                raise Exception(f"Telegram API error: {error_msg}")
-        except httpx.HTTPStatusError as e:
-            try:
-                error_data = e.response.json()
-                error_msg = error_data.get('description', str(e))
-            except:
-                error_msg = str(e)
-            print(f"HTTP error sending message to {chat_id}: {error_msg}")
-            raise Exception(f"HTTP error: {error_msg}")
-        except Exception as e:
-            print(f"An unexpected error occurred while sending message to {chat_id}: {e}")
-            raise
+            error_data = e.response.json()
+            error_msg = error_data.get('description', str(e))
+        except:
+            error_msg = str(e)
+        print(f"HTTP error sending message to {chat_id}: {error_msg}")
+        if e.response.status_code == 429:
+            retry_after = (error_data.get('parameters') or {}).get('retry_after', 1)
+            raise TelegramRetryAfter(float(retry_after), f"HTTP error: {error_msg}")
+        raise Exception(f"HTTP error: {error_msg}")
+    except Exception as e:
+        print(f"An unexpected error occurred while sending message to {chat_id}: {e}")
+        raise
 
 async def answer_callback_query(
     callback_query_id: str,
@@ -103,35 +156,34 @@ async def answer_callback_query(
         payload["text"] = text[:200]
     if show_alert:
         payload["show_alert"] = True
-    timeout = httpx.Timeout(30.0, connect=10.0)
-    async with httpx.AsyncClient(timeout=timeout) as client:
+    client = get_telegram_client()
+    try:
+        response = await client.post(ANSWER_CALLBACK_URL, json=payload)
+        response.raise_for_status()
+        result = response.json()
+        if result.get("ok"):
+            return True
+        logger.error(
+            "answerCallbackQuery отклонён Telegram: %s (id=%s…)",
+            result.get("description", result),
+            callback_query_id[:12],
+        )
+        return False
+    except httpx.HTTPStatusError as e:
         try:
-            response = await client.post(ANSWER_CALLBACK_URL, json=payload)
-            response.raise_for_status()
-            result = response.json()
-            if result.get("ok"):
-                return True
-            logger.error(
-                "answerCallbackQuery отклонён Telegram: %s (id=%s…)",
-                result.get("description", result),
-                callback_query_id[:12],
-            )
-            return False
-        except httpx.HTTPStatusError as e:
-            try:
-                body = e.response.json()
-                desc = body.get("description", e.response.text)
-            except Exception:
-                desc = e.response.text
-            logger.error(
-                "answerCallbackQuery HTTP %s: %s",
-                e.response.status_code,
-                desc,
-            )
-            return False
-        except Exception as e:
-            logger.exception("answerCallbackQuery: %s", e)
-            return False
+            body = e.response.json()
+            desc = body.get("description", e.response.text)
+        except Exception:
+            desc = e.response.text
+        logger.error(
+            "answerCallbackQuery HTTP %s: %s",
+            e.response.status_code,
+            desc,
+        )
+        return False
+    except Exception as e:
+        logger.exception("answerCallbackQuery: %s", e)
+        return False
 
 async def send_shared_gift_invitation(invited_user_telegram_id: int, buyer_name: str, item_name: str, invitation_id: int):
     """Отправить уведомление о приглашении на совместный подарок"""
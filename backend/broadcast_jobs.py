@@ -0,0 +1,269 @@
+"""Фоновые рассылки: задания в Postgres и воркер, переживающий перезапуск.
+
+``crud.create_broadcast_job`` сохраняет задание (``broadcast_jobs``) и по строке
+``broadcast_deliveries`` на каждого получателя и канал, после чего HTTP-запрос
+сразу отвечает. Воркер забирает задание с арендой (``locked_until``,
+``FOR UPDATE SKIP LOCKED`` — безопасно при нескольких процессах), отправляет
+``pending``-доставки пачками и после каждой пачки фиксирует статусы и счётчики.
+Пока пачка отправляется, аренда продлевается (``job_leases.JobLease.hold``), а
+итоги пачки пишутся, только если аренда всё ещё своя: задание, перехваченное
+другим воркером, прежний владелец не перезапишет. Это контрольная точка: после перезапуска задание подхватывается по истёкшей
+аренде и продолжает с оставшихся ``pending``. Повтор (``retry_failed``)
+возвращает в ``pending`` только доставки со статусом ``failed``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+from config import settings
+from database import AsyncSessionLocal
+from email_service import send_email
+from job_leases import JobLease, LeaseLost
+from telegram_dispatcher import PRIORITY_BULK, telegram_dispatcher
+
+logger = logging.getLogger(__name__)
+
+# Сколько последних ошибок доставки отдавать в статусе задания
+FAILED_PREVIEW_LIMIT = 100
+
+
+async def refresh_counters(db: AsyncSession, job: models.BroadcastJob) -> None:
+    """Пересчитывает счётчики задания по таблице доставок (без коммита)."""
+    delivery = models.BroadcastDelivery
+    rows = (
+        await db.execute(
+            select(delivery.channel, delivery.status, func.count(delivery.id))
+            .where(delivery.job_id == job.id)
+            .group_by(delivery.channel, delivery.status)
+        )
+    ).all()
+    counts = {(channel, status): count for channel, status, count in rows}
+    job.sent_ok_email = counts.get(("email", "sent"), 0)
+    job.sent_ok_telegram = counts.get(("telegram", "sent"), 0)
+    job.failed_count = counts.get(("email", "failed"), 0) + counts.get(("telegram", "failed"), 0)
+
+
+async def get_pending_count(db: AsyncSession, job_id: int) -> int:
+    delivery = models.BroadcastDelivery
+    return (
+        await db.execute(
+            select(func.count(delivery.id)).where(delivery.job_id == job_id, delivery.status == "pending")
+        )
+    ).scalar_one()
+
+
+async def get_failed_deliveries(
+    db: AsyncSession, job_id: int, limit: int = FAILED_PREVIEW_LIMIT
+) -> list[models.BroadcastDelivery]:
+    delivery = models.BroadcastDelivery
+    result = await db.execute(
+        select(delivery)
+        .where(delivery.job_id == job_id, delivery.status == "failed")
+        .order_by(delivery.id)
+        .limit(limit)
+    )
+    return list(result.scalars().all())
+
+
+async def retry_failed(db: AsyncSession, job_id: int) -> Optional[models.BroadcastJob]:
+    """Возвращает неудавшиеся доставки в очередь; отправленные повторно не уходят."""
+    job = await db.get(models.BroadcastJob, job_id)
+    if job is None:
+        return None
+    delivery = models.BroadcastDelivery
+    result = await db.execute(
+        update(delivery)
+        .where(delivery.job_id == job_id, delivery.status == "failed")
+        .values(status="pending", error=None, updated_at=datetime.utcnow())
+    )
+    if result.rowcount:
+        job.status = "queued"
+        job.finished_at = None
+        job.locked_until = None
+        await refresh_counters(db, job)
+    await db.commit()
+    await db.refresh(job)
+    if result.rowcount:
+        broadcast_worker.wake()
+    return job
+
+
+class BroadcastWorker:
+    """Цикл обработки заданий: опрос раз в ``poll_interval`` или по ``wake()``."""
+
+    def __init__(self, batch_size: int, poll_interval: float, lease_seconds: int):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def start(self) -> None:
+        if self._task is not None and not self._task.done():
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="broadcast-worker")
+        logger.info("Воркер рассылок запущен")
+
+    async def stop(self) -> None:
+        """Останавливает воркер; незавершённая пачка останется pending до следующего запуска."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def wake(self) -> None:
+        """Разбудить воркер сразу после постановки задания (без ожидания опроса)."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                while await self._process_next_job():
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Воркер рассылок: ошибка обработки задания")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _claim_job(self, db: AsyncSession) -> Optional[tuple[models.BroadcastJob, JobLease]]:
+        """Забирает задание без активной аренды; ``running`` с истёкшей арендой — упавший воркер."""
+        job_model = models.BroadcastJob
+        now = datetime.utcnow()
+        result = await db.execute(
+            select(job_model)
+            .where(
+                job_model.status != "completed",
+                or_(job_model.locked_until.is_(None), job_model.locked_until < now),
+            )
+            .order_by(job_model.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        job = result.scalar_one_or_none()
+        if job is None:
+            return None
+        if job.status == "running":
+            logger.warning("Рассылка %s: аренда истекла, продолжаем с контрольной точки", job.id)
+        job.status = "running"
+        job.started_at = job.started_at or now
+        job.locked_until = now + timedelta(seconds=self.lease_seconds)
+        await db.commit()
+        return job, JobLease(job_model, job.id, job.locked_until, self.lease_seconds)
+
+    async def _process_next_job(self) -> bool:
+        """Доводит одно задание до конца. ``False`` — заданий в очереди нет."""
+        async with AsyncSessionLocal() as db:
+            claimed = await self._claim_job(db)
+            if claimed is None:
+                return False
+            job, lease = claimed
+            logger.info("Рассылка %s: начата обработка", job.id)
+            try:
+                while await self._process_batch(db, job, lease):
+                    pass
+                await refresh_counters(db, job)
+                await lease.update(db, status="completed", finished_at=datetime.utcnow(), locked_until=None)
+            except LeaseLost as exc:
+                logger.warning("Рассылка %s: %s, обработка прервана", job.id, exc)
+                await db.rollback()
+                return True
+            await db.commit()
+            logger.info(
+                "Рассылка %s завершена: email %s/%s, Telegram %s/%s, ошибок %s",
+                job.id, job.sent_ok_email, job.total_email,
+                job.sent_ok_telegram, job.total_telegram, job.failed_count,
+            )
+            return True
+
+    async def _process_batch(self, db: AsyncSession, job: models.BroadcastJob, lease: JobLease) -> bool:
+        """Отправляет очередную пачку pending-доставок и фиксирует результат, пока аренда своя."""
+        delivery = models.BroadcastDelivery
+        result = await db.execute(
+            select(delivery)
+            .where(delivery.job_id == job.id, delivery.status == "pending")
+            .order_by(delivery.id)
+            .limit(self.batch_size)
+        )
+        batch = list(result.scalars().all())
+        if not batch:
+            return False
+
+        # Пачка может упереться в лимиты SMTP и Telegram дольше срока аренды — продлеваем по ходу
+        await lease.hold(self._send_batch(job, batch))
+        await refresh_counters(db, job)
+        await lease.update(db, locked_until=lease.deadline())
+        await db.commit()
+        return True
+
+    async def _send_batch(self, job: models.BroadcastJob, batch: list[models.BroadcastDelivery]) -> None:
+        telegram_items = [d for d in batch if d.channel == "telegram"]
+        # Telegram — сначала всё в очередь диспетчера (она соблюдает лимиты), email — параллельно
+        # через пул SMTP-сессий (он же ограничивает число одновременных отправок и писем в минуту)
+        queued = [
+            (
+                item,
+                await telegram_dispatcher.submit(
+                    chat_id=int(item.target),
+                    text=job.telegram_text or "",
+                    parse_mode="HTML",
+                    priority=PRIORITY_BULK,
+                ),
+            )
+            for item in telegram_items
+        ]
+        await asyncio.gather(*(self._deliver_email(job, item) for item in batch if item.channel == "email"))
+        for item, message in queued:
+            item.attempts += 1
+            try:
+                await message.future
+                self._mark(item, None)
+            except Exception as exc:
+                logger.error("Рассылка %s: ошибка Telegram %s: %s", job.id, item.target, exc)
+                self._mark(item, str(exc))
+
+    async def _deliver_email(self, job: models.BroadcastJob, item: models.BroadcastDelivery) -> None:
+        item.attempts += 1
+        try:
+            ok = await send_email(
+                to_email=item.target,
+                subject=job.subject,
+                body_html=job.email_html or "",
+                body_text=job.email_text,
+            )
+        except Exception as exc:
+            logger.error("Рассылка %s: ошибка email %s: %s", job.id, item.target, exc)
+            self._mark(item, str(exc))
+            return
+        self._mark(item, None if ok else "Не удалось отправить (проверьте SMTP)")
+
+    @staticmethod
+    def _mark(item: models.BroadcastDelivery, error: Optional[str]) -> None:
+        item.status = "failed" if error else "sent"
+        item.error = error[:500] if error else None
+        item.updated_at = datetime.utcnow()
+
+
+broadcast_worker = BroadcastWorker(
+    batch_size=settings.BROADCAST_BATCH_SIZE,
+    poll_interval=settings.BROADCAST_POLL_INTERVAL_SECONDS,
+    lease_seconds=settings.BROADCAST_LEASE_SECONDS,
+)
@@ -0,0 +1,95 @@
+"""Сериализация значений RedisCache: сменные кодеки, сжатие zstd, байт версии формата.
+
+Тело записи начинается с байта формата: младшие биты — id кодека
+(``CODECS``), бит ``_ZSTD_FLAG`` — тело сжато zstd. Сжимаются тела от
+``REDIS_CACHE_COMPRESS_MIN_BYTES``: большие ленты и списки пользователей
+повторяют одни и те же ключи и имена и сжимаются в разы, мелкие значения
+дешевле хранить как есть.
+
+Байты формата меньше 0x20 и не встречаются в начале JSON-текста, поэтому
+записи прежнего формата (JSON без байта версии) по-прежнему читаются и просто
+доживают свой TTL. Новый кодек — новый id в ``CODECS``; старые записи читаются
+по своему id. Готовые байты (тело HTTP-ответа) пишутся кодеком ``raw`` как есть.
+"""
+
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from typing import Any, Callable
+
+import orjson
+import zstandard
+
+from config import settings
+
+
+@dataclass(frozen=True)
+class Codec:
+    id: int
+    name: str
+    encode: Callable[[Any], bytes]
+    decode: Callable[[bytes], Any]
+
+
+CODECS: dict[int, Codec] = {
+    codec.id: codec
+    for codec in (
+        Codec(
+            1,
+            "json",
+            lambda value: json.dumps(value, ensure_ascii=False).encode("utf-8"),
+            lambda body: json.loads(body),
+        ),
+        Codec(2, "orjson", orjson.dumps, orjson.loads),
+        Codec(3, "raw", bytes, bytes),
+    )
+}
+_CODECS_BY_NAME = {codec.name: codec for codec in CODECS.values()}
+
+_ZSTD_FLAG = 0x10
+_CODEC_MASK = 0x0F
+# Всё, что меньше, — байт формата; JSON-текст начинается с печатного символа
+_FORMAT_BYTE_LIMIT = 0x20
+_ZSTD_LEVEL = 3
+
+_compressor = zstandard.ZstdCompressor(level=_ZSTD_LEVEL)
+_decompressor = zstandard.ZstdDecompressor()
+
+
+def get_codec(name: str) -> Codec:
+    try:
+        return _CODECS_BY_NAME[name]
+    except KeyError:
+        raise ValueError(f"Неизвестный кодек кеша: {name}") from None
+
+
+def encode(value: Any, codec: Codec | None = None, compress_min_bytes: int | None = None) -> bytes:
+    """Значение → байт формата + тело (сжатое, если оно не меньше порога)."""
+    if isinstance(value, bytes):
+        codec = CODECS[3]
+    codec = codec or get_codec(settings.REDIS_CACHE_CODEC)
+    if compress_min_bytes is None:
+        compress_min_bytes = settings.REDIS_CACHE_COMPRESS_MIN_BYTES
+    body = codec.encode(value)
+    if compress_min_bytes and len(body) >= compress_min_bytes:
+        return bytes((codec.id | _ZSTD_FLAG,)) + _compressor.compress(body)
+    return bytes((codec.id,)) + body
+
+
+def decode(data: bytes) -> Any:
+    """Обратное ``encode``; тело без байта формата — прежний JSON (или строка)."""
+    if not data or data[0] >= _FORMAT_BYTE_LIMIT:
+        text = data.decode("utf-8")
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            return text
+    format_byte = data[0]
+    codec = CODECS.get(format_byte & _CODEC_MASK)
+    if codec is None:
+        raise ValueError(f"Неизвестный формат записи кеша: {format_byte:#04x}")
+    body = data[1:]
+    if format_byte & _ZSTD_FLAG:
+        body = _decompressor.decompress(body)
+    return codec.decode(body)
@@ -5,7 +5,7 @@
 import asyncio
 import sys
 from config import settings
-from email_service import send_email
+from email_service import send_email, smtp_pool
 
 async def test_smtp():
     """Тестирует настройки SMTP"""
@@ -64,6 +64,7 @@ async def test_smtp():
         body_html="<p>Это тестовое письмо для проверки настроек SMTP.</p>",
         body_text="Это тестовое письмо для проверки настроек SMTP."
     )
+    await smtp_pool.close()
     
     if success:
         print("\n✅ УСПЕХ! Тестовое письмо отправлено успешно.")
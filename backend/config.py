@@ -21,6 +21,27 @@ class Settings(BaseSettings):
     TELEGRAM_PURCHASE_TOPIC_ID: int
     TELEGRAM_UPDATE_TOPIC_ID: int
     TELEGRAM_ADMIN_LOG_TOPIC_ID: int
+    # Исходящая очередь Telegram: лимиты Bot API — ~30 сообщений/с на бота и ~1/с в один чат
+    TELEGRAM_GLOBAL_RATE_PER_SECOND: float = 25.0
+    TELEGRAM_PER_CHAT_INTERVAL_SECONDS: float = 1.0
+    TELEGRAM_SEND_CONCURRENCY: int = 8
+    TELEGRAM_SEND_MAX_RETRIES: int = 3
+    # Фоновые рассылки: доставок за пачку (контрольная точка), опрос очереди и аренда задания воркером
+    BROADCAST_BATCH_SIZE: int = 50
+    BROADCAST_POLL_INTERVAL_SECONDS: float = 5.0
+    BROADCAST_LEASE_SECONDS: int = 300
+    # Outbox уведомлений о покупках и переводах: пачка, опрос, аренда пачки и число попыток до отказа
+    OUTBOX_BATCH_SIZE: int = 50
+    OUTBOX_POLL_INTERVAL_SECONDS: float = 2.0
+    OUTBOX_LEASE_SECONDS: int = 120
+    OUTBOX_MAX_ATTEMPTS: int = 8
+    # Фоновые отчёты (сводная выгрузка): опрос очереди и аренда задания воркером
+    REPORT_POLL_INTERVAL_SECONDS: float = 5.0
+    REPORT_LEASE_SECONDS: int = 600
+    # Каталог готовых отчётов, если S3 не настроен; пусто — <системный tmp>/reports
+    REPORT_STORAGE_DIR: str = ""
+    # Как часто фоном пересчитывается почасовая активность (daily_activity) из transactions
+    STATISTICS_REFRESH_INTERVAL_SECONDS: float = 60.0
 
     # Настройки интеграции со Statix Bonus
     STATIX_BONUS_API_URL: str = "https://cabinet.statix-pro.ru/webhooks/custom/muggle_rest.php"
@@ -37,6 +58,17 @@ class Settings(BaseSettings):
     REDIS_DB: int = 0
     REDIS_PASSWORD: str = ""
     REDIS_URL: str = ""
+    # Локальный (в памяти процесса) уровень кеша перед Redis: баннеры, товары, тема, Statix
+    LOCAL_CACHE_MAX_ENTRIES: int = 512
+    LOCAL_CACHE_TTL_SECONDS: float = 30.0  # страховка, если сообщение об инвалидации потерялось
+    # Формат значений в Redis: кодек (orjson | json) и сжатие zstd для тел от N байт (0 — не сжимать)
+    REDIS_CACHE_CODEC: str = "orjson"
+    REDIS_CACHE_COMPRESS_MIN_BYTES: int = 2048
+    # Кеш авторизации (снимок пользователя по X-Telegram-Id / X-User-Id) в памяти процесса
+    IDENTITY_CACHE_MAX_ENTRIES: int = 10000
+    IDENTITY_CACHE_TTL_SECONDS: float = 30.0
+    # Потоки для bcrypt (хеширование и проверка паролей вне event loop)
+    PASSWORD_HASH_WORKERS: int = 4
 
     # Настройки SMTP для отправки email через Timeweb
     SMTP_HOST: str = "smtp.timeweb.ru"  # Исправлено: правильный хост smtp.timeweb.ru
@@ -44,6 +76,12 @@ class Settings(BaseSettings):
     SMTP_USERNAME: str = ""  # Полный email адрес от Timeweb
     SMTP_PASSWORD: str = ""  # Пароль от почтового ящика
     SMTP_USE_TLS: bool = False  # True для порта 587, False для порта 465
+    # Пул SMTP-сессий: параллельные отправки, бюджет писем в минуту (0 — без лимита),
+    # закрытие сессии после простоя и после N писем (серверы ограничивают письма на сессию)
+    SMTP_POOL_SIZE: int = 3
+    SMTP_MAX_PER_MINUTE: int = 60
+    SMTP_POOL_IDLE_SECONDS: float = 60.0
+    SMTP_MAX_MESSAGES_PER_SESSION: int = 100
     ADMIN_EMAILS: str = ""  # Список email админов через запятую: уведомления и вход в админ-панель
     # Пароль для входа в /admin по email из ADMIN_EMAILS (без записи в БД). Пусто — вход отключён.
     ADMIN_PANEL_PASSWORD: str = ""
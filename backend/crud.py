@@ -1,4 +1,6 @@
+import asyncio
 import io
+import base64
 import zipfile
 import json
 import math 
@@ -7,10 +9,12 @@ import logging
 import traceback
 
 import httpx
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
+from passlib.context import CryptContext
 from datetime import datetime
-from sqlalchemy.orm import selectinload, aliased
-from sqlalchemy import select, func, update, delete, extract, and_
+from sqlalchemy.orm import selectinload
+from sqlalchemy import select, func, update, delete, extract, and_, tuple_, insert
 import random
 import bot
 import config
@@ -21,8 +25,14 @@ from bot import send_telegram_message, escape_html
 from email_service import send_email, is_valid_email, build_broadcast_email_content
 from datetime import datetime, timedelta, date
 from dateutil.relativedelta import relativedelta
-from sqlalchemy import or_, text
+from sqlalchemy import or_
 from redis_cache import redis_cache
+import identity_cache
+import leaderboard_totals
+import statistics_rollups
+import outbox
+from leaderboard_engine import leaderboard_engine
+from telegram_dispatcher import PRIORITY_BULK, telegram_dispatcher
 
 logger = logging.getLogger(__name__)
 
@@ -49,10 +59,22 @@ async def _create_notification(
 
 
 # --- УТИЛИТЫ ДЛЯ РАБОТЫ С ПАРОЛЯМИ ---
-def _get_password_context():
-    """Создает и возвращает контекст для работы с паролями."""
-    from passlib.context import CryptContext
-    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Контекст создаётся один раз: разбор схем и проверка backend'а bcrypt не бесплатны
+_pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt занимает ~100–250 мс CPU и отпускает GIL; ограниченный пул не даёт
+# потоку логинов/рассылки учёток занять все ядра и не блокирует event loop
+_password_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="bcrypt",
+)
+
+def _truncate_password(password: str) -> str:
+    # Bcrypt имеет ограничение на длину пароля в 72 байта
+    if isinstance(password, str):
+        password_bytes = password.encode('utf-8')
+        if len(password_bytes) > 72:
+            password = password_bytes[:72].decode('utf-8', errors='ignore')
+    return password
 
 def get_password_hash(password: str) -> str:
     """
@@ -64,16 +86,7 @@ def get_password_hash(password: str) -> str:
     Returns:
         Хеш пароля
     """
-    # Bcrypt имеет ограничение на длину пароля в 72 байта
-    # Обрезаем пароль до 72 байт перед хешированием
-    if isinstance(password, str):
-        password_bytes = password.encode('utf-8')
-        if len(password_bytes) > 72:
-            password_bytes = password_bytes[:72]
-            password = password_bytes.decode('utf-8', errors='ignore')
-    
-    pwd_context = _get_password_context()
-    return pwd_context.hash(password)
+    return _pwd_context.hash(_truncate_password(password))
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
@@ -86,38 +99,34 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     Returns:
         True если пароль верный, False в противном случае
     """
-    # Обрезаем пароль до 72 байт перед проверкой
-    if isinstance(plain_password, str):
-        password_bytes = plain_password.encode('utf-8')
-        if len(password_bytes) > 72:
-            password_bytes = password_bytes[:72]
-            plain_password = password_bytes.decode('utf-8', errors='ignore')
-    
-    pwd_context = _get_password_context()
-    return pwd_context.verify(plain_password, hashed_password)
+    return _pwd_context.verify(_truncate_password(plain_password), hashed_password)
 
-def _should_reset_daily_transfer(user: models.User) -> bool:
-    """Проверяет, нужно ли сбросить daily_transfer_count (новый день)."""
-    today = date.today()
-    return user.last_login_date is None or user.last_login_date.date() < today
+async def get_password_hash_async(password: str) -> str:
+    """``get_password_hash`` в пуле ``_password_executor`` — для async-кода."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_executor, get_password_hash, password)
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """``verify_password`` в пуле ``_password_executor`` — для async-кода."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_executor, verify_password, plain_password, hashed_password)
 
-async def _reset_daily_transfer_if_needed(db: AsyncSession, user: models.User) -> None:
-    """Сбрасывает daily_transfer_count при наступлении нового дня."""
-    if user and _should_reset_daily_transfer(user):
-        user.daily_transfer_count = 0
-        user.last_login_date = datetime.utcnow()
-        await db.commit()
-        await db.refresh(user)
+def transfers_made_today(user: models.User) -> int:
+    """
+    Сколько переводов пользователь сделал сегодня.
+
+    Счётчик привязан к ``daily_transfer_date`` и в новый день просто перестаёт
+    действовать: ни чтение пользователя, ни планировщик его не обнуляют.
+    """
+    if user.daily_transfer_date != date.today():
+        return 0
+    return user.daily_transfer_count or 0
 
 
 # Пользователи
 async def get_user(db: AsyncSession, user_id: int):
     result = await db.execute(select(models.User).where(models.User.id == user_id))
-    user = result.scalars().first()
-    if user:
-        await _reset_daily_transfer_if_needed(db, user)
-    return user
+    return result.scalars().first()
 
 
 async def get_user_by_telegram(db: AsyncSession, telegram_id: int):
@@ -128,10 +137,7 @@ async def get_user_by_telegram(db: AsyncSession, telegram_id: int):
             models.User.telegram_id >= 0
         )
     )
-    user = result.scalars().first()
-    if user:
-        await _reset_daily_transfer_if_needed(db, user)
-    return user
+    return result.scalars().first()
 
 async def create_user(db: AsyncSession, user: schemas.RegisterRequest):
     # Для веб-формата telegram_id может быть None
@@ -260,6 +266,7 @@ async def update_user_profile(db: AsyncSession, user_id: int, data: schemas.User
         setattr(user, key, value)
         
     await db.commit()
+    await _invalidate_user_identity(user.id)
     await db.refresh(user)
     return user
 
@@ -270,46 +277,42 @@ async def create_transaction(db: AsyncSession, tr: schemas.TransferRequest):
     if not sender:
         raise ValueError("Отправитель не найден")
 
-    # Обновляем счетчик, если наступил новый день
-    # --- ИСПРАВЛЕНИЕ ЗДЕСЬ ---
-    # Обновляем счетчик, если наступил новый день
-    # Сравниваем дату с датой, добавляя .date()
-    if sender.last_login_date is None or sender.last_login_date.date() < today:
-        sender.daily_transfer_count = 0
-    
-    # Записываем текущее время в last_login_date, так как колонка теперь DateTime
-    sender.last_login_date = datetime.utcnow()
-    
+    # Счётчик прошлого дня не действует — отсчёт начинается заново
+    transfers_today = transfers_made_today(sender)
+
     fixed_amount = 1 
-    if sender.daily_transfer_count >= 3:
+    if transfers_today >= 3:
         raise ValueError("Дневной лимит переводов исчерпан (3 в день)")
 
     receiver = await db.get(models.User, tr.receiver_id)
     if not receiver:
         raise ValueError("Получатель не найден")
     
-    sender.daily_transfer_count += 1
+    sender.daily_transfer_count = transfers_today + 1
+    sender.daily_transfer_date = today
     receiver.balance += fixed_amount
     sender.ticket_parts += 1
     
+    transfer_time = datetime.utcnow()
     db_tr = models.Transaction(
         sender_id=tr.sender_id,
         receiver_id=tr.receiver_id,
         amount=fixed_amount,
-        message=tr.message
+        message=tr.message,
+        timestamp=transfer_time,
     )
     db.add(db_tr)
-    await db.commit()
-    await db.refresh(sender) # Обновляем данные отправителя из БД
-    
-    try:
+    await leaderboard_totals.record_transfer(
+        db, tr.sender_id, tr.receiver_id, fixed_amount, transfer_time
+    )
+    await statistics_rollups.record_transfer(db, tr.sender_id, tr.receiver_id, transfer_time)
+
+    # Уведомления пишутся в той же транзакции, что и перевод; Telegram доставит outbox
+    if receiver.telegram_id and receiver.telegram_id >= 0:
         message_text = (f"🎉 Вам начислена <b>1</b> спасибка!\n"
                         f"От: <b>{escape_html(sender.first_name or '')} {escape_html(sender.last_name or '')}</b>\n"
                         f"Сообщение: <i>{escape_html(tr.message or '')}</i>")
-        if receiver.telegram_id and receiver.telegram_id >= 0:
-            await send_telegram_message(chat_id=receiver.telegram_id, text=message_text)
-    except Exception as e:
-        print(f"Could not send notification to user {receiver.telegram_id}. Error: {e}")
+        outbox.enqueue_telegram(db, chat_id=receiver.telegram_id, text=message_text)
 
     sender_name = f"{sender.first_name or ''} {sender.last_name or ''}".strip()
     await _create_notification(
@@ -318,107 +321,136 @@ async def create_transaction(db: AsyncSession, tr: schemas.TransferRequest):
         f"От: {sender_name}. Сообщение: {tr.message or '—'}",
     )
     await db.commit()
+    await db.refresh(sender) # Обновляем данные отправителя из БД
+    outbox.outbox_dispatcher.wake()
+    await leaderboard_engine.record_transfer(
+        db_tr.id, tr.sender_id, tr.receiver_id, fixed_amount, transfer_time
+    )
     await _invalidate_feed_and_leaderboard("перевод спасибки")
 
     return sender
     
-# crud.py
+# --- Лента и история: keyset-пагинация по (timestamp, id) ---
+def encode_transaction_cursor(tx: models.Transaction) -> str:
+    """Непрозрачный курсор на позицию транзакции в ленте (timestamp, id)."""
+    raw = f"{tx.timestamp.isoformat()}|{tx.id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_transaction_cursor(cursor: str) -> tuple[datetime, int]:
+    """Разбирает курсор ленты. ValueError — если курсор повреждён."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+        timestamp_str, tx_id = raw.split("|", 1)
+        return datetime.fromisoformat(timestamp_str), int(tx_id)
+    except (ValueError, UnicodeError) as e:
+        raise ValueError("Некорректный курсор пагинации") from e
+
+
+def next_transaction_cursor(items: list, limit: int) -> Optional[str]:
+    """Курсор следующей страницы или None, если страница неполная (дальше данных нет)."""
+    if len(items) < limit or not items:
+        return None
+    return encode_transaction_cursor(items[-1])
 
-async def get_feed(db: AsyncSession, days: int = 7, limit: int = 200):
-    """
-    Получает ленту транзакций за последние N дней с ограничением количества.
-    По умолчанию: последняя неделя (7 дней), максимум 200 записей.
-    """
-    Sender = aliased(models.User, name='sender_user')
-    Receiver = aliased(models.User, name='receiver_user')
-    
-    # Вычисляем дату начала периода
-    cutoff_date = datetime.utcnow() - timedelta(days=days)
 
+def _transactions_page_stmt(days: int, limit: int, cursor: Optional[str]):
+    """Базовый запрос страницы транзакций: новые сверху, после курсора, не старше N дней."""
+    cutoff_date = datetime.utcnow() - timedelta(days=days)
     stmt = (
         select(models.Transaction)
-        .join(Sender, models.Transaction.sender_id == Sender.id)
-        .join(Receiver, models.Transaction.receiver_id == Receiver.id)
         .options(
             selectinload(models.Transaction.sender),
             selectinload(models.Transaction.receiver)
         )
         .where(models.Transaction.timestamp >= cutoff_date)
-        .order_by(models.Transaction.timestamp.desc())
+        .order_by(models.Transaction.timestamp.desc(), models.Transaction.id.desc())
         .limit(limit)
     )
-    result = await db.execute(stmt)
+    if cursor:
+        cursor_ts, cursor_id = decode_transaction_cursor(cursor)
+        stmt = stmt.where(
+            tuple_(models.Transaction.timestamp, models.Transaction.id) < tuple_(cursor_ts, cursor_id)
+        )
+    return stmt
+
+
+async def get_feed(db: AsyncSession, days: int = 7, limit: int = 200, cursor: Optional[str] = None):
+    """
+    Получает ленту транзакций за последние N дней с ограничением количества.
+    По умолчанию: последняя неделя (7 дней), максимум 200 записей.
+    cursor — значение next_cursor предыдущей страницы (keyset по timestamp, id).
+    """
+    result = await db.execute(_transactions_page_stmt(days, limit, cursor))
     return result.scalars().all()
 
-async def get_user_transactions(db: AsyncSession, user_id: int, days: int = 7):
+async def get_user_transactions(
+    db: AsyncSession,
+    user_id: int,
+    days: int = 7,
+    limit: int = 200,
+    cursor: Optional[str] = None,
+):
     """
     Получает транзакции пользователя за последние N дней.
-    По умолчанию: последняя неделя (7 дней).
+    По умолчанию: последняя неделя (7 дней), максимум 200 записей на страницу.
     """
-    Sender = aliased(models.User, name='sender_user')
-    Receiver = aliased(models.User, name='receiver_user')
-    
-    # Вычисляем дату начала периода
-    cutoff_date = datetime.utcnow() - timedelta(days=days)
-
-    stmt = (
-        select(models.Transaction)
-        .join(Sender, models.Transaction.sender_id == Sender.id)
-        .join(Receiver, models.Transaction.receiver_id == Receiver.id)
-        .options(
-            selectinload(models.Transaction.sender),
-            selectinload(models.Transaction.receiver)
-        )
-        .where(
-            and_(
-                (models.Transaction.sender_id == user_id) | (models.Transaction.receiver_id == user_id),
-                models.Transaction.timestamp >= cutoff_date
-            )
-        )
-        .order_by(models.Transaction.timestamp.desc())
+    stmt = _transactions_page_stmt(days, limit, cursor).where(
+        (models.Transaction.sender_id == user_id) | (models.Transaction.receiver_id == user_id)
     )
     result = await db.execute(stmt)
     return result.scalars().all()
 
 # Лидерборд
+def _leaderboard_totals_query(period: str, leaderboard_type: str):
+    """Суммы по пользователям из помесячных агрегатов (без удалённых и нулевых)."""
+    totals = models.LeaderboardMonthlyTotal
+    amount = leaderboard_totals.amount_column(leaderboard_type)
+    month = leaderboard_totals.period_month(period)
+
+    total_amount = func.sum(amount).label("total_amount")
+    query = (
+        select(totals.user_id, total_amount)
+        .join(models.User, models.User.id == totals.user_id)
+        .where(models.User.status != 'deleted')  # Исключаем анонимизированных пользователей
+        .group_by(totals.user_id)
+        .having(func.sum(amount) > 0)
+    )
+    if month is not None:
+        query = query.where(totals.month == month)
+    return query
+
+
 async def get_leaderboard_data(db: AsyncSession, period: str, leaderboard_type: str):
     """
     Универсальная функция для получения данных рейтинга.
     :param period: 'current_month', 'last_month', 'all_time'
     :param leaderboard_type: 'received' (получатели) или 'sent' (отправители)
     """
-    
-    # Определяем, по какому полю группировать
-    group_by_field = "receiver_id" if leaderboard_type == 'received' else "sender_id"
-    
-    # Определяем временной промежуток
-    start_date, end_date = None, None
-    today = datetime.utcnow()
-    
-    if period == 'current_month':
-        start_date = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        end_date = today
-    elif period == 'last_month':
-        first_day_current_month = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        end_date = first_day_current_month - timedelta(days=1)
-        start_date = end_date.replace(day=1)
-        end_date = end_date.replace(hour=23, minute=59, second=59) # Включаем весь последний день
+    top = await leaderboard_engine.top(period, leaderboard_type)
+    if top is not None:
+        users_result = await db.execute(
+            select(models.User).where(
+                models.User.id.in_([user_id for user_id, _ in top]),
+                models.User.status != 'deleted',
+            )
+        )
+        users_by_id = {user.id: user for user in users_result.scalars().all()}
+        return [
+            {"user": users_by_id[user_id], "total_received": score}
+            for user_id, score in top
+            if user_id in users_by_id
+        ]
+
+    totals_q = _leaderboard_totals_query(period, leaderboard_type).subquery()
 
-    # Формируем запрос
     query = (
-        select(
-            models.User,
-            func.sum(models.Transaction.amount).label("total_amount"),
-        )
-        .join(models.Transaction, models.User.id == getattr(models.Transaction, group_by_field))
-        .where(models.User.status != 'deleted')  # Исключаем анонимизированных пользователей
-        .group_by(models.User.id)
-        .order_by(func.sum(models.Transaction.amount).desc())
+        select(models.User, totals_q.c.total_amount)
+        .join(totals_q, totals_q.c.user_id == models.User.id)
+        .order_by(totals_q.c.total_amount.desc())
         .limit(100) # Ограничим вывод до 100 лидеров
     )
-    
-    if start_date and end_date:
-        query = query.where(models.Transaction.timestamp.between(start_date, end_date))
 
     result = await db.execute(query)
     leaderboard_data = result.all()
@@ -431,78 +463,29 @@ async def get_user_rank(db: AsyncSession, user_id: int, period: str, leaderboard
     """
     Определяет ранг, количество очков и общее число участников для конкретного пользователя.
     """
-    group_by_field = "receiver_id" if leaderboard_type == 'received' else "sender_id"
-    
-    start_date, end_date = None, None
-    today = datetime.utcnow()
-    
-    if period == 'current_month':
-        start_date = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        end_date = today
-    elif period == 'last_month':
-        first_day_current_month = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        end_date = first_day_current_month - timedelta(days=1)
-        start_date = end_date.replace(day=1)
-        end_date = end_date.replace(hour=23, minute=59, second=59)
-
-    time_filter = ""
-    if start_date and end_date:
-        # Форматируем даты для SQL-запроса
-        start_str = start_date.strftime('%Y-%m-%d %H:%M:%S')
-        end_str = end_date.strftime('%Y-%m-%d %H:%M:%S')
-        time_filter = f"AND t.timestamp BETWEEN '{start_str}' AND '{end_str}'"
-
-    # --- НАЧАЛО ИСПРАВЛЕНИЙ ---
-    raw_sql = text(f"""
-        WITH ranked_users AS (
-            SELECT
-                u.id as user_id,
-                SUM(t.amount) as total_amount,
-                RANK() OVER (ORDER BY SUM(t.amount) DESC) as rank
-            FROM users u
-            JOIN transactions t ON u.id = t.{group_by_field}
-            WHERE u.status != 'deleted'
-            {time_filter}
-            GROUP BY u.id
-        ),
-        total_participants AS (
-            SELECT COUNT(DISTINCT t.{group_by_field}) as count 
-            FROM transactions t
-            JOIN users u ON u.id = t.{group_by_field}
-            WHERE u.status != 'deleted'
-            {time_filter}
-        )
-        SELECT ru.rank, ru.total_amount, tp.count
-        FROM ranked_users ru, total_participants tp
-        WHERE ru.user_id = :user_id
-    """)
-    # --- КОНЕЦ ИСПРАВЛЕНИЙ ---
-
-    result = await db.execute(raw_sql, {"user_id": user_id})
+    cached_rank = await leaderboard_engine.rank(user_id, period, leaderboard_type)
+    if cached_rank is not None:
+        return cached_rank
+
+    totals_q = _leaderboard_totals_query(period, leaderboard_type).subquery()
+    ranked = select(
+        totals_q.c.user_id,
+        totals_q.c.total_amount,
+        func.rank().over(order_by=totals_q.c.total_amount.desc()).label("rank"),
+        func.count().over().label("participants"),
+    ).subquery()
+
+    result = await db.execute(select(ranked).where(ranked.c.user_id == user_id))
     user_rank_data = result.first()
 
     if not user_rank_data:
-        time_filter_for_count = ""
-        if start_date and end_date:
-            start_str = start_date.strftime('%Y-%m-%d %H:%M:%S')
-            end_str = end_date.strftime('%Y-%m-%d %H:%M:%S')
-            time_filter_for_count = f"AND t.timestamp BETWEEN '{start_str}' AND '{end_str}'"
-        
-        total_participants_sql = text(f"""
-            SELECT COUNT(DISTINCT t.{group_by_field}) as count 
-            FROM transactions t
-            JOIN users u ON u.id = t.{group_by_field}
-            WHERE u.status != 'deleted'
-            {time_filter_for_count}
-        """)
-        total_result = await db.execute(total_participants_sql)
-        total_participants = total_result.scalar_one_or_none() or 0
-        return {"rank": None, "total_received": 0, "total_participants": total_participants}
+        total_participants = await db.scalar(select(func.count()).select_from(totals_q))
+        return {"rank": None, "total_received": 0, "total_participants": total_participants or 0}
 
     return {
         "rank": user_rank_data.rank,
         "total_received": user_rank_data.total_amount,
-        "total_participants": user_rank_data.count
+        "total_participants": user_rank_data.participants
     }
 
 # Маркет
@@ -627,99 +610,87 @@ async def create_purchase(db: AsyncSession, pr: schemas.PurchaseRequest):
         user.balance -= item.price
         item.stock -= 1
 
-    db_purchase = models.Purchase(user_id=user.id, item_id=pr.item_id)
+    purchase_time = datetime.utcnow()
+    db_purchase = models.Purchase(user_id=user.id, item_id=pr.item_id, timestamp=purchase_time)
     db.add(db_purchase)
+    await statistics_rollups.record_purchase(db, pr.item_id, purchase_time)
     if 'code_to_issue' in locals() and code_to_issue:
         await db.flush()
         code_to_issue.purchase_id = db_purchase.id
 
-    # Сохраняем данные перед отправкой уведомлений
-    await db.commit()
-    await _invalidate_market_cache(f"покупка товара {pr.item_id}")
-    await _invalidate_feed_and_leaderboard(f"покупка товара {pr.item_id}")
-
-    # Сохраняем данные для уведомлений перед отправкой
+    # --- ФИНАЛЬНАЯ ВЕРСИЯ УВЕДОМЛЕНИЙ ---
+    # Уведомления пишутся в outbox в той же транзакции, что и покупка: ответ не ждёт
+    # Telegram и SMTP, а доставка гарантирована даже при падении процесса после commit
     item_name = item.name
-    user_telegram_id = user.telegram_id
-    user_first_name = user.first_name
-    user_last_name = user.last_name
-    user_username = user.username
-    user_position = user.position
-    user_phone_number = user.phone_number
-    user_balance = user.balance
     item_price = item.price
 
-    # --- ФИНАЛЬНАЯ ВЕРСИЯ УВЕДОМЛЕНИЙ ---
-    # Отправляем уведомления ПОСЛЕ commit, чтобы не блокировать транзакцию
-    try:
-        # Уведомление для администратора
-        admin_message = (
-            f"🛍️ <b>Новая покупка в магазине!</b>\n\n"
-            f"👤 <b>Пользователь:</b> {escape_html(user_first_name or '')} (@{escape_html(user_username or str(user_telegram_id))})\n"
-            f"📞 <b>Телефон:</b> {escape_html(user_phone_number or 'не указан')}\n"
-        )
+    # Уведомление для администратора
+    admin_message = (
+        f"🛍️ <b>Новая покупка в магазине!</b>\n\n"
+        f"👤 <b>Пользователь:</b> {escape_html(user.first_name or '')} (@{escape_html(user.username or str(user.telegram_id))})\n"
+        f"📞 <b>Телефон:</b> {escape_html(user.phone_number or 'не указан')}\n"
+    )
+    admin_message += (
+        f"💼 <b>Должность:</b> {escape_html(user.position or '')}\n\n"
+        f"🎁 <b>Товар:</b> {escape_html(item_name)}\n"
+        f"💰 <b>Стоимость:</b> {item_price} спасибок"
+    )
+    if issued_code_value:
         admin_message += (
-            f"💼 <b>Должность:</b> {escape_html(user_position or '')}\n\n"
-            f"🎁 <b>Товар:</b> {escape_html(item_name)}\n"
-            f"💰 <b>Стоимость:</b> {item_price} спасибок"
+            f"\n\n✨ <b>Товар с автовыдачей</b>\n"
+            f"🔑 <b>Выданный код:</b> <code>{escape_html(issued_code_value)}</code>"
         )
-        if issued_code_value:
-            admin_message += (
-                f"\n\n✨ <b>Товар с автовыдачей</b>\n"
-                f"🔑 <b>Выданный код:</b> <code>{escape_html(issued_code_value)}</code>"
-            )
-        admin_message += f"\n\n📉 <b>Новый баланс пользователя:</b> {user_balance} спасибок"
-        
-        await send_telegram_message(
-            chat_id=settings.TELEGRAM_CHAT_ID,
-            text=admin_message,
-            message_thread_id=settings.TELEGRAM_PURCHASE_TOPIC_ID
-        )
-
-        # Уведомление для пользователя (теперь для всех покупок)
-        user_message = f"🎉 Поздравляем с покупкой \"{escape_html(item_name)}\"!"
-        if issued_code_value:
-            # Для товаров с кодом добавляем сам код
-            user_message += f"\n\nВаш уникальный код/ссылка:\n<code>{escape_html(issued_code_value)}</code>"
-        
-        await send_telegram_message(chat_id=user_telegram_id, text=user_message)
+    admin_message += f"\n\n📉 <b>Новый баланс пользователя:</b> {user.balance} спасибок"
+    outbox.enqueue_telegram(
+        db,
+        chat_id=settings.TELEGRAM_CHAT_ID,
+        text=admin_message,
+        message_thread_id=settings.TELEGRAM_PURCHASE_TOPIC_ID,
+    )
 
-    except Exception as e:
-        print(f"Could not send notification. Error: {e}")
+    # Уведомление для пользователя (теперь для всех покупок)
+    user_message = f"🎉 Поздравляем с покупкой \"{escape_html(item_name)}\"!"
+    if issued_code_value:
+        # Для товаров с кодом добавляем сам код
+        user_message += f"\n\nВаш уникальный код/ссылка:\n<code>{escape_html(issued_code_value)}</code>"
+    if user.telegram_id and user.telegram_id >= 0:
+        outbox.enqueue_telegram(db, chat_id=user.telegram_id, text=user_message)
 
     # Email: пользователю (подтверждение + код) и админам
-    try:
-        from email_service import (
-            send_purchase_confirmation_to_user,
-            send_purchase_notification_to_admins,
+    user_name_display = f"{user.first_name or ''} {user.last_name or ''}".strip() or str(user.telegram_id)
+    if user.email:
+        outbox.enqueue_email(
+            db,
+            "purchase_confirmation",
+            to_email=user.email,
+            user_name=user_name_display,
+            item_name=item_name,
+            amount=item_price,
+            issued_code=issued_code_value,
+            purchase_type="regular",
         )
-        user_name_display = f"{user_first_name or ''} {user_last_name or ''}".strip() or str(user_telegram_id)
-        if user.email:
-            await send_purchase_confirmation_to_user(
-                to_email=user.email,
-                user_name=user_name_display,
-                item_name=item_name,
-                amount=item_price,
-                issued_code=issued_code_value,
-                purchase_type="regular",
-            )
-        await send_purchase_notification_to_admins(
+    if (settings.ADMIN_EMAILS or "").strip():
+        outbox.enqueue_email(
+            db,
+            "purchase_admins",
             purchase_type="regular",
             user_name=user_name_display,
-            user_phone=user_phone_number or "",
+            user_phone=user.phone_number or "",
             user_email=user.email,
             item_name=item_name,
             amount=item_price,
             issued_code=issued_code_value,
         )
-    except Exception as e:
-        print(f"Could not send purchase email notifications. Error: {e}")
 
     notif_msg = f'Вы приобрели "{item_name}"'
     if issued_code_value:
         notif_msg += f"\n[code]{issued_code_value}[/code]"
     await _create_notification(db, user.id, "purchase", "Покупка совершена", notif_msg)
+
     await db.commit()
+    outbox.outbox_dispatcher.wake()
+    await _invalidate_market_cache(f"покупка товара {pr.item_id}")
+    await _invalidate_feed_and_leaderboard(f"покупка товара {pr.item_id}")
 
     return {"new_balance": user.balance, "issued_code": issued_code_value}
 
@@ -748,8 +719,10 @@ async def create_local_gift(db: AsyncSession, pr: schemas.LocalGiftRequest):
     user.reserved_balance += item.price
     
     # Создаем запись о покупке
-    db_purchase = models.Purchase(user_id=user.id, item_id=pr.item_id)
+    purchase_time = datetime.utcnow()
+    db_purchase = models.Purchase(user_id=user.id, item_id=pr.item_id, timestamp=purchase_time)
     db.add(db_purchase)
+    await statistics_rollups.record_purchase(db, pr.item_id, purchase_time)
     await db.flush()  # Получаем ID покупки
     
     # Создаем запись о локальном подарке
@@ -922,16 +895,17 @@ async def process_local_gift_approval(db: AsyncSession, local_purchase_id: int,
             send_purchase_notification_to_admins,
         )
         user_name_display = f"{user.first_name or ''} {user.last_name or ''}".strip()
+        emails = []
         if user.email:
-            await send_local_gift_status_to_user(
+            emails.append(send_local_gift_status_to_user(
                 to_email=user.email,
                 user_name=user_name_display,
                 item_name=item.name,
                 amount=local_purchase.reserved_amount,
                 approved=(action == "approve"),
-            )
+            ))
         if action == "approve":
-            await send_purchase_notification_to_admins(
+            emails.append(send_purchase_notification_to_admins(
                 purchase_type="local",
                 user_name=user_name_display,
                 user_phone=user.phone_number or "",
@@ -939,7 +913,8 @@ async def process_local_gift_approval(db: AsyncSession, local_purchase_id: int,
                 item_name=item.name,
                 amount=local_purchase.reserved_amount,
                 extra_info="Локальный подарок одобрен, спасибки списаны.",
-            )
+            ))
+        await asyncio.gather(*emails)
     except Exception as e:
         print(f"Could not send local gift status emails. Error: {e}")
 
@@ -999,6 +974,7 @@ async def create_banner(db: AsyncSession, banner: schemas.BannerCreate):
     db.add(db_banner)
     await db.commit()
     await db.refresh(db_banner)
+    await _invalidate_banners_cache("создание баннера")
     return db_banner
 
 async def update_banner(db: AsyncSession, banner_id: int, banner_data: schemas.BannerUpdate):
@@ -1013,6 +989,7 @@ async def update_banner(db: AsyncSession, banner_id: int, banner_data: schemas.B
         
     await db.commit()
     await db.refresh(db_banner)
+    await _invalidate_banners_cache(f"обновление баннера {banner_id}")
     return db_banner
 
 async def delete_banner(db: AsyncSession, banner_id: int):
@@ -1022,25 +999,47 @@ async def delete_banner(db: AsyncSession, banner_id: int):
     if db_banner:
         await db.delete(db_banner)
         await db.commit()
+        await _invalidate_banners_cache(f"удаление баннера {banner_id}")
         return True
     return False
 
 # --- НОВЫЕ ФУНКЦИИ ДЛЯ АВТОМАТИЗАЦИИ ---
 async def process_birthday_bonuses(db: AsyncSession):
-    """Начисляет 15 баллов всем, у кого сегодня день рождения и отправляет поздравительное сообщение."""
+    """
+    Начисляет 15 баллов всем, у кого сегодня день рождения, и ставит поздравления в outbox.
+
+    Начисление — один ``UPDATE ... RETURNING`` (индекс ``idx_users_birthday_month_day``),
+    уведомления — один пакетный ``INSERT``; сообщения Telegram доставит
+    ``outbox_dispatcher`` после коммита.
+    """
     today = date.today()
-    users_with_birthday = await db.execute(
-        select(models.User).where(
-            func.extract('month', models.User.date_of_birth) == today.month,
-            func.extract('day', models.User.date_of_birth) == today.day
+    result = await db.execute(
+        update(models.User)
+        .where(
+            extract('month', models.User.date_of_birth) == today.month,
+            extract('day', models.User.date_of_birth) == today.day
         )
+        .values(balance=models.User.balance + 15)
+        .returning(models.User.id, models.User.telegram_id, models.User.first_name, models.User.status)
+        .execution_options(synchronize_session=False)
     )
-    users = users_with_birthday.scalars().all()
-    
+    users = result.all()
+
+    if users:
+        await db.execute(
+            insert(models.Notification),
+            [
+                {
+                    "user_id": user.id,
+                    "type": "system",
+                    "title": "С Днём Рождения!",
+                    "message": "Поздравляем с днём рождения! Вам начислено 15 спасибок в качестве подарка.",
+                }
+                for user in users
+            ],
+        )
+
     for user in users:
-        user.balance += 15
-        
-        # Отправляем поздравительное сообщение в Telegram
         # Игнорируем анонимизированных пользователей (telegram_id < 0)
         if user.telegram_id and user.telegram_id >= 0 and user.status == "approved":
             birthday_message = (
@@ -1049,16 +1048,7 @@ async def process_birthday_bonuses(db: AsyncSession):
                 f"🎁 В честь этого праздника вам начислено <b>15 спасибок</b> в качестве подарка!\n\n"
                 f"Желаем вам здоровья, счастья и успехов во всех начинаниях! 🎈"
             )
-            try:
-                await send_telegram_message(user.telegram_id, birthday_message)
-            except Exception as e:
-                logger.error(f"Не удалось отправить поздравление пользователю {user.id}: {e}")
-
-        await _create_notification(
-            db, user.id, "system",
-            "С Днём Рождения!",
-            "Поздравляем с днём рождения! Вам начислено 15 спасибок в качестве подарка.",
-        )
+            outbox.enqueue_telegram(db, chat_id=user.telegram_id, text=birthday_message)
     
     # --- ДОБАВИТЬ ЭТИ ДВЕ СТРОКИ ---
     await reset_ticket_parts(db)
@@ -1103,7 +1093,7 @@ async def preassign_web_pending_credentials(db: AsyncSession, user: models.User)
     login = await _ensure_unique_login(db, base_login, user.id)
     plain = generate_random_password(12)
     user.login = login
-    user.password_hash = get_password_hash(plain)
+    user.password_hash = await get_password_hash_async(plain)
     user.password_plain = plain
     user.browser_auth_enabled = False
     await db.commit()
@@ -1125,12 +1115,14 @@ async def update_user_status(db: AsyncSession, user_id: int, status: str):
             user.browser_auth_enabled = False
         user.status = "rejected"
         await db.commit()
+        await _invalidate_user_identity(user.id)
         await db.refresh(user)
         return user
 
     if status != "approved":
         user.status = status
         await db.commit()
+        await _invalidate_user_identity(user.id)
         await db.refresh(user)
         return user
 
@@ -1141,13 +1133,14 @@ async def update_user_status(db: AsyncSession, user_id: int, status: str):
         base_login = generate_login_from_name(user.first_name, user.last_name, user.id)
         user.login = await _ensure_unique_login(db, base_login, user.id)
         plain_pw = generate_random_password(12)
-        user.password_hash = get_password_hash(plain_pw)
+        user.password_hash = await get_password_hash_async(plain_pw)
         user.password_plain = plain_pw
         credentials_created_this_call = True
 
     user.browser_auth_enabled = True
     user.status = "approved"
     await db.commit()
+    await _invalidate_user_identity(user.id)
     await db.refresh(user)
 
     login_name = user.login
@@ -1262,6 +1255,28 @@ async def _invalidate_market_cache(reason: str):
         logger.warning(f"Не удалось очистить кеш market ({reason}): {e}")
 
 
+async def _invalidate_banners_cache(reason: str):
+    try:
+        await redis_cache.clear_all_users_key("banners")
+    except Exception as e:
+        logger.warning(f"Не удалось очистить кеш banners ({reason}): {e}")
+
+
+async def _invalidate_user_identity(user_id: int):
+    """Сбрасывает снимок авторизации пользователя (статус, права, Telegram, имя)."""
+    try:
+        await identity_cache.invalidate_user(user_id)
+    except Exception as e:
+        logger.warning(f"Не удалось сбросить кеш авторизации пользователя {user_id}: {e}")
+
+
+async def _invalidate_statix_bonus_cache(reason: str):
+    try:
+        await redis_cache.clear_all_users_key("statix_bonus")
+    except Exception as e:
+        logger.warning(f"Не удалось очистить кеш statix_bonus ({reason}): {e}")
+
+
 async def _invalidate_feed_and_leaderboard(reason: str):
     """Инвалидирует кеш ленты и рейтинга для всех пользователей."""
     for key in ("feed", "leaderboard"):
@@ -1560,9 +1575,16 @@ async def reset_tickets(db: AsyncSession):
     await db.commit()
 
 async def reset_daily_transfer_limits(db: AsyncSession):
-    """Сбрасывает счетчик ежедневных переводов для всех пользователей."""
+    """
+    Досрочно сбрасывает сегодняшние счётчики переводов (ручное действие админа).
+
+    В новый день счётчики перестают действовать сами (``transfers_made_today``),
+    поэтому трогаются только строки, где сегодня уже были переводы.
+    """
     await db.execute(
-        update(models.User).values(daily_transfer_count=0)
+        update(models.User)
+        .where(models.User.daily_transfer_date == date.today(), models.User.daily_transfer_count > 0)
+        .values(daily_transfer_count=0)
     )
     await db.commit()
 
@@ -1662,6 +1684,7 @@ async def process_pkpass_file(db: AsyncSession, user_id: int, file_content: byte
             user.card_balance = card_balance
             
             await db.commit()
+            await _invalidate_user_identity(user.id)
             await db.refresh(user)
             print(f"Pkpass file processed successfully for user {user_id}")
             return user
@@ -1797,6 +1820,7 @@ async def process_profile_update(db: AsyncSession, update_id: int, action: str):
         pending_update.status = "approved"
         await db.delete(pending_update) # Удаляем запрос после выполнения
         await db.commit() # Сохраняем и пользователя, и удаление запроса
+        await _invalidate_user_identity(user.id)
         
         return user, "approved"
         
@@ -1843,13 +1867,17 @@ async def search_users_by_name(db: AsyncSession, query: str):
 
 # --- НАЧАЛО: НОВЫЕ ФУНКЦИИ ДЛЯ АДМИН-ПАНЕЛИ УПРАВЛЕНИЯ ПОЛЬЗОВАТЕЛЯМИ ---
 
-async def get_all_users_for_admin(db: AsyncSession):
-    """Получает всех пользователей для админ-панели."""
-    result = await db.execute(
+def all_users_for_admin_query():
+    """Все неудалённые пользователи по фамилии — для списка и потоковой выгрузки."""
+    return (
         select(models.User)
         .where(models.User.status != 'deleted')
         .order_by(models.User.last_name)
     )
+
+async def get_all_users_for_admin(db: AsyncSession):
+    """Получает всех пользователей для админ-панели."""
+    result = await db.execute(all_users_for_admin_query())
     return result.scalars().all()
 
 async def admin_update_user(db: AsyncSession, user_id: int, user_data: schemas.AdminUserUpdate, admin_user: models.User):
@@ -1918,7 +1946,7 @@ async def admin_update_user(db: AsyncSession, user_id: int, user_data: schemas.A
                 setattr(user, key, None)
         elif key == 'password' and new_value:
             # Хешируем пароль перед сохранением
-            user.password_hash = get_password_hash(new_value)
+            user.password_hash = await get_password_hash_async(new_value)
             # Сохраняем пароль в открытом виде для админов
             user.password_plain = new_value
             # Не сохраняем сам пароль в поле password (его там нет в модели)
@@ -1959,6 +1987,7 @@ async def admin_update_user(db: AsyncSession, user_id: int, user_data: schemas.A
     # Отправляем уведомление, только если были реальные изменения
     if changes_log:
         await db.commit()
+        await _invalidate_user_identity(user.id)
         await db.refresh(user)
 
         admin_name = f"@{admin_user.username}" if admin_user.username else f"{admin_user.first_name} {admin_user.last_name}"
@@ -2046,6 +2075,8 @@ async def admin_delete_user(db: AsyncSession, user_id: int, admin_user: models.U
     # 4. Сохраняем изменения в базе
     db.add(user_to_anonymize)
     await db.commit()
+    await _invalidate_user_identity(user_id)
+    await leaderboard_engine.remove_user(user_id)
 
     # 5. Отправляем уведомление об анонимизации
     log_message = (
@@ -2097,7 +2128,7 @@ async def set_user_credentials(db: AsyncSession, user_id: int, login: str, passw
     
     # Устанавливаем логин и пароль
     user.login = login
-    user.password_hash = get_password_hash(password)
+    user.password_hash = await get_password_hash_async(password)
     user.password_plain = password  # Сохраняем пароль в открытом виде для админов
     user.browser_auth_enabled = True
     
@@ -2145,7 +2176,7 @@ async def admin_change_user_password(db: AsyncSession, user_id: int, new_passwor
         raise ValueError("Пароль должен содержать минимум 6 символов")
     
     # Обновляем пароль
-    user.password_hash = get_password_hash(new_password)
+    user.password_hash = await get_password_hash_async(new_password)
     user.password_plain = new_password  # Сохраняем пароль в открытом виде для админов
     
     # Если пароль установлен, включаем browser_auth_enabled
@@ -2242,7 +2273,7 @@ async def verify_user_credentials(db: AsyncSession, login: str, password: str):
     if not user.password_hash:
         return None
     
-    if not verify_password(password, user.password_hash):
+    if not await verify_password_async(password, user.password_hash):
         return None
     
     # Обновляем время последнего входа
@@ -2353,8 +2384,14 @@ async def bulk_send_credentials(
     if not status_conditions:
         raise ValueError("Необходимо выбрать хотя бы один тип пользователей (активные или заблокированные)")
     
-    # Получаем всех пользователей по статусам
-    query = select(models.User).where(
+    # Только нужные колонки: ORM-объекты и их отслеживание здесь не нужны
+    query = select(
+        models.User.id,
+        models.User.first_name,
+        models.User.last_name,
+        models.User.telegram_id,
+        models.User.login,
+    ).where(
         or_(*status_conditions),
         models.User.status != 'deleted',
         models.User.status != 'rejected',
@@ -2363,106 +2400,103 @@ async def bulk_send_credentials(
     )
     
     result = await db.execute(query)
-    all_users = result.scalars().all()
+    all_users = result.all()
     
     total_users = len(all_users)
-    credentials_generated = 0
     messages_sent = 0
     failed_users = []
     
-    # Обрабатываем каждого пользователя
-    for user in all_users:
-        login = None
-        password = None
-        user_credentials_generated = False
+    # Пароль существующего логина не восстановить — таким пользователям не отправляем
+    targets = [u for u in all_users if not u.login or regenerate_existing]
+    if not targets:
+        return {
+            "total_users": total_users,
+            "credentials_generated": 0,
+            "messages_sent": 0,
+            "failed_users": failed_users
+        }
+    
+    # Все занятые логины одним запросом; коллизии разрешаются в памяти.
+    # Прежние логины перегенерируемых пользователей тоже считаются занятыми:
+    # иначе UPDATE мог бы упереться в уникальность, пока старый логин не освобождён
+    taken = set((await db.execute(
+        select(models.User.login).where(models.User.login.isnot(None))
+    )).scalars().all())
+    
+    credentials = []
+    for user in targets:
+        base_login = generate_login_from_name(user.first_name, user.last_name, user.id)
+        login = base_login
+        counter = 1
+        while login in taken and login != user.login:
+            login = f"{base_login}{counter}"
+            counter += 1
+        taken.add(login)
+        credentials.append((user, login, generate_random_password(12)))
+    
+    # bcrypt параллельно в пуле _password_executor
+    hashes = await asyncio.gather(
+        *(get_password_hash_async(password) for _, _, password in credentials),
+        return_exceptions=True,
+    )
+    
+    # Результат отправки собираем после постановки всех сообщений: очередь соблюдает лимиты Telegram
+    queued = []
+    for (user, login, password), password_hash in zip(credentials, hashes):
+        if isinstance(password_hash, Exception):
+            logger.error(f"Ошибка при обработке пользователя {user.id}: {password_hash}")
+            failed_users.append(user.id)
+            continue
+        
+        message_text = f"🔐 <b>Ваши учетные данные для входа в систему</b>\n\n"
         
+        if custom_message:
+            message_text += f"{escape_html(custom_message)}\n\n"
+        
+        message_text += (
+            f"👤 <b>Логин:</b> <code>{escape_html(login)}</code>\n"
+            f"🔑 <b>Пароль:</b> <code>{escape_html(password)}</code>\n\n"
+            f"⚠️ <i>Сохраните эти данные в безопасном месте. Пароль больше не будет показан.</i>"
+        )
+        message = await telegram_dispatcher.submit(
+            chat_id=user.telegram_id,
+            text=message_text,
+            parse_mode='HTML',
+            priority=PRIORITY_BULK,
+        )
+        queued.append((user, login, password, password_hash, message))
+    
+    delivered = []
+    for user, login, password, password_hash, message in queued:
         try:
-            # Проверяем, нужно ли генерировать учетные данные
-            if user.login and not regenerate_existing:
-                # У пользователя уже есть логин и мы не перегенерируем
-                continue
-            
-            # Генерируем логин
-            if not user.login or regenerate_existing:
-                base_login = generate_login_from_name(user.first_name, user.last_name, user.id)
-                
-                # Проверяем уникальность логина
-                login = base_login
-                counter = 1
-                while True:
-                    check_result = await db.execute(
-                        select(models.User).where(
-                            models.User.login == login,
-                            models.User.id != user.id
-                        )
-                    )
-                    if check_result.scalar_one_or_none() is None:
-                        break
-                    login = f"{base_login}{counter}"
-                    counter += 1
-                
-                # Генерируем пароль
-                password = generate_random_password(12)
-                
-                # Устанавливаем учетные данные
-                user.login = login
-                user.password_hash = get_password_hash(password)
-                user.password_plain = password  # Сохраняем пароль в открытом виде для админов
-                user.browser_auth_enabled = True
-                
-                credentials_generated += 1
-                user_credentials_generated = True
-            else:
-                # Используем существующие учетные данные (но пароль не можем восстановить)
-                # В этом случае не отправляем сообщение, так как пароль неизвестен
-                continue
-            
-            # Отправляем сообщение через Telegram
-            if user.telegram_id and user.telegram_id >= 0:
-                message_text = f"🔐 <b>Ваши учетные данные для входа в систему</b>\n\n"
-                
-                if custom_message:
-                    message_text += f"{escape_html(custom_message)}\n\n"
-                
-                message_text += (
-                    f"👤 <b>Логин:</b> <code>{escape_html(user.login)}</code>\n"
-                    f"🔑 <b>Пароль:</b> <code>{escape_html(password)}</code>\n\n"
-                    f"⚠️ <i>Сохраните эти данные в безопасном месте. Пароль больше не будет показан.</i>"
-                )
-                
-                try:
-                    await send_telegram_message(
-                        chat_id=user.telegram_id,
-                        text=message_text,
-                        parse_mode='HTML'
-                    )
-                    messages_sent += 1
-                except Exception as e:
-                    logger.error(f"Не удалось отправить сообщение пользователю {user.id} ({user.telegram_id}): {e}")
-                    failed_users.append(user.id)
-                    if user_credentials_generated:
-                        user.login = None
-                        user.password_hash = None
-                        user.password_plain = None
-                        user.browser_auth_enabled = False
-                        credentials_generated -= 1
-
-            await _create_notification(
-                db, user.id, "system",
-                "Учётные данные для входа",
-                f"Вам назначены учётные данные для входа через браузер. Логин: {user.login}",
-            )
-            
+            await message.future
         except Exception as e:
-            logger.error(f"Ошибка при обработке пользователя {user.id}: {e}")
+            # Пароль никто не увидит — не сохраняем недоставленные учётные данные
+            logger.error(f"Не удалось отправить сообщение пользователю {user.id} ({user.telegram_id}): {e}")
             failed_users.append(user.id)
-            # Откатываем изменения для этого пользователя, если они были сделаны
-            if user_credentials_generated:
-                user.login = None
-                user.password_hash = None
-                user.password_plain = None
-                user.browser_auth_enabled = False
-                credentials_generated -= 1
+            continue
+        messages_sent += 1
+        delivered.append({
+            "id": user.id,
+            "login": login,
+            "password_hash": password_hash,
+            "password_plain": password,  # Сохраняем пароль в открытом виде для админов
+            "browser_auth_enabled": True,
+        })
+    
+    # Один пакетный UPDATE по первичному ключу вместо N изменений ORM-объектов
+    if delivered:
+        await db.execute(update(models.User), delivered)
+        db.add_all([
+            models.Notification(
+                user_id=row["id"],
+                type="system",
+                title="Учётные данные для входа",
+                message=f"Вам назначены учётные данные для входа через браузер. Логин: {row['login']}",
+            )
+            for row in delivered
+        ])
+    credentials_generated = len(delivered)
     
     # Сохраняем все изменения
     await db.commit()
@@ -2475,7 +2509,7 @@ async def bulk_send_credentials(
     }
 
 
-async def broadcast_announcement_to_users(
+async def create_broadcast_job(
     db: AsyncSession,
     subject: str,
     body_plain: str,
@@ -2483,90 +2517,54 @@ async def broadcast_announcement_to_users(
     append_login_url: bool,
     send_email: bool,
     send_telegram: bool,
-) -> dict:
-    """Рассылка сообщения по email и/или Telegram.
+    created_by: Optional[int] = None,
+) -> models.BroadcastJob:
+    """Ставит рассылку по email и/или Telegram в очередь фонового воркера.
 
     Получатели: статус ``approved``, не ``deleted`` / ``blocked``.
     Email: валидный адрес в профиле. Telegram: ``telegram_id`` не меньше 0.
-
-    Returns:
-        Словарь с счётчиками по каналам и списком ``failed`` с ключами
-        ``channel``, ``target``, ``detail``.
+    На каждого получателя и канал создаётся строка ``broadcast_deliveries``
+    в статусе ``pending``; отправляет их ``broadcast_jobs.broadcast_worker``.
     """
     login_url = None
     if append_login_url:
         raw = (getattr(settings, "WEB_APP_LOGIN_URL", None) or "").strip()
         login_url = raw or None
 
-    sent_ok_email = 0
-    sent_ok_telegram = 0
-    recipient_count_email = 0
-    recipient_count_telegram = 0
-    failed: list[dict[str, str]] = []
+    job = models.BroadcastJob(subject=subject, created_by=created_by)
+    deliveries: list[dict] = []
 
     if send_email:
         users = await _fetch_broadcast_recipient_users(db, only_browser_users)
-        recipient_count_email = len(users)
-        body_html, body_text = build_broadcast_email_content(body_plain, login_url=login_url)
-        for user in users:
-            to_email = user.email.strip()
-            try:
-                ok = await send_email(
-                    to_email=to_email,
-                    subject=subject,
-                    body_html=body_html,
-                    body_text=body_text,
-                )
-                if ok:
-                    sent_ok_email += 1
-                else:
-                    failed.append(
-                        {
-                            "channel": "email",
-                            "target": to_email,
-                            "detail": "Не удалось отправить (проверьте SMTP)",
-                        }
-                    )
-            except Exception as exc:
-                logger.error("Ошибка рассылки на %s: %s", to_email, exc)
-                failed.append(
-                    {
-                        "channel": "email",
-                        "target": to_email,
-                        "detail": str(exc)[:500],
-                    }
-                )
+        job.email_html, job.email_text = build_broadcast_email_content(body_plain, login_url=login_url)
+        job.total_email = len(users)
+        deliveries.extend(
+            {"channel": "email", "target": user.email.strip(), "user_id": user.id}
+            for user in users
+        )
 
     if send_telegram:
         users_tg = await _fetch_broadcast_telegram_users(db, only_browser_users)
-        recipient_count_telegram = len(users_tg)
-        tg_text = _build_broadcast_telegram_html(subject, body_plain, login_url)
-        for user in users_tg:
-            tid = user.telegram_id
-            try:
-                await send_telegram_message(
-                    chat_id=int(tid),
-                    text=tg_text,
-                    parse_mode="HTML",
-                )
-                sent_ok_telegram += 1
-            except Exception as exc:
-                logger.error("Ошибка Telegram-рассылки %s: %s", tid, exc)
-                failed.append(
-                    {
-                        "channel": "telegram",
-                        "target": str(tid),
-                        "detail": str(exc)[:500],
-                    }
-                )
+        job.telegram_text = _build_broadcast_telegram_html(subject, body_plain, login_url)
+        job.total_telegram = len(users_tg)
+        deliveries.extend(
+            {"channel": "telegram", "target": str(user.telegram_id), "user_id": user.id}
+            for user in users_tg
+        )
 
-    return {
-        "recipient_count_email": recipient_count_email,
-        "recipient_count_telegram": recipient_count_telegram,
-        "sent_ok_email": sent_ok_email,
-        "sent_ok_telegram": sent_ok_telegram,
-        "failed": failed,
-    }
+    if not deliveries:
+        job.status = "completed"
+        job.finished_at = datetime.utcnow()
+    db.add(job)
+    await db.flush()
+    if deliveries:
+        await db.execute(
+            insert(models.BroadcastDelivery),
+            [{"job_id": job.id, **delivery} for delivery in deliveries],
+        )
+    await db.commit()
+    await db.refresh(job)
+    return job
 
 
 async def count_broadcast_email_recipients(
@@ -2693,81 +2691,89 @@ def _prepare_dates(start_date: Optional[date], end_date: Optional[date]):
     
     return start_date, end_date_inclusive
 
-async def get_general_statistics(db: AsyncSession, start_date: Optional[date] = None, end_date: Optional[date] = None):
-    start_date, end_date_inclusive = _prepare_dates(start_date, end_date)
-        
-    # Исправлено: считаем новых пользователей в периоде, а не всех пользователей
-    query_new_users = select(func.count(models.User.id)).where(
-        models.User.status != 'deleted',
-        models.User.registration_date.between(start_date, end_date_inclusive)
-    )
-    new_users_count = (await db.execute(query_new_users)).scalar_one()
+def _has_transfers(column, start_date=None, end_date_inclusive=None):
+    """
+    EXISTS: у пользователя есть перевод, где он в роли ``column`` (отправитель или получатель).
 
-    active_senders_q = select(models.Transaction.sender_id).join(
-        models.User, models.User.id == models.Transaction.sender_id
-    ).where(
-        models.Transaction.timestamp.between(start_date, end_date_inclusive),
-        models.User.status != 'deleted'
-    ).distinct()
+    Коррелирует с ``models.User``; проверка идёт по индексам (sender_id, timestamp) /
+    (receiver_id, timestamp) и не зависит от числа переводов, в отличие от DISTINCT
+    по всем отправителям и получателям.
+    """
+    query = select(models.Transaction.id).where(column == models.User.id)
+    if start_date is not None:
+        query = query.where(models.Transaction.timestamp.between(start_date, end_date_inclusive))
+    return query.exists()
 
-    active_receivers_q = select(models.Transaction.receiver_id).join(
-        models.User, models.User.id == models.Transaction.receiver_id
-    ).where(
-        models.Transaction.timestamp.between(start_date, end_date_inclusive),
-        models.User.status != 'deleted'
-    ).distinct()
 
-    active_senders_ids = (await db.execute(active_senders_q)).scalars().all()
-    active_receivers_ids = (await db.execute(active_receivers_q)).scalars().all()
-    active_users_count = len(set(active_senders_ids).union(set(active_receivers_ids)))
+def _active_users_count_query(start_date=None, end_date_inclusive=None):
+    """Число неудалённых пользователей, отправивших или получивших перевод (за период, если задан)."""
+    return select(func.count(models.User.id)).where(
+        models.User.status != 'deleted',
+        or_(
+            _has_transfers(models.Transaction.sender_id, start_date, end_date_inclusive),
+            _has_transfers(models.Transaction.receiver_id, start_date, end_date_inclusive),
+        ),
+    )
 
-    query_transactions = select(func.count(models.Transaction.id)).filter(models.Transaction.timestamp.between(start_date, end_date_inclusive))
-    transactions_count = (await db.execute(query_transactions)).scalar_one()
 
-    query_purchases = select(func.count(models.Purchase.id)).filter(models.Purchase.timestamp.between(start_date, end_date_inclusive))
-    shop_purchases = (await db.execute(query_purchases)).scalar_one()
+async def get_general_statistics(db: AsyncSession, start_date: Optional[date] = None, end_date: Optional[date] = None):
+    """
+    Все метрики общей статистики одним запросом.
 
-    query_turnover = select(func.sum(models.Transaction.amount)).filter(models.Transaction.timestamp.between(start_date, end_date_inclusive))
-    total_turnover = (await db.execute(query_turnover)).scalar_one_or_none() or 0
+    Переводы и покупки периода агрегируются по одному разу (однострочные CTE),
+    активные пользователи считаются через EXISTS.
+    """
+    start_date, end_date_inclusive = _prepare_dates(start_date, end_date)
 
-    query_spent = (
-        select(func.sum(models.MarketItem.price))
-        .join(models.Purchase, models.Purchase.item_id == models.MarketItem.id)
-        .filter(models.Purchase.timestamp.between(start_date, end_date_inclusive))
+    tx_totals = (
+        select(
+            func.count(models.Transaction.id).label("transactions_count"),
+            func.coalesce(func.sum(models.Transaction.amount), 0).label("total_turnover"),
+        )
+        .where(models.Transaction.timestamp.between(start_date, end_date_inclusive))
+        .cte("tx_totals")
+    )
+    purchase_totals = (
+        select(
+            func.count(models.Purchase.id).label("store_purchases_count"),
+            func.coalesce(func.sum(models.MarketItem.price), 0).label("total_store_spent"),
+        )
+        .outerjoin(models.MarketItem, models.MarketItem.id == models.Purchase.item_id)
+        .where(models.Purchase.timestamp.between(start_date, end_date_inclusive))
+        .cte("purchase_totals")
     )
-    total_store_spent = (await db.execute(query_spent)).scalar_one_or_none() or 0
 
-    return {
-        "new_users_count": new_users_count,
-        "active_users_count": active_users_count,
-        "transactions_count": transactions_count,
-        "store_purchases_count": shop_purchases,
-        "total_turnover": total_turnover,
-        "total_store_spent": total_store_spent,
-    }
+    query = select(
+        # Исправлено: считаем новых пользователей в периоде, а не всех пользователей
+        select(func.count(models.User.id)).where(
+            models.User.status != 'deleted',
+            models.User.registration_date.between(start_date, end_date_inclusive)
+        ).scalar_subquery().label("new_users_count"),
+        _active_users_count_query(start_date, end_date_inclusive).scalar_subquery().label("active_users_count"),
+        select(tx_totals.c.transactions_count).scalar_subquery().label("transactions_count"),
+        select(purchase_totals.c.store_purchases_count).scalar_subquery().label("store_purchases_count"),
+        select(tx_totals.c.total_turnover).scalar_subquery().label("total_turnover"),
+        select(purchase_totals.c.total_store_spent).scalar_subquery().label("total_store_spent"),
+    )
+    return dict((await db.execute(query)).one()._mapping)
 
 async def get_hourly_activity_stats(db: AsyncSession, start_date: Optional[date] = None, end_date: Optional[date] = None):
-    start_date, end_date_inclusive = _prepare_dates(start_date, end_date)
-    
-    moscow_time = models.Transaction.timestamp.op("AT TIME ZONE")('UTC').op("AT TIME ZONE")('Europe/Moscow')
-    
+    """Переводы по часам (Москва) за период — из агрегата ``daily_activity``."""
+    first_day, last_day = statistics_rollups.day_range(*_prepare_dates(start_date, end_date))
+
     query = (
         select(
-            extract('hour', moscow_time).label('hour'),
-            func.count(models.Transaction.id).label('transaction_count')
-        )
-        .join(models.User, models.User.id == models.Transaction.sender_id)
-        .filter(
-            models.Transaction.timestamp.between(start_date, end_date_inclusive),
-            models.User.status != 'deleted'
+            models.DailyActivity.hour_msk.label('hour'),
+            func.sum(models.DailyActivity.tx_count).label('transaction_count')
         )
-        .group_by(extract('hour', moscow_time))
+        .filter(models.DailyActivity.day.between(first_day, last_day))
+        .group_by(models.DailyActivity.hour_msk)
     )
     result = await db.execute(query)
     activity = result.all()
     hourly_stats = {hour: 0 for hour in range(24)}
     for row in activity:
-        if row.hour is not None: hourly_stats[row.hour] = row.transaction_count
+        hourly_stats[row.hour] = row.transaction_count
     return hourly_stats
 
 async def get_login_activity_stats(db: AsyncSession, start_date: Optional[date] = None, end_date: Optional[date] = None):
@@ -2794,84 +2800,69 @@ async def get_login_activity_stats(db: AsyncSession, start_date: Optional[date]
         if row.hour is not None: hourly_stats[row.hour] = row.login_count
     return hourly_stats
     
-async def get_user_engagement_stats(db: AsyncSession, start_date: Optional[date] = None, end_date: Optional[date] = None, limit: int = 5):
-    if end_date is None: end_date = datetime.utcnow().date()
-    if start_date is None: start_date = end_date - timedelta(days=365*5)
-    end_date_inclusive = end_date + timedelta(days=1)
-
-    query_senders = (
-        select(models.User, func.count(models.Transaction.id).label('sent_count'))
-        .join(models.Transaction, models.User.id == models.Transaction.sender_id)
+def _engagement_top_query(column, label: str, start_date: date, end_date: date, limit: int):
+    """Топ пользователей по ``column`` агрегата ``daily_user_activity`` за дни периода."""
+    total = func.sum(column)
+    return (
+        select(models.User, total.label(label))
+        .join(models.DailyUserActivity, models.User.id == models.DailyUserActivity.user_id)
         .filter(
-            models.Transaction.timestamp.between(start_date, end_date_inclusive),
+            models.DailyUserActivity.day.between(start_date, end_date),
+            column > 0,
             models.User.status != 'deleted'
         )
         .group_by(models.User.id)
-        .order_by(func.count(models.Transaction.id).desc()).limit(limit)
+        .order_by(total.desc()).limit(limit)
     )
-    top_senders = (await db.execute(query_senders)).all()
 
-    query_receivers = (
-        select(models.User, func.count(models.Transaction.id).label('received_count'))
-        .join(models.Transaction, models.User.id == models.Transaction.receiver_id)
-        .filter(
-            models.Transaction.timestamp.between(start_date, end_date_inclusive),
-            models.User.status != 'deleted'
-        )
-        .group_by(models.User.id)
-        .order_by(func.count(models.Transaction.id).desc()).limit(limit)
-    )
-    top_receivers = (await db.execute(query_receivers)).all()
+async def get_user_engagement_stats(db: AsyncSession, start_date: Optional[date] = None, end_date: Optional[date] = None, limit: int = 5):
+    """Топ отправителей и получателей за период — из агрегата ``daily_user_activity``."""
+    if end_date is None: end_date = datetime.utcnow().date()
+    if start_date is None: start_date = end_date - timedelta(days=365*5)
+
+    top_senders = (await db.execute(_engagement_top_query(
+        models.DailyUserActivity.sent_count, 'sent_count', start_date, end_date, limit
+    ))).all()
+    top_receivers = (await db.execute(_engagement_top_query(
+        models.DailyUserActivity.received_count, 'received_count', start_date, end_date, limit
+    ))).all()
     
     return {"top_senders": top_senders, "top_receivers": top_receivers}
 
+def _popular_items_query(start_date: date, end_date: date, limit: int):
+    """Самые покупаемые товары за дни периода из агрегата ``daily_item_sales``."""
+    # Только товары с покупками в периоде (INNER JOIN)
+    purchase_count = func.sum(models.DailyItemSales.purchase_count)
+    return (
+        select(models.MarketItem, purchase_count.label('purchase_count'))
+        .join(models.DailyItemSales, models.MarketItem.id == models.DailyItemSales.item_id)
+        .filter(models.DailyItemSales.day.between(start_date, end_date))
+        .group_by(models.MarketItem.id)
+        .order_by(purchase_count.desc())
+        .limit(limit)
+    )
+
 async def get_popular_items_stats(db: AsyncSession, start_date: Optional[date] = None, end_date: Optional[date] = None, limit: int = 10):
-    # Используем твою логику обработки дат
+    """Самые покупаемые товары за период — из агрегата ``daily_item_sales``."""
     if end_date is None: end_date = datetime.utcnow().date()
     if start_date is None: start_date = end_date - timedelta(days=365*5)
-    end_date_inclusive = end_date + timedelta(days=1)
 
-    # --- ИСПРАВЛЕНИЕ: Используем INNER JOIN вместо LEFT JOIN, чтобы показывать только товары с покупками в периоде
-    # Фильтр по дате применяем в условии JOIN для корректной работы
-    query = (
-        select(models.MarketItem, func.count(models.Purchase.id).label('purchase_count'))
-        .join(
-            models.Purchase, 
-            and_(
-                models.MarketItem.id == models.Purchase.item_id,
-                models.Purchase.timestamp.between(start_date, end_date_inclusive)
-            )
-        )
-        .options(selectinload(models.MarketItem.codes))
-        .group_by(models.MarketItem.id)
-        .order_by(func.count(models.Purchase.id).desc())
-        .limit(limit)
-    )
+    query = _popular_items_query(start_date, end_date, limit).options(selectinload(models.MarketItem.codes))
     # Возвращаем результат как есть, FastAPI/Pydantic сами преобразуют его
     return (await db.execute(query)).all()
 
-async def get_inactive_users(db: AsyncSession, start_date: Optional[date] = None, end_date: Optional[date] = None):
+def inactive_users_query(start_date: Optional[date] = None, end_date: Optional[date] = None):
+    """Пользователи без переводов за период — NOT EXISTS вместо списка id в Python."""
     start_date, end_date_inclusive = _prepare_dates(start_date, end_date)
+    return select(models.User).filter(
+        models.User.status != 'deleted',
+        ~_has_transfers(models.Transaction.sender_id, start_date, end_date_inclusive),
+        ~_has_transfers(models.Transaction.receiver_id, start_date, end_date_inclusive),
+    )
 
-    active_senders_q = select(models.Transaction.sender_id).filter(models.Transaction.timestamp.between(start_date, end_date_inclusive)).distinct()
-    active_recipients_q = select(models.Transaction.receiver_id).filter(models.Transaction.timestamp.between(start_date, end_date_inclusive)).distinct()
-    
-    active_senders = (await db.execute(active_senders_q)).scalars().all()
-    active_recipients = (await db.execute(active_recipients_q)).scalars().all()
-    
-    active_user_ids = set(active_senders).union(set(active_recipients))
-    
-    # Исправлено: обрабатываем случай пустого списка активных пользователей
-    if not active_user_ids:
-        # Если нет активных пользователей, возвращаем всех неактивных
-        return (await db.execute(select(models.User).filter(
-            models.User.status != 'deleted'
-        ))).scalars().all()
-    
-    return (await db.execute(select(models.User).filter(
-        models.User.id.notin_(active_user_ids),
-        models.User.status != 'deleted'
-    ))).scalars().all()
+async def get_inactive_users(db: AsyncSession, start_date: Optional[date] = None, end_date: Optional[date] = None):
+    """Пользователи без переводов за период — один запрос."""
+    return (await db.execute(inactive_users_query(start_date, end_date))).scalars().all()
     
 async def get_total_balance(db: AsyncSession):
     total = (await db.execute(
@@ -2880,24 +2871,14 @@ async def get_total_balance(db: AsyncSession):
     return total or 0
 
 async def get_active_user_ratio(db: AsyncSession):
-    total_users = (await db.execute(
+    """Активные (был хоть один перевод) и неактивные пользователи за всё время — один запрос."""
+    query = select(
         select(func.count(models.User.id)).where(models.User.status != 'deleted')
-    )).scalar_one()
-
-    active_senders_q = select(models.Transaction.sender_id).join(
-        models.User, models.User.id == models.Transaction.sender_id
-    ).where(models.User.status != 'deleted').distinct()
-    
-    active_recipients_q = select(models.Transaction.receiver_id).join(
-        models.User, models.User.id == models.Transaction.receiver_id
-    ).where(models.User.status != 'deleted').distinct()
-
-    active_senders = (await db.execute(active_senders_q)).scalars().all()
-    active_recipients = (await db.execute(active_recipients_q)).scalars().all()
-    
-    active_user_ids_count = len(set(active_senders).union(set(active_recipients)))
-    inactive_users_count = total_users - active_user_ids_count
-    return {"active_users": active_user_ids_count, "inactive_users": inactive_users_count}
+        .scalar_subquery().label("total_users"),
+        _active_users_count_query().scalar_subquery().label("active_users"),
+    )
+    row = (await db.execute(query)).one()
+    return {"active_users": row.active_users, "inactive_users": row.total_users - row.active_users}
 
 async def get_average_session_duration(db: AsyncSession, start_date: Optional[date] = None, end_date: Optional[date] = None):
     start_date, end_date_inclusive = _prepare_dates(start_date, end_date)
@@ -3043,6 +3024,7 @@ async def generate_monthly_leaderboard_banners(db: AsyncSession):
 
     # 7. Сохраняем все изменения (удаление старых, добавление новых)
     await db.commit()
+    await _invalidate_banners_cache("баннеры рейтинга за месяц")
     print("Monthly leaderboard banners generated successfully.")
 
 # --- CRUD ОПЕРАЦИИ ДЛЯ STATIX BONUS ---
@@ -3059,6 +3041,7 @@ async def create_statix_bonus_item(db: AsyncSession, item_data: dict):
     db.add(db_item)
     await db.commit()
     await db.refresh(db_item)
+    await _invalidate_statix_bonus_cache("создание товара Statix")
     return db_item
 
 async def update_statix_bonus_item(db: AsyncSession, item_id: int, item_data: dict):
@@ -3076,6 +3059,7 @@ async def update_statix_bonus_item(db: AsyncSession, item_id: int, item_data: di
     
     await db.commit()
     await db.refresh(db_item)
+    await _invalidate_statix_bonus_cache(f"обновление товара Statix {item_id}")
     return db_item
 
 def _normalize_statix_phone(phone_number: Optional[str]) -> str:
@@ -3249,15 +3233,16 @@ async def create_statix_bonus_purchase(db: AsyncSession, user_id: int, bonus_amo
                 send_purchase_notification_to_admins,
             )
             user_name_display = f"{user.first_name or ''} {user.last_name or ''}".strip()
+            emails = []
             if user.email:
-                await send_purchase_confirmation_to_user(
+                emails.append(send_purchase_confirmation_to_user(
                     to_email=user.email,
                     user_name=user_name_display,
                     item_name="Бонусы Statix",
                     amount=int(thanks_cost),
                     purchase_type="statix",
-                )
-            await send_purchase_notification_to_admins(
+                ))
+            emails.append(send_purchase_notification_to_admins(
                 purchase_type="statix",
                 user_name=user_name_display,
                 user_phone=user.phone_number or "",
@@ -3265,7 +3250,8 @@ async def create_statix_bonus_purchase(db: AsyncSession, user_id: int, bonus_amo
                 item_name="Бонусы Statix",
                 amount=int(thanks_cost),
                 extra_info=f"Куплено бонусов: {bonus_amount}",
-            )
+            ))
+            await asyncio.gather(*emails)
         except Exception as e:
             print(f"Could not send Statix purchase emails. Error: {e}")
 
@@ -3370,6 +3356,7 @@ async def generate_current_month_test_banners(db: AsyncSession):
         print(f"Failed to generate 'senders' test banner: {e}")
 
     await db.commit()
+    await _invalidate_banners_cache("тестовые баннеры рейтинга")
     print("TEST leaderboard banners generation finished.")
 
 # --- ФУНКЦИИ ДЛЯ СОВМЕСТНЫХ ПОДАРКОВ ---
@@ -3514,11 +3501,14 @@ async def accept_shared_gift_invitation(db: AsyncSession, invitation_id: int, us
     # Деление стоимости убрано - покупатель платит полную стоимость
     
     # Создаем покупку только для покупателя
+    purchase_time = datetime.utcnow()
     purchase_buyer = models.Purchase(
         user_id=invitation.buyer_id,
-        item_id=invitation.item_id
+        item_id=invitation.item_id,
+        timestamp=purchase_time
     )
     db.add(purchase_buyer)
+    await statistics_rollups.record_purchase(db, invitation.item_id, purchase_time)
     
     # Приглашенный пользователь не получает покупку, так как не платит
     
@@ -3530,6 +3520,7 @@ async def accept_shared_gift_invitation(db: AsyncSession, invitation_id: int, us
     item.stock -= 1
     
     await db.commit()
+    await _invalidate_market_cache(f"совместная покупка товара {item.id}")
     
     # Отправляем уведомление покупателю
     try:
@@ -3577,15 +3568,16 @@ async def accept_shared_gift_invitation(db: AsyncSession, invitation_id: int, us
         )
         buyer_name = f"{buyer.first_name or ''} {buyer.last_name or ''}".strip()
         invited_name = f"{invitation.invited_user.first_name or ''} {invitation.invited_user.last_name or ''}".strip()
+        emails = []
         if buyer.email:
-            await send_purchase_confirmation_to_user(
+            emails.append(send_purchase_confirmation_to_user(
                 to_email=buyer.email,
                 user_name=buyer_name,
                 item_name=item.name,
                 amount=item.price,
                 purchase_type="shared",
-            )
-        await send_purchase_notification_to_admins(
+            ))
+        emails.append(send_purchase_notification_to_admins(
             purchase_type="shared",
             user_name=buyer_name,
             user_phone=buyer.phone_number or "",
@@ -3593,7 +3585,8 @@ async def accept_shared_gift_invitation(db: AsyncSession, invitation_id: int, us
             item_name=item.name,
             amount=item.price,
             extra_info=f"Приглашённый: {invited_name}. Совместная покупка завершена.",
-        )
+        ))
+        await asyncio.gather(*emails)
     except Exception as e:
         print(f"Could not send shared gift emails. Error: {e}")
 
@@ -6,6 +6,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 import crud
 from admin_panel_auth import parse_session_token, synthetic_panel_admin_user
 from database import get_db
+from identity_cache import UserIdentity, identity_cache
 from models import User
 
 
@@ -60,7 +61,12 @@ async def get_current_user(
     header_user_id: Optional[str] = Header(alias="X-User-Id", default=None),
     db: AsyncSession = Depends(get_db),
 ) -> User:
-    """Получает текущего пользователя по Telegram ID или User ID из заголовка."""
+    """
+    Получает текущего пользователя по Telegram ID или User ID из заголовка.
+
+    Полная строка ``users`` в сессии запроса — для эндпоинтов, которые отдают
+    или меняют профиль. Если нужен только id — ``get_current_identity``.
+    """
     user = await _resolve_user_from_headers(telegram_id, header_user_id, db)
     if not user:
         raise HTTPException(
@@ -70,6 +76,21 @@ async def get_current_user(
     return user
 
 
+async def get_current_identity(
+    telegram_id: Optional[str] = Header(alias="X-Telegram-Id", default=None),
+    header_user_id: Optional[str] = Header(alias="X-User-Id", default=None),
+    db: AsyncSession = Depends(get_db),
+) -> UserIdentity:
+    """Текущий пользователь из кеша авторизации (без SELECT на попадании)."""
+    identity = await identity_cache.resolve(db, telegram_id, header_user_id)
+    if not identity:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not authenticated",
+        )
+    return identity
+
+
 async def get_current_admin_user(
     authorization: Optional[str] = Header(default=None, alias="Authorization"),
     telegram_id: Optional[str] = Header(alias="X-Telegram-Id", default=None),
@@ -79,17 +100,19 @@ async def get_current_admin_user(
     """
     Администратор: Bearer сессии панели (env) или пользователь БД с ``is_admin``.
 
-    Порядок: сначала Bearer, затем заголовки Telegram / X-User-Id.
+    Порядок: сначала Bearer, затем заголовки Telegram / X-User-Id (через кеш
+    авторизации). Возвращается ORM-объект вне сессии с полями ``UserIdentity`` —
+    id, права и имя для логов, как и у администратора панели.
     """
     bearer = _parse_bearer_authorization(authorization)
     if bearer:
         email = parse_session_token(bearer)
         if email:
             return synthetic_panel_admin_user(email)
-    user = await _resolve_user_from_headers(telegram_id, header_user_id, db)
-    if not user or not user.is_admin:
+    identity = await identity_cache.resolve(db, telegram_id, header_user_id)
+    if not identity or not identity.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You do not have permission to access this resource",
         )
-    return user
+    return identity.as_user()
@@ -52,11 +52,23 @@ def _create_source_engine() -> AsyncEngine:
     )
 
 
+# Производные таблицы не копируются с источника — пересобираются локально после синхронизации.
+DERIVED_TABLES = frozenset({
+    "leaderboard_monthly_totals",
+    "daily_activity",
+    "daily_user_activity",
+    "daily_item_sales",
+})
+# Служебное состояние этого экземпляра (очереди рассылок, уведомлений и отчётов) — не копируется вовсе.
+LOCAL_TABLES = frozenset({"broadcast_jobs", "broadcast_deliveries", "outbox_messages", "report_jobs"})
+
+
 def _sorted_orm_tables() -> list[Table]:
-    """Таблицы моделей в порядке, уважающем внешние ключи."""
+    """Таблицы моделей в порядке, уважающем внешние ключи (без производных и локальных)."""
     import models  # noqa: F401 — регистрация в Base.metadata
 
-    return list(Base.metadata.sorted_tables)
+    skipped = DERIVED_TABLES | LOCAL_TABLES
+    return [t for t in Base.metadata.sorted_tables if t.name not in skipped]
 
 
 DUAL_SYNC_STATE_TABLE = "dual_db_sync_state"
@@ -402,6 +414,32 @@ async def run_one_sync_pass(source_engine: AsyncEngine) -> dict[str, int]:
                     "Синхронизация: не удалось выровнять последовательности SERIAL"
                 )
 
+        if stats.get("transactions"):
+            try:
+                from database import AsyncSessionLocal
+                from leaderboard_engine import leaderboard_engine
+                from leaderboard_totals import rebuild_leaderboard_totals
+
+                async with AsyncSessionLocal() as db:
+                    await rebuild_leaderboard_totals(db)
+                    await leaderboard_engine.rebuild(db)
+            except Exception:
+                logger.exception(
+                    "Синхронизация: не удалось пересобрать агрегаты рейтинга"
+                )
+
+        if stats.get("transactions") or stats.get("purchases"):
+            try:
+                from database import AsyncSessionLocal
+                from statistics_rollups import rebuild_statistics_rollups
+
+                async with AsyncSessionLocal() as db:
+                    await rebuild_statistics_rollups(db)
+            except Exception:
+                logger.exception(
+                    "Синхронизация: не удалось пересобрать дневные агрегаты статистики"
+                )
+
     return stats
 
 
@@ -1,13 +1,20 @@
 """
 Модуль для отправки email через SMTP Timeweb
+
+Письма уходят через ``smtp_pool`` — пул уже авторизованных SMTP-сессий, чтобы
+массовая рассылка не делала TLS-рукопожатие и логин на каждое письмо.
 """
+import asyncio
 import aiosmtplib
+from collections import deque
+from dataclasses import dataclass, field
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from typing import List, Optional
 import html
 import logging
 import re
+import time
 from config import settings
 
 logger = logging.getLogger(__name__)
@@ -19,6 +26,275 @@ def is_valid_email(email: str) -> bool:
     return bool(re.match(pattern, email))
 
 
+def _smtp_hosts() -> list[str]:
+    """Основной хост SMTP и альтернативы для fallback."""
+    smtp_host = getattr(settings, 'SMTP_HOST', 'smtp.timeweb.ru')
+    # Примечание: smtp.timeweb.com не работает (DNS не разрешается), поэтому не добавляем его как fallback
+    smtp_hosts = [smtp_host]
+    if smtp_host == 'smtp.timeweb.com':
+        # Если указан неправильный хост .com, добавляем правильный .ru
+        smtp_hosts.append('smtp.timeweb.ru')
+        logger.warning("Используется устаревший хост smtp.timeweb.com. Рекомендуется использовать smtp.timeweb.ru")
+    return smtp_hosts
+
+
+def _smtp_credentials() -> Optional[tuple[str, str]]:
+    """Проверенные (SMTP_USERNAME, SMTP_PASSWORD) или ``None``, если отправка невозможна."""
+    smtp_username = getattr(settings, 'SMTP_USERNAME', None)
+    smtp_password = getattr(settings, 'SMTP_PASSWORD', None)
+
+    if not smtp_username or not smtp_password:
+        logger.error("SMTP настройки не заданы. Проверьте SMTP_USERNAME и SMTP_PASSWORD в .env")
+        return None
+
+    # Проверяем, что пароль не пустой и не состоит только из пробелов
+    smtp_password = smtp_password.strip() if smtp_password else ""
+    if not smtp_password:
+        logger.error("SMTP_PASSWORD пустой или содержит только пробелы. Проверьте настройки в .env")
+        return None
+
+    # Дополнительная проверка: если пароль выглядит как неправильно экранированный (содержит \Y вместо \\Y)
+    # Это может произойти, если в .env файле пароль записан без кавычек или с одинарным обратным слэшем
+    # Но мы не можем автоматически исправлять, так как это может быть правильный пароль
+    # Просто логируем предупреждение
+    if '\\Y' in smtp_password and '\\\\Y' not in smtp_password:
+        logger.warning(
+            "В пароле обнаружен одинарный обратный слэш перед Y. "
+            "Если пароль содержит обратный слэш, убедитесь, что в .env файле он правильно экранирован: "
+            'SMTP_PASSWORD="sec\\\\ret" (удвоенный \\ внутри кавычек для пароля с обратным слэшем)'
+        )
+
+    # Проверяем, что SMTP_USERNAME является валидным email адресом
+    smtp_username = smtp_username.strip()
+    if not is_valid_email(smtp_username):
+        logger.error(
+            f"SMTP_USERNAME '{smtp_username}' не является валидным email адресом. "
+            "Укажите полный email (например: noreply@yourdomain.ru)"
+        )
+        return None
+    return smtp_username, smtp_password
+
+
+def _log_smtp_diagnostics(smtp_username: str, smtp_password: str) -> None:
+    """Диагностика учётных данных (без полного пароля) — при открытии новой сессии."""
+    password_length = len(smtp_password)
+    # Показываем первые 2 и последние 2 символа пароля для диагностики
+    if password_length > 4:
+        password_preview = f"{smtp_password[:2]}...{smtp_password[-2:]}"
+    elif password_length > 0:
+        password_preview = f"{smtp_password[0]}***"
+    else:
+        password_preview = "пустой"
+
+    # Проверяем наличие специальных символов
+    special_chars = [c for c in smtp_password if c in ['\\', '-', '.', '#', '$', '%', '&', '@']]
+    special_chars_info = f", содержит спецсимволы: {special_chars}" if special_chars else ""
+
+    logger.info(f"SMTP диагностика: username='{smtp_username}', password_length={password_length}, password_preview='{password_preview}'{special_chars_info}")
+
+
+def _is_auth_error(error: Exception) -> bool:
+    error_msg = str(error)
+    return (
+        "535" in error_msg
+        or "Incorrect authentication data" in error_msg
+        or "SMTPAuthenticationError" in type(error).__name__
+        or "authentication" in error_msg.lower()
+    )
+
+
+def _log_smtp_auth_error(host: str, smtp_username: str, smtp_password: str) -> None:
+    password_preview = f"{smtp_password[:2]}...{smtp_password[-2:]}" if len(smtp_password) > 4 else "***"
+    logger.error(
+        f"Ошибка аутентификации SMTP на {host}. "
+        f"Проверьте:\n"
+        f"  1. SMTP_USERNAME должен быть полным email адресом (например: noreply@yourdomain.ru)\n"
+        f"     Текущее значение: '{smtp_username}'\n"
+        f"  2. SMTP_PASSWORD должен быть правильным паролем от почтового ящика\n"
+        f"     Длина пароля: {len(smtp_password)} символов\n"
+        f"     Preview: '{password_preview}'\n"
+        f"  3. Убедитесь, что пароль правильно экранирован в .env файле:\n"
+        f"     - Если пароль содержит обратный слэш (\\), удвойте его в .env файле\n"
+        f"     - Пример: пароль `a\\b` в .env → SMTP_PASSWORD=\"a\\\\b\"\n"
+        f"     - Или одинарные кавычки в .env: SMTP_PASSWORD='a\\b'\n"
+        f"     - Если пароль содержит другие спецсимволы (#, $, %, &), заключите его в кавычки\n"
+        f"  4. Для Timeweb адрес From должен совпадать с SMTP_USERNAME\n"
+        f"     From адрес: '{smtp_username}'\n"
+        f"  5. Убедитесь, что:\n"
+        f"     - Почтовый ящик существует и активен\n"
+        f"     - Пароль правильный (попробуйте войти через веб-интерфейс Timeweb)\n"
+        f"     - В панели Timeweb включена возможность отправки через SMTP\n"
+        f"     - Не используется двухфакторная аутентификация (или используйте пароль приложения)\n"
+        f"  6. Проверьте правильность пароля:\n"
+        f"     - Запустите скрипт проверки: python backend/check_smtp.py\n"
+        f"     - Или проверьте пароль вручную, войдя в почтовый ящик через веб-интерфейс"
+    )
+
+
+def _new_smtp_client(host: str) -> aiosmtplib.SMTP:
+    """Клиент aiosmtplib с параметрами шифрования по порту (ещё не подключён)."""
+    smtp_port = getattr(settings, 'SMTP_PORT', 465)
+    if smtp_port == 465:
+        # SSL соединение (порт 465) - используем SSL/TLS
+        return aiosmtplib.SMTP(hostname=host, port=smtp_port, use_tls=True, tls_context=None, timeout=30)
+    if smtp_port == 587:
+        # TLS соединение (порт 587) - сначала обычное соединение, потом STARTTLS
+        return aiosmtplib.SMTP(hostname=host, port=smtp_port, start_tls=True, timeout=30)
+    # Другие порты - используем настройки из конфига
+    smtp_use_tls = getattr(settings, 'SMTP_USE_TLS', False)
+    return aiosmtplib.SMTP(hostname=host, port=smtp_port, use_tls=smtp_use_tls, start_tls=not smtp_use_tls, timeout=30)
+
+
+def _is_transient_smtp_error(error: Exception) -> bool:
+    """Обрыв сессии или временный отказ 4xx (в т.ч. 421) — стоит переподключиться и повторить."""
+    if isinstance(error, (aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPTimeoutError)):
+        return True
+    return isinstance(error, aiosmtplib.SMTPResponseException) and 400 <= error.code < 500
+
+
+@dataclass
+class _PooledSession:
+    smtp: aiosmtplib.SMTP
+    host: str
+    sent: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+
+
+class _MinuteBudget:
+    """Скользящее окно: не больше ``limit`` отправок за последние 60 секунд (0 — без лимита)."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._sent_at: deque[float] = deque()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.limit <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                while self._sent_at and now - self._sent_at[0] >= 60:
+                    self._sent_at.popleft()
+                if len(self._sent_at) < self.limit:
+                    self._sent_at.append(now)
+                    return
+                await asyncio.sleep(60 - (now - self._sent_at[0]))
+
+
+class SmtpPool:
+    """Пул авторизованных SMTP-сессий с ограниченной параллельностью.
+
+    Не больше ``size`` сессий и одновременных отправок; бюджет писем в минуту
+    общий для пула. Сессия закрывается после ``max_messages_per_session`` писем
+    или ``idle_seconds`` простоя. На обрыв и ответы 4xx/421 письмо отправляется
+    повторно через новую сессию.
+    """
+
+    def __init__(self, size: int, max_per_minute: int, idle_seconds: float, max_messages_per_session: int):
+        self.size = size
+        self.max_per_minute = max_per_minute
+        self.idle_seconds = idle_seconds
+        self.max_messages_per_session = max_messages_per_session
+        self._idle: list[_PooledSession] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._budget: Optional[_MinuteBudget] = None
+
+    def _bind_loop(self) -> None:
+        """Примитивы asyncio и сессии привязаны к event loop (скрипты зовут asyncio.run повторно)."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._idle = []
+        self._slots = asyncio.Semaphore(self.size)
+        self._budget = _MinuteBudget(self.max_per_minute)
+
+    async def _open_session(self, smtp_username: str, smtp_password: str) -> _PooledSession:
+        """Подключение и логин; перебирает хосты из ``_smtp_hosts`` (кроме ошибок аутентификации)."""
+        smtp_hosts = _smtp_hosts()
+        smtp_port = getattr(settings, 'SMTP_PORT', 465)
+        _log_smtp_diagnostics(smtp_username, smtp_password)
+        last_error: Optional[Exception] = None
+        for host_to_try in smtp_hosts:
+            smtp = _new_smtp_client(host_to_try)
+            try:
+                logger.info(f"Подключение к SMTP {host_to_try}:{smtp_port}...")
+                await smtp.connect()
+                await smtp.login(smtp_username, smtp_password)
+                logger.info(f"SMTP-сессия с {host_to_try} открыта, аутентификация успешна")
+                return _PooledSession(smtp=smtp, host=host_to_try)
+            except Exception as host_error:
+                last_error = host_error
+                smtp.close()
+                logger.warning(f"Не удалось открыть SMTP-сессию с {host_to_try}: {type(host_error).__name__}: {host_error}")
+                if _is_auth_error(host_error):
+                    _log_smtp_auth_error(host_to_try, smtp_username, smtp_password)
+                    # Для ошибок аутентификации не пробуем другие хосты
+                    break
+        raise last_error if last_error else Exception("Не удалось отправить email через все доступные хосты")
+
+    async def _close_session(self, session: _PooledSession) -> None:
+        try:
+            await asyncio.wait_for(session.smtp.quit(), timeout=5)
+        except Exception:
+            session.smtp.close()
+
+    async def _acquire_session(self, smtp_username: str, smtp_password: str) -> _PooledSession:
+        now = time.monotonic()
+        while self._idle:
+            session = self._idle.pop()
+            if session.smtp.is_connected and now - session.last_used < self.idle_seconds:
+                return session
+            await self._close_session(session)
+        return await self._open_session(smtp_username, smtp_password)
+
+    async def _release_session(self, session: _PooledSession) -> None:
+        session.sent += 1
+        session.last_used = time.monotonic()
+        if session.sent >= self.max_messages_per_session:
+            await self._close_session(session)
+        else:
+            self._idle.append(session)
+
+    async def send(self, message: MIMEMultipart, smtp_username: str, smtp_password: str) -> str:
+        """Отправляет письмо через свободную сессию; возвращает хост. Ошибки пробрасываются."""
+        self._bind_loop()
+        await self._budget.acquire()
+        async with self._slots:
+            session = await self._acquire_session(smtp_username, smtp_password)
+            try:
+                await session.smtp.send_message(message)
+            except Exception as e:
+                await self._close_session(session)
+                if not _is_transient_smtp_error(e):
+                    raise
+                logger.warning(f"SMTP-сессия с {session.host} недоступна ({type(e).__name__}: {e}), переподключение")
+                session = await self._open_session(smtp_username, smtp_password)
+                try:
+                    await session.smtp.send_message(message)
+                except Exception:
+                    await self._close_session(session)
+                    raise
+            await self._release_session(session)
+            return session.host
+
+    async def close(self) -> None:
+        """Закрывает простаивающие сессии (при остановке приложения или в конце скрипта)."""
+        idle, self._idle = self._idle, []
+        for session in idle:
+            await self._close_session(session)
+
+
+smtp_pool = SmtpPool(
+    size=settings.SMTP_POOL_SIZE,
+    max_per_minute=settings.SMTP_MAX_PER_MINUTE,
+    idle_seconds=settings.SMTP_POOL_IDLE_SECONDS,
+    max_messages_per_session=settings.SMTP_MAX_MESSAGES_PER_SESSION,
+)
+
+
 async def send_email(
     to_email: str,
     subject: str,
@@ -27,7 +303,7 @@ async def send_email(
     from_email: Optional[str] = None
 ) -> bool:
     """
-    Отправляет email через SMTP Timeweb
+    Отправляет email через SMTP Timeweb (сессия берётся из ``smtp_pool``)
     
     Args:
         to_email: Email получателя
@@ -40,66 +316,10 @@ async def send_email(
         True если письмо отправлено успешно, False в противном случае
     """
     try:
-        # Получаем настройки SMTP из конфигурации
-        smtp_host = getattr(settings, 'SMTP_HOST', 'smtp.timeweb.ru')
-        smtp_port = getattr(settings, 'SMTP_PORT', 465)
-        smtp_username = getattr(settings, 'SMTP_USERNAME', None)
-        smtp_password = getattr(settings, 'SMTP_PASSWORD', None)
-        smtp_use_tls = getattr(settings, 'SMTP_USE_TLS', False)
-        
-        # Альтернативные хосты для fallback (если основной не работает)
-        # Примечание: smtp.timeweb.com не работает (DNS не разрешается), поэтому не добавляем его как fallback
-        smtp_hosts = [smtp_host]
-        if smtp_host == 'smtp.timeweb.com':
-            # Если указан неправильный хост .com, добавляем правильный .ru
-            smtp_hosts.append('smtp.timeweb.ru')
-            logger.warning("Используется устаревший хост smtp.timeweb.com. Рекомендуется использовать smtp.timeweb.ru")
-        
-        if not smtp_username or not smtp_password:
-            logger.error("SMTP настройки не заданы. Проверьте SMTP_USERNAME и SMTP_PASSWORD в .env")
-            return False
-        
-        # Проверяем, что пароль не пустой и не состоит только из пробелов
-        smtp_password = smtp_password.strip() if smtp_password else ""
-        if not smtp_password:
-            logger.error("SMTP_PASSWORD пустой или содержит только пробелы. Проверьте настройки в .env")
+        credentials = _smtp_credentials()
+        if credentials is None:
             return False
-        
-        # Дополнительная проверка: если пароль выглядит как неправильно экранированный (содержит \Y вместо \\Y)
-        # Это может произойти, если в .env файле пароль записан без кавычек или с одинарным обратным слэшем
-        # Но мы не можем автоматически исправлять, так как это может быть правильный пароль
-        # Просто логируем предупреждение
-        if '\\Y' in smtp_password and '\\\\Y' not in smtp_password:
-            logger.warning(
-                "В пароле обнаружен одинарный обратный слэш перед Y. "
-                "Если пароль содержит обратный слэш, убедитесь, что в .env файле он правильно экранирован: "
-                'SMTP_PASSWORD="sec\\\\ret" (удвоенный \\ внутри кавычек для пароля с обратным слэшем)'
-            )
-        
-        # Проверяем, что SMTP_USERNAME является валидным email адресом
-        smtp_username = smtp_username.strip()
-        if not is_valid_email(smtp_username):
-            logger.error(
-                f"SMTP_USERNAME '{smtp_username}' не является валидным email адресом. "
-                "Укажите полный email (например: noreply@yourdomain.ru)"
-            )
-            return False
-        
-        # Логируем диагностическую информацию (без полного пароля)
-        password_length = len(smtp_password)
-        # Показываем первые 2 и последние 2 символа пароля для диагностики
-        if password_length > 4:
-            password_preview = f"{smtp_password[:2]}...{smtp_password[-2:]}"
-        elif password_length > 0:
-            password_preview = f"{smtp_password[0]}***"
-        else:
-            password_preview = "пустой"
-        
-        # Проверяем наличие специальных символов
-        special_chars = [c for c in smtp_password if c in ['\\', '-', '.', '#', '$', '%', '&', '@']]
-        special_chars_info = f", содержит спецсимволы: {special_chars}" if special_chars else ""
-        
-        logger.info(f"SMTP диагностика: username='{smtp_username}', password_length={password_length}, password_preview='{password_preview}'{special_chars_info}")
+        smtp_username, smtp_password = credentials
         
         # Для Timeweb SMTP адрес отправителя должен совпадать с SMTP_USERNAME
         # Это критично для успешной аутентификации
@@ -114,9 +334,6 @@ async def send_email(
                 f"Адрес {from_email} будет использован как Reply-To."
             )
         
-        # Логируем настройки для диагностики (без пароля)
-        logger.info(f"SMTP настройки: host={smtp_host}, port={smtp_port}, username={smtp_username}, from={sender_email}, to={to_email}, password_set={'да' if smtp_password else 'нет'}")
-        
         # Создаем сообщение
         message = MIMEMultipart('alternative')
         message['From'] = sender_email
@@ -135,129 +352,9 @@ async def send_email(
         html_part = MIMEText(body_html, 'html', 'utf-8')
         message.attach(html_part)
         
-        # Пробуем отправить через каждый хост из списка (fallback механизм)
-        last_error = None
-        for host_to_try in smtp_hosts:
-            try:
-                logger.info(f"Попытка отправки email через {host_to_try}:{smtp_port}")
-                
-                # Отправляем через SMTP
-                if smtp_port == 465:
-                    # SSL соединение (порт 465) - используем SSL/TLS
-                    # Для Timeweb важно использовать правильные настройки SSL
-                    async with aiosmtplib.SMTP(
-                        hostname=host_to_try,
-                        port=smtp_port,
-                        use_tls=True,  # SSL через TLS
-                        tls_context=None,  # Используем контекст по умолчанию
-                        timeout=30
-                    ) as smtp:
-                        logger.info(f"Подключение к {host_to_try}:{smtp_port} установлено, выполняется аутентификация...")
-                        logger.debug(f"Аутентификация: username='{smtp_username}', password_length={len(smtp_password)}, password_repr={repr(smtp_password[:5])}...")
-                        try:
-                            await smtp.login(smtp_username, smtp_password)
-                            logger.info(f"Аутентификация успешна, отправка сообщения...")
-                        except Exception as auth_error:
-                            error_msg = str(auth_error)
-                            logger.error(f"Ошибка при аутентификации на {host_to_try}: {type(auth_error).__name__}: {error_msg}")
-                            logger.error(f"Проверяемые данные: username='{smtp_username}', password_length={len(smtp_password)}")
-                            # Показываем первые и последние символы пароля для диагностики
-                            if len(smtp_password) > 4:
-                                logger.error(f"Password preview: '{smtp_password[:2]}...{smtp_password[-2:]}'")
-                            # Проверяем наличие невидимых символов
-                            if any(ord(c) < 32 and c not in ['\n', '\r', '\t'] for c in smtp_password):
-                                logger.warning("В пароле обнаружены невидимые символы (коды < 32)")
-                            raise
-                        await smtp.send_message(message)
-                elif smtp_port == 587:
-                    # TLS соединение (порт 587) - сначала обычное соединение, потом STARTTLS
-                    async with aiosmtplib.SMTP(
-                        hostname=host_to_try,
-                        port=smtp_port,
-                        start_tls=True
-                    ) as smtp:
-                        try:
-                            await smtp.login(smtp_username, smtp_password)
-                        except Exception as auth_error:
-                            error_msg = str(auth_error)
-                            logger.error(f"Ошибка при аутентификации на {host_to_try}: {type(auth_error).__name__}: {error_msg}")
-                            logger.error(f"Проверяемые данные: username='{smtp_username}', password_length={len(smtp_password)}")
-                            if len(smtp_password) > 4:
-                                logger.error(f"Password preview: '{smtp_password[:2]}...{smtp_password[-2:]}'")
-                            raise
-                        await smtp.send_message(message)
-                else:
-                    # Другие порты - используем настройки из конфига
-                    async with aiosmtplib.SMTP(
-                        hostname=host_to_try,
-                        port=smtp_port,
-                        use_tls=smtp_use_tls,
-                        start_tls=not smtp_use_tls if not smtp_use_tls else False
-                    ) as smtp:
-                        try:
-                            await smtp.login(smtp_username, smtp_password)
-                        except Exception as auth_error:
-                            error_msg = str(auth_error)
-                            logger.error(f"Ошибка при аутентификации на {host_to_try}: {type(auth_error).__name__}: {error_msg}")
-                            logger.error(f"Проверяемые данные: username='{smtp_username}', password_length={len(smtp_password)}")
-                            if len(smtp_password) > 4:
-                                logger.error(f"Password preview: '{smtp_password[:2]}...{smtp_password[-2:]}'")
-                            raise
-                        await smtp.send_message(message)
-                
-                logger.info(f"Email успешно отправлен на {to_email} через {host_to_try}")
-                return True
-                
-            except Exception as host_error:
-                last_error = host_error
-                error_msg = str(host_error)
-                error_type = type(host_error).__name__
-                
-                # Детальное логирование ошибки
-                logger.warning(f"Не удалось отправить через {host_to_try}: {error_type}: {error_msg}")
-                
-                # Специальная обработка ошибок аутентификации
-                if "535" in error_msg or "Incorrect authentication data" in error_msg or "SMTPAuthenticationError" in error_type or "authentication" in error_msg.lower():
-                    password_preview = f"{smtp_password[:2]}...{smtp_password[-2:]}" if len(smtp_password) > 4 else "***"
-                    logger.error(
-                        f"Ошибка аутентификации SMTP на {host_to_try}. "
-                        f"Проверьте:\n"
-                        f"  1. SMTP_USERNAME должен быть полным email адресом (например: noreply@yourdomain.ru)\n"
-                        f"     Текущее значение: '{smtp_username}'\n"
-                        f"  2. SMTP_PASSWORD должен быть правильным паролем от почтового ящика\n"
-                        f"     Длина пароля: {len(smtp_password)} символов\n"
-                        f"     Preview: '{password_preview}'\n"
-                        f"  3. Убедитесь, что пароль правильно экранирован в .env файле:\n"
-                        f"     - Если пароль содержит обратный слэш (\\), удвойте его в .env файле\n"
-                        f"     - Пример: пароль `a\\b` в .env → SMTP_PASSWORD=\"a\\\\b\"\n"
-                        f"     - Или одинарные кавычки в .env: SMTP_PASSWORD='a\\b'\n"
-                        f"     - Если пароль содержит другие спецсимволы (#, $, %, &), заключите его в кавычки\n"
-                        f"  4. Для Timeweb адрес From должен совпадать с SMTP_USERNAME\n"
-                        f"     From адрес: '{sender_email}'\n"
-                        f"  5. Убедитесь, что:\n"
-                        f"     - Почтовый ящик существует и активен\n"
-                        f"     - Пароль правильный (попробуйте войти через веб-интерфейс Timeweb)\n"
-                        f"     - В панели Timeweb включена возможность отправки через SMTP\n"
-                        f"     - Не используется двухфакторная аутентификация (или используйте пароль приложения)\n"
-                        f"  6. Проверьте правильность пароля:\n"
-                        f"     - Запустите скрипт проверки: python backend/check_smtp.py\n"
-                        f"     - Или проверьте пароль вручную, войдя в почтовый ящик через веб-интерфейс"
-                    )
-                    # Для ошибок аутентификации не пробуем другие хосты
-                    break
-                
-                # Если это ошибка DNS и есть еще хосты для попытки, продолжаем
-                if "Name or service not known" in error_msg or "NXDOMAIN" in error_msg:
-                    if host_to_try != smtp_hosts[-1]:  # Если это не последний хост
-                        logger.info(f"Пробуем альтернативный хост...")
-                        continue
-                
-                # Для других ошибок тоже пробуем следующий хост, если есть
-                if host_to_try != smtp_hosts[-1]:
-                    continue
-        
-        # Если все хосты не сработали, выбрасываем последнюю ошибку
-        raise last_error if last_error else Exception("Не удалось отправить email через все доступные хосты")
+        host = await smtp_pool.send(message, smtp_username, smtp_password)
+        logger.info(f"Email успешно отправлен на {to_email} через {host}")
+        return True
         
     except Exception as e:
         logger.error(f"Ошибка при отправке email на {to_email}: {e}")
@@ -272,6 +369,11 @@ async def send_email(
         return False
 
 
+async def send_emails(messages: List[dict]) -> List[bool]:
+    """Параллельная отправка нескольких писем (аргументы ``send_email``); параллельность ограничивает пул."""
+    return list(await asyncio.gather(*(send_email(**message) for message in messages)))
+
+
 async def send_registration_notification_to_admins(
     user_email: Optional[str],
     user_name: str,
@@ -361,16 +463,12 @@ async def send_registration_notification_to_admins(
 {f"Веб-заявка: логин/пароль в админке «Заявки на регистрацию»; после одобрения — письмо пользователю (если указан email)." if is_web_registration else ""}
         """
         
-        # Отправляем уведомление каждому админу
-        success_count = 0
-        for admin_email in admin_email_list:
-            if await send_email(
-                to_email=admin_email,
-                subject=subject,
-                body_html=html_body,
-                body_text=text_body
-            ):
-                success_count += 1
+        # Отправляем уведомление всем админам параллельно
+        results = await send_emails([
+            {"to_email": admin_email, "subject": subject, "body_html": html_body, "body_text": text_body}
+            for admin_email in admin_email_list
+        ])
+        success_count = sum(results)
         
         logger.info(f"Уведомления о регистрации отправлены {success_count} из {len(admin_email_list)} админам")
         return success_count > 0
@@ -688,11 +786,11 @@ async def send_purchase_notification_to_admins(
         </html>
         """
 
-        success = 0
-        for admin_email in admin_list:
-            if await send_email(to_email=admin_email, subject=subject, body_html=html_body):
-                success += 1
-        return success > 0
+        results = await send_emails([
+            {"to_email": admin_email, "subject": subject, "body_html": html_body}
+            for admin_email in admin_list
+        ])
+        return any(results)
     except Exception as e:
         logger.error(f"Ошибка при отправке уведомления админам о покупке: {e}")
         return False
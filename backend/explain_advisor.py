@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Советник по индексам: выполняет EXPLAIN для горячих запросов crud на локальной
+PostgreSQL (DATABASE_URL) и помечает последовательные сканы больших таблиц.
+
+    python explain_advisor.py            # с SET enable_seqscan = off (см. ниже)
+    python explain_advisor.py --natural  # планы как их выбрал бы планировщик
+    python explain_advisor.py --analyze  # EXPLAIN ANALYZE (запросы выполняются)
+
+На маленькой dev-базе планировщик выбирает Seq Scan даже при наличии индекса,
+поэтому по умолчанию seq scan «штрафуется»: если он всё равно остался в плане —
+подходящего индекса нет.
+"""
+import argparse
+import asyncio
+import json
+import sys
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+# Добавляем текущую директорию в путь для импорта модулей
+sys.path.append(str(Path(__file__).parent))
+
+from sqlalchemy import and_, func, select, text
+from sqlalchemy.dialects import postgresql
+
+import crud
+import models
+from database import engine
+
+# Таблицы, которые растут вместе с активностью — Seq Scan по ним недопустим
+HOT_TABLES = {
+    "transactions", "notifications", "purchases", "user_sessions",
+    "daily_user_activity", "daily_item_sales",
+}
+
+_SAMPLE_USER_ID = 1
+
+
+def _period() -> tuple[date, date]:
+    end = datetime.utcnow().date() + timedelta(days=1)
+    return end - timedelta(days=30), end
+
+
+def _hot_queries() -> list[tuple[str, object]]:
+    """(название, SQLAlchemy-запрос) — копии запросов из crud.py и роутеров."""
+    start, end = _period()
+    return [
+        ("crud.get_feed", crud._transactions_page_stmt(7, 200, None)),
+        (
+            "crud.get_user_transactions",
+            crud._transactions_page_stmt(7, 200, None).where(
+                (models.Transaction.sender_id == _SAMPLE_USER_ID)
+                | (models.Transaction.receiver_id == _SAMPLE_USER_ID)
+            ),
+        ),
+        ("crud.get_leaderboard_data (current_month)", crud._leaderboard_totals_query("current_month", "received")),
+        ("crud.get_leaderboard_data (all_time)", crud._leaderboard_totals_query("all_time", "sent")),
+        (
+            "crud.get_general_statistics (transactions)",
+            select(func.count(models.Transaction.id)).where(models.Transaction.timestamp.between(start, end)),
+        ),
+        (
+            "crud.get_user_engagement_stats (senders)",
+            crud._engagement_top_query(models.DailyUserActivity.sent_count, "sent_count", start, end, 5),
+        ),
+        ("crud.get_popular_items_stats", crud._popular_items_query(start, end, 10)),
+        (
+            "crud.get_average_session_duration",
+            select(func.avg(func.extract('epoch', models.UserSession.last_seen - models.UserSession.session_start)))
+            .where(models.UserSession.session_start.between(start, end)),
+        ),
+        (
+            "routers.notifications.list_notifications",
+            select(models.Notification)
+            .where(models.Notification.user_id == _SAMPLE_USER_ID)
+            .order_by(models.Notification.created_at.desc())
+            .limit(50),
+        ),
+        (
+            "routers.notifications.get_unread_count",
+            select(func.count(models.Notification.id)).where(
+                and_(models.Notification.user_id == _SAMPLE_USER_ID, models.Notification.is_read == False)  # noqa: E712
+            ),
+        ),
+    ]
+
+
+def _compile(stmt) -> str:
+    return str(stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+def _walk(node: dict, depth: int = 0):
+    yield node, depth
+    for child in node.get("Plans", []):
+        yield from _walk(child, depth + 1)
+
+
+async def run(natural: bool, analyze: bool) -> int:
+    flagged = 0
+    explain_opts = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+    async with engine.connect() as conn:
+        for name, stmt in _hot_queries():
+            async with conn.begin() as trans:
+                if not natural:
+                    await conn.execute(text("SET LOCAL enable_seqscan = off"))
+                result = await conn.execute(text(f"EXPLAIN ({explain_opts}) {_compile(stmt)}"))
+                raw_plan = result.scalar_one()
+                await trans.rollback()
+
+            plan = (json.loads(raw_plan) if isinstance(raw_plan, str) else raw_plan)[0]["Plan"]
+            seq_scans = [
+                node["Relation Name"]
+                for node, _ in _walk(plan)
+                if node.get("Node Type") == "Seq Scan" and node.get("Relation Name") in HOT_TABLES
+            ]
+            status = "❌ SEQ SCAN: " + ", ".join(sorted(set(seq_scans))) if seq_scans else "✅"
+            print(f"{status}  {name}  (cost {plan['Total Cost']})")
+            for node, depth in _walk(plan):
+                relation = f" on {node['Relation Name']}" if "Relation Name" in node else ""
+                index = f" using {node['Index Name']}" if "Index Name" in node else ""
+                print(f"      {'  ' * depth}{node['Node Type']}{relation}{index}")
+            flagged += bool(seq_scans)
+
+    await engine.dispose()
+    print(f"\nЗапросов с последовательным сканом горячих таблиц: {flagged}")
+    return 1 if flagged else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--natural", action="store_true", help="не отключать enable_seqscan")
+    parser.add_argument("--analyze", action="store_true", help="EXPLAIN ANALYZE вместо EXPLAIN")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args.natural, args.analyze)))
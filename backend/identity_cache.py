@@ -0,0 +1,175 @@
+"""Кеш «кто делает запрос»: X-Telegram-Id / X-User-Id → снимок пользователя.
+
+Почти каждый эндпоинт резолвит пользователя по заголовку; без кеша это
+SELECT по ``users`` на каждый вызов. ``identity_cache`` держит в памяти
+процесса лёгкий ``UserIdentity`` (id, telegram_id, is_admin, статус, имя) не
+дольше ``IDENTITY_CACHE_TTL_SECONDS``. Промах читает только эти колонки и
+ничего не пишет.
+
+В снимке нет баланса и прочих часто меняющихся полей, поэтому сбрасывать его
+нужно только при смене статуса, прав, привязки Telegram или имени:
+``invalidate_user`` сразу чистит кеш своего процесса и через
+``INVALIDATION_CHANNEL`` — остальных (см. ``local_cache``).
+"""
+
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from local_cache import cache_invalidation_subscriber
+from models import User
+from redis_cache import redis_cache
+
+_MESSAGE_PREFIX = "identity:"
+
+
+@dataclass(frozen=True)
+class UserIdentity:
+    """Снимок пользователя для авторизации и логов; полная строка — ``get_current_user``."""
+
+    id: int
+    telegram_id: Optional[int]
+    is_admin: bool
+    status: Optional[str]
+    first_name: Optional[str]
+    last_name: Optional[str]
+    username: Optional[str]
+
+    def as_user(self) -> User:
+        """ORM-объект вне сессии (как ``synthetic_panel_admin_user``) для кода, ждущего ``User``."""
+        return User(
+            id=self.id,
+            telegram_id=self.telegram_id,
+            is_admin=self.is_admin,
+            status=self.status,
+            first_name=self.first_name,
+            last_name=self.last_name,
+            username=self.username,
+        )
+
+
+_COLUMNS = (
+    User.id,
+    User.telegram_id,
+    User.is_admin,
+    User.status,
+    User.first_name,
+    User.last_name,
+    User.username,
+)
+
+
+async def _load_by_telegram(db: AsyncSession, telegram_id: int) -> Optional[UserIdentity]:
+    # Анонимизированные пользователи (telegram_id < 0) не авторизуются
+    row = (
+        await db.execute(select(*_COLUMNS).where(User.telegram_id == telegram_id, User.telegram_id >= 0))
+    ).first()
+    return UserIdentity(*row) if row else None
+
+
+async def _load_by_id(db: AsyncSession, user_id: int) -> Optional[UserIdentity]:
+    row = (await db.execute(select(*_COLUMNS).where(User.id == user_id))).first()
+    return UserIdentity(*row) if row else None
+
+
+class IdentityCache:
+    """LRU с TTL по значению заголовка (``tg:…`` / ``id:…``)."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, UserIdentity]] = OrderedDict()
+        # Растёт при каждом сбросе: загрузка, начатая до него, не попадёт в кеш
+        self._epoch = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _get(self, key: str) -> Optional[UserIdentity]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, identity = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return identity
+
+    def _put(self, key: str, identity: UserIdentity, epoch: int) -> None:
+        if epoch != self._epoch:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, identity)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _resolve(self, key: str, loader) -> Optional[UserIdentity]:
+        identity = self._get(key)
+        if identity is not None:
+            return identity
+        epoch = self._epoch
+        identity = await loader()
+        # Несуществующих не кешируем: пользователь может зарегистрироваться через секунду
+        if identity is not None:
+            self._put(key, identity, epoch)
+        return identity
+
+    async def resolve(
+        self,
+        db: AsyncSession,
+        telegram_id: Optional[str],
+        header_user_id: Optional[str],
+    ) -> Optional[UserIdentity]:
+        """Как раньше в ``dependencies``: сначала X-Telegram-Id, затем X-User-Id."""
+        if telegram_id:
+            try:
+                tg = int(telegram_id)
+            except (ValueError, TypeError):
+                tg = None
+            if tg is not None:
+                identity = await self._resolve(f"tg:{tg}", lambda: _load_by_telegram(db, tg))
+                if identity is not None:
+                    return identity
+        if header_user_id:
+            try:
+                user_id = int(header_user_id)
+            except (ValueError, TypeError):
+                return None
+            return await self._resolve(f"id:{user_id}", lambda: _load_by_id(db, user_id))
+        return None
+
+    def invalidate(self, message: str) -> None:
+        """Сообщение канала ``identity:{user_id}`` — сбросить снимки этого пользователя."""
+        if not message.startswith(_MESSAGE_PREFIX):
+            return
+        try:
+            user_id = int(message[len(_MESSAGE_PREFIX):])
+        except ValueError:
+            return
+        self._epoch += 1
+        for key in [k for k, (_, identity) in self._entries.items() if identity.id == user_id]:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        self._epoch += 1
+        self._entries.clear()
+
+
+identity_cache = IdentityCache(
+    max_entries=settings.IDENTITY_CACHE_MAX_ENTRIES,
+    ttl=settings.IDENTITY_CACHE_TTL_SECONDS,
+)
+cache_invalidation_subscriber.register(identity_cache)
+
+
+async def invalidate_user(user_id: int) -> None:
+    """Сбросить снимок пользователя во всех процессах (после коммита изменений)."""
+    await redis_cache.publish_invalidation(f"{_MESSAGE_PREFIX}{user_id}")
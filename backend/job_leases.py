@@ -0,0 +1,75 @@
+"""Аренда фоновых заданий (``locked_until``) с продлением и проверкой владельца.
+
+Воркер забирает задание, выставляя ``locked_until``; пока аренда не истекла,
+другие воркеры его не трогают. Долгая работа продлевает аренду
+(``renew``/``hold``), а всё, что пишется в строку задания, сопровождается
+условием ``locked_until = held_until`` (``owned``/``update``): если аренда
+успела истечь и задание перехватил другой воркер, прежний владелец ничего не
+перезапишет и получит ``LeaseLost``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable
+from datetime import datetime, timedelta
+from typing import Any, TypeVar
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal
+
+T = TypeVar("T")
+
+
+class LeaseLost(RuntimeError):
+    """Аренду задания перехватил другой воркер — продолжать работу нельзя."""
+
+
+class JobLease:
+    """Своя аренда строки ``model``: ``locked_until`` меняется только при совпадении с ``held_until``."""
+
+    def __init__(self, model, job_id: int, held_until: datetime, lease_seconds: int):
+        self.model = model
+        self.job_id = job_id
+        self.held_until = held_until
+        self.lease_seconds = lease_seconds
+
+    def owned(self):
+        """Условие ``WHERE`` для записей, которые допустимы только под своей арендой."""
+        return (self.model.id == self.job_id) & (self.model.locked_until == self.held_until)
+
+    def deadline(self) -> datetime:
+        return datetime.utcnow() + timedelta(seconds=self.lease_seconds)
+
+    async def update(self, db: AsyncSession, **values: Any) -> None:
+        """Обновляет строку задания в транзакции ``db`` (без коммита), если аренда ещё своя."""
+        result = await db.execute(update(self.model).where(self.owned()).values(**values))
+        if result.rowcount != 1:
+            raise LeaseLost(f"Аренда задания {self.model.__tablename__}#{self.job_id} перехвачена другим воркером")
+        if "locked_until" in values:
+            self.held_until = values["locked_until"]
+
+    async def renew(self) -> None:
+        """Продлевает аренду, когда прошла половина срока; ``LeaseLost``, если её уже забрали."""
+        if self.held_until - datetime.utcnow() > timedelta(seconds=self.lease_seconds / 2):
+            return
+        # Отдельная сессия: в сессии воркера может быть открыт курсор или незакоммиченная пачка
+        async with AsyncSessionLocal() as db:
+            await self.update(db, locked_until=self.deadline())
+            await db.commit()
+
+    async def hold(self, work: Awaitable[T]) -> T:
+        """Выполняет ``work``, продлевая аренду; при потере аренды ``work`` отменяется."""
+        task = asyncio.ensure_future(work)
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=self.lease_seconds / 3)
+                if done:
+                    return task.result()
+                await self.renew()
+        finally:
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
@@ -0,0 +1,296 @@
+"""Рейтинг на Redis sorted sets: один ZSET на (период, тип рейтинга).
+
+Ключи: ``leaderboard:{type}:{YYYY-MM}`` для месяцев и ``leaderboard:{type}:all``
+для всей истории. Месячные ключи не зависят от «текущего» месяца, поэтому смена
+месяца не требует сброса: ``current_month`` и ``last_month`` просто указывают на
+другие ключи.
+
+Источник правды — ``leaderboard_monthly_totals`` в Postgres. ZSET пересобирается
+из него при старте (``rebuild``) и дальше обновляется ``record_transfer`` после
+каждого перевода. Пока Redis выключен или пересборка не выполнялась, методы
+чтения возвращают ``None`` и вызывающий код использует SQL.
+
+Переводы, пришедшие во время пересборки, иначе потерялись бы при подмене ключа
+(RENAME), поэтому пока держится ``_REBUILD_LOCK_KEY``, ``record_transfer``
+дописывает их ещё и в журнал ``_REBUILD_JOURNAL_KEY`` — даже когда флага
+готовности ещё нет. Пересборка читает
+Postgres в одном снимке REPEATABLE READ и при подмене ключей доигрывает из
+журнала только переводы, которых в этом снимке не было.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from datetime import date, datetime
+from typing import Optional
+
+from redis.exceptions import WatchError
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import leaderboard_totals
+import models
+from config import settings
+from database import AsyncSessionLocal
+from redis_cache import redis_cache
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_TYPES = ("received", "sent")
+TOP_LIMIT = 100
+# Месячный ключ должен дожить до конца следующего месяца (период last_month)
+MONTH_KEY_TTL_SECONDS = 70 * 24 * 3600
+_READY_KEY = "leaderboard:ready"
+_REBUILD_LOCK_KEY = "leaderboard:rebuild_lock"
+_REBUILD_LOCK_TTL_SECONDS = 120
+_REBUILD_JOURNAL_KEY = "leaderboard:rebuild_journal"
+# Пауза перед фоновой пересборкой после сбоя и между её попытками
+_REBUILD_RETRY_SECONDS = 30
+# Перевод в ZSET, если рейтинг готов, и в журнал, пока идёт пересборка (в том числе первая,
+# когда флага готовности ещё нет). Обе проверки атомарны с записью: пересборка не может
+# завершиться между ними.
+# KEYS: lock, journal, ready, received месяца, received всей истории, sent месяца, sent всей истории
+# ARGV: запись журнала, TTL журнала, сумма, получатель, отправитель, TTL месячного ключа
+_RECORD_TRANSFER_SCRIPT = """
+if redis.call('exists', KEYS[1]) == 1 then
+    redis.call('rpush', KEYS[2], ARGV[1])
+    redis.call('expire', KEYS[2], ARGV[2])
+end
+if redis.call('exists', KEYS[3]) == 1 then
+    redis.call('zincrby', KEYS[4], ARGV[3], ARGV[4])
+    redis.call('expire', KEYS[4], ARGV[6])
+    redis.call('zincrby', KEYS[5], ARGV[3], ARGV[4])
+    redis.call('zincrby', KEYS[6], ARGV[3], ARGV[5])
+    redis.call('expire', KEYS[6], ARGV[6])
+    redis.call('zincrby', KEYS[7], ARGV[3], ARGV[5])
+end
+"""
+
+
+def _key(leaderboard_type: str, month: Optional[date]) -> str:
+    suffix = month.strftime("%Y-%m") if month else "all"
+    return f"leaderboard:{leaderboard_type}:{suffix}"
+
+
+class LeaderboardEngine:
+    """Рейтинг с O(log N) ранжированием поверх ``redis_cache``."""
+
+    def __init__(self):
+        self._rebuild_task: Optional[asyncio.Task] = None
+
+    async def _client(self):
+        """Клиент Redis, если рейтинг в Redis готов к чтению; иначе ``None``."""
+        if not settings.REDIS_ENABLED or not redis_cache.redis_client:
+            return None
+        try:
+            if not await redis_cache.redis_client.exists(_READY_KEY):
+                return None
+        except Exception as e:
+            logger.warning("Рейтинг Redis недоступен, используется SQL: %s", e)
+            return None
+        return redis_cache.redis_client
+
+    async def record_transfer(
+        self, transaction_id: int, sender_id: int, receiver_id: int, amount: int, timestamp: datetime
+    ) -> None:
+        """Добавляет перевод в ZSET текущего месяца и всей истории (вызывать после commit)."""
+        # Не ``_client()``: во время первой пересборки флага готовности нет, а журнал нужен
+        if not settings.REDIS_ENABLED or not redis_cache.redis_client:
+            return
+        client = redis_cache.redis_client
+        month = leaderboard_totals.month_start(timestamp)
+        entry = json.dumps({
+            "id": transaction_id,
+            "month": month.isoformat(),
+            "sender_id": sender_id,
+            "receiver_id": receiver_id,
+            "amount": amount,
+        })
+        try:
+            await client.eval(
+                _RECORD_TRANSFER_SCRIPT, 7,
+                _REBUILD_LOCK_KEY, _REBUILD_JOURNAL_KEY, _READY_KEY,
+                _key("received", month), _key("received", None),
+                _key("sent", month), _key("sent", None),
+                entry, _REBUILD_LOCK_TTL_SECONDS, amount, str(receiver_id), str(sender_id),
+                MONTH_KEY_TTL_SECONDS,
+            )
+        except Exception as e:
+            # Рассинхронизация лечится пересборкой; снимаем флаг готовности, чтобы читать из SQL
+            logger.error("Не удалось обновить рейтинг в Redis: %s", e)
+            await self.invalidate()
+
+    async def remove_user(self, user_id: int) -> None:
+        """Убирает пользователя из всех актуальных рейтингов (анонимизация)."""
+        client = await self._client()
+        if client is None:
+            return
+        now = datetime.utcnow()
+        months = (leaderboard_totals.month_start(now), leaderboard_totals.previous_month_start(now), None)
+        try:
+            pipe = client.pipeline(transaction=False)
+            for leaderboard_type in LEADERBOARD_TYPES:
+                for month in months:
+                    pipe.zrem(_key(leaderboard_type, month), str(user_id))
+            await pipe.execute()
+        except Exception as e:
+            logger.error("Не удалось удалить пользователя %s из рейтинга Redis: %s", user_id, e)
+            await self.invalidate()
+
+    async def invalidate(self) -> None:
+        """Снимает флаг готовности: до пересборки чтения идут в SQL. Пересборка — в фоне."""
+        if not redis_cache.redis_client:
+            return
+        try:
+            await redis_cache.redis_client.delete(_READY_KEY)
+        except Exception as e:
+            logger.error("Не удалось снять флаг готовности рейтинга: %s", e)
+        self._schedule_rebuild()
+
+    def _schedule_rebuild(self) -> None:
+        """Одна фоновая пересборка на процесс; между процессами их разводит ``_REBUILD_LOCK_KEY``."""
+        if self._rebuild_task is not None and not self._rebuild_task.done():
+            return
+        self._rebuild_task = asyncio.create_task(self._rebuild_in_background(), name="leaderboard-rebuild")
+
+    async def _rebuild_in_background(self) -> None:
+        while settings.REDIS_ENABLED:
+            await asyncio.sleep(_REBUILD_RETRY_SECONDS)
+            try:
+                async with AsyncSessionLocal() as db:
+                    if await self.rebuild(db):
+                        return
+                # Пересборку выполняет другой воркер — ждём, пока он поднимет флаг готовности
+                if await redis_cache.redis_client.exists(_READY_KEY):
+                    return
+            except Exception as e:
+                logger.warning("Фоновая пересборка рейтинга не удалась, повтор через %s с: %s", _REBUILD_RETRY_SECONDS, e)
+
+    async def top(self, period: str, leaderboard_type: str, limit: int = TOP_LIMIT) -> Optional[list[tuple[int, int]]]:
+        """Топ пользователей: ``[(user_id, score), ...]`` или ``None`` (нужен SQL)."""
+        client = await self._client()
+        if client is None:
+            return None
+        key = _key(leaderboard_type, leaderboard_totals.period_month(period))
+        try:
+            rows = await client.zrevrange(key, 0, limit - 1, withscores=True)
+        except Exception as e:
+            logger.warning("ZREVRANGE %s не удался, используется SQL: %s", key, e)
+            return None
+        return [(int(member), int(score)) for member, score in rows]
+
+    async def rank(self, user_id: int, period: str, leaderboard_type: str) -> Optional[dict]:
+        """Ранг, очки и число участников в формате ``MyRankResponse`` или ``None``."""
+        client = await self._client()
+        if client is None:
+            return None
+        key = _key(leaderboard_type, leaderboard_totals.period_month(period))
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.zscore(key, str(user_id))
+            pipe.zcard(key)
+            score, participants = await pipe.execute()
+            if score is None:
+                return {"rank": None, "total_received": 0, "total_participants": participants}
+            # Ранг как у SQL RANK(): равные очки делят место
+            higher = await client.zcount(key, f"({score}", "+inf")
+        except Exception as e:
+            logger.warning("Ранг из Redis (%s) не получен, используется SQL: %s", key, e)
+            return None
+        return {"rank": higher + 1, "total_received": int(score), "total_participants": participants}
+
+    async def rebuild(self, db: AsyncSession) -> bool:
+        """Пересобирает ZSET текущего, прошлого месяца и всей истории из Postgres."""
+        if not settings.REDIS_ENABLED or not redis_cache.redis_client:
+            return False
+        client = redis_cache.redis_client
+        if not await client.set(_REBUILD_LOCK_KEY, "1", nx=True, ex=_REBUILD_LOCK_TTL_SECONDS):
+            logger.info("Пересборка рейтинга уже выполняется другим воркером")
+            return False
+        try:
+            await client.delete(_REBUILD_JOURNAL_KEY)
+            now = datetime.utcnow()
+            months = (leaderboard_totals.month_start(now), leaderboard_totals.previous_month_start(now), None)
+            # Свой снимок: переводы из журнала сверяются с тем же состоянием, из которого собраны ZSET
+            async with db.bind.connect() as conn:
+                await conn.execution_options(isolation_level="REPEATABLE READ")
+                scores = {}
+                for leaderboard_type in LEADERBOARD_TYPES:
+                    for month in months:
+                        scores[_key(leaderboard_type, month)] = await self._read_scores(conn, leaderboard_type, month)
+                await self._swap_in(client, conn, scores, months)
+            logger.info("Рейтинг в Redis пересобран из Postgres")
+            return True
+        finally:
+            await client.delete(_REBUILD_LOCK_KEY)
+
+    @staticmethod
+    async def _read_scores(conn, leaderboard_type: str, month: Optional[date]) -> dict[str, int]:
+        totals = models.LeaderboardMonthlyTotal
+        amount = leaderboard_totals.amount_column(leaderboard_type)
+        excluded_users = select(models.User.id).where(models.User.status == 'deleted')
+        query = (
+            select(totals.user_id, func.sum(amount))
+            .where(totals.user_id.not_in(excluded_users))
+            .group_by(totals.user_id)
+            .having(func.sum(amount) > 0)
+        )
+        if month is not None:
+            query = query.where(totals.month == month)
+        rows = (await conn.execute(query)).all()
+        return {str(user_id): int(score) for user_id, score in rows}
+
+    async def _swap_in(self, client, conn, scores: dict[str, dict[str, int]], months) -> None:
+        """Подменяет ключи и доигрывает журнал одной транзакцией Redis (повтор, если журнал дописали)."""
+        while True:
+            async with client.pipeline(transaction=True) as pipe:
+                try:
+                    await pipe.watch(_REBUILD_JOURNAL_KEY)
+                    entries = [json.loads(raw) for raw in await pipe.lrange(_REBUILD_JOURNAL_KEY, 0, -1)]
+                    missed = await self._missed_transfers(conn, entries)
+
+                    pipe.multi()
+                    for key, members in scores.items():
+                        tmp_key = f"{key}:rebuild"
+                        pipe.delete(tmp_key)
+                        if members:
+                            pipe.zadd(tmp_key, members)
+                            pipe.rename(tmp_key, key)
+                        else:
+                            pipe.delete(key)
+                    for entry in missed:
+                        month = date.fromisoformat(entry["month"])
+                        for leaderboard_type, user_id in (("received", entry["receiver_id"]), ("sent", entry["sender_id"])):
+                            for target in (month, None):
+                                # Ключи, которые не пересобирались, перевод уже получили напрямую
+                                if target in months:
+                                    pipe.zincrby(_key(leaderboard_type, target), entry["amount"], str(user_id))
+                    for leaderboard_type in LEADERBOARD_TYPES:
+                        for month in months:
+                            if month is not None:
+                                pipe.expire(_key(leaderboard_type, month), MONTH_KEY_TTL_SECONDS)
+                    pipe.set(_READY_KEY, "1")
+                    # Снятие блокировки вместе с подменой: следующие переводы идут уже в новые ключи
+                    pipe.delete(_REBUILD_JOURNAL_KEY, _REBUILD_LOCK_KEY)
+                    await pipe.execute()
+                    if missed:
+                        logger.info("Пересборка рейтинга: доиграно переводов из журнала: %s", len(missed))
+                    return
+                except WatchError:
+                    continue
+
+    @staticmethod
+    async def _missed_transfers(conn, entries: list[dict]) -> list[dict]:
+        """Переводы журнала, которых нет в снимке пересборки."""
+        if not entries:
+            return []
+        ids = {entry["id"] for entry in entries}
+        seen = set((await conn.execute(
+            select(models.Transaction.id).where(models.Transaction.id.in_(ids))
+        )).scalars())
+        return [entry for entry in entries if entry["id"] not in seen]
+
+
+leaderboard_engine = LeaderboardEngine()
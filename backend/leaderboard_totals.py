@@ -0,0 +1,139 @@
+"""Помесячные агрегаты рейтинга (``leaderboard_monthly_totals``).
+
+Каждый перевод увеличивает ``received_amount`` получателя и ``sent_amount``
+отправителя за месяц перевода в той же транзакции БД, что и сама запись в
+``transactions``. Рейтинг читает несколько сотен строк агрегата вместо
+``GROUP BY`` по всей истории переводов.
+"""
+
+from __future__ import annotations
+
+import logging
+from datetime import date, datetime
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+
+logger = logging.getLogger(__name__)
+
+# Суммы по (пользователь, месяц), посчитанные напрямую из transactions
+_RAW_TOTALS_SQL = """
+    SELECT user_id, month, SUM(received_amount) AS received_amount, SUM(sent_amount) AS sent_amount
+    FROM (
+        SELECT receiver_id AS user_id, date_trunc('month', timestamp)::date AS month,
+               amount AS received_amount, 0 AS sent_amount
+        FROM transactions
+        WHERE timestamp IS NOT NULL
+        UNION ALL
+        SELECT sender_id AS user_id, date_trunc('month', timestamp)::date AS month,
+               0 AS received_amount, amount AS sent_amount
+        FROM transactions
+        WHERE timestamp IS NOT NULL
+    ) AS t
+    GROUP BY user_id, month
+"""
+
+
+def month_start(moment: datetime | date) -> date:
+    """Первое число месяца для даты/времени (ключ агрегата)."""
+    return date(moment.year, moment.month, 1)
+
+
+def previous_month_start(moment: datetime | date) -> date:
+    """Первое число предыдущего месяца."""
+    if moment.month == 1:
+        return date(moment.year - 1, 12, 1)
+    return date(moment.year, moment.month - 1, 1)
+
+
+def period_month(period: str, now: Optional[datetime] = None) -> Optional[date]:
+    """Месяц агрегата для периода рейтинга; ``None`` — вся история (all_time)."""
+    now = now or datetime.utcnow()
+    if period == "current_month":
+        return month_start(now)
+    if period == "last_month":
+        return previous_month_start(now)
+    return None
+
+
+def amount_column(leaderboard_type: str):
+    """Колонка агрегата для типа рейтинга: 'received' или 'sent'."""
+    if leaderboard_type == "received":
+        return models.LeaderboardMonthlyTotal.received_amount
+    return models.LeaderboardMonthlyTotal.sent_amount
+
+
+async def record_transfer(
+    db: AsyncSession,
+    sender_id: int,
+    receiver_id: int,
+    amount: int,
+    timestamp: datetime,
+) -> None:
+    """Добавляет перевод в агрегаты. Коммит — на стороне вызывающего кода."""
+    table = models.LeaderboardMonthlyTotal.__table__
+    month = month_start(timestamp)
+    rows = [
+        {"user_id": receiver_id, "month": month, "received_amount": amount, "sent_amount": 0},
+        {"user_id": sender_id, "month": month, "received_amount": 0, "sent_amount": amount},
+    ]
+    if sender_id == receiver_id:
+        rows = [{"user_id": sender_id, "month": month, "received_amount": amount, "sent_amount": amount}]
+
+    stmt = pg_insert(table).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.month],
+        set_={
+            "received_amount": table.c.received_amount + stmt.excluded.received_amount,
+            "sent_amount": table.c.sent_amount + stmt.excluded.sent_amount,
+        },
+    )
+    await db.execute(stmt)
+
+
+async def rebuild_leaderboard_totals(db: AsyncSession) -> int:
+    """Пересобирает агрегаты из transactions целиком. Возвращает число строк."""
+    await db.execute(text("LOCK TABLE leaderboard_monthly_totals IN EXCLUSIVE MODE"))
+    await db.execute(text("DELETE FROM leaderboard_monthly_totals"))
+    result = await db.execute(
+        text(
+            f"""
+            INSERT INTO leaderboard_monthly_totals (user_id, month, received_amount, sent_amount)
+            {_RAW_TOTALS_SQL}
+            """
+        )
+    )
+    await db.commit()
+    logger.info("Агрегаты рейтинга пересобраны: %s строк", result.rowcount)
+    return result.rowcount
+
+
+async def find_leaderboard_totals_mismatches(db: AsyncSession, limit: int = 100) -> list[dict]:
+    """Сверяет агрегаты с transactions; возвращает расхождения (пусто — всё согласовано)."""
+    result = await db.execute(
+        text(
+            f"""
+            WITH raw AS ({_RAW_TOTALS_SQL})
+            SELECT
+                COALESCE(raw.user_id, agg.user_id) AS user_id,
+                COALESCE(raw.month, agg.month) AS month,
+                COALESCE(raw.received_amount, 0) AS expected_received,
+                COALESCE(agg.received_amount, 0) AS actual_received,
+                COALESCE(raw.sent_amount, 0) AS expected_sent,
+                COALESCE(agg.sent_amount, 0) AS actual_sent
+            FROM raw
+            FULL OUTER JOIN leaderboard_monthly_totals agg
+                ON agg.user_id = raw.user_id AND agg.month = raw.month
+            WHERE COALESCE(raw.received_amount, 0) <> COALESCE(agg.received_amount, 0)
+               OR COALESCE(raw.sent_amount, 0) <> COALESCE(agg.sent_amount, 0)
+            ORDER BY month, user_id
+            LIMIT :limit
+            """
+        ),
+        {"limit": limit},
+    )
+    return [dict(row._mapping) for row in result.all()]
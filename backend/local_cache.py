@@ -0,0 +1,158 @@
+"""Внутрипроцессный уровень кеша (LRU + TTL) перед Redis.
+
+Редко меняющиеся данные (баннеры, товары, настройки темы, товар Statix)
+читает каждый воркер на каждом запросе; даже попадание в Redis стоит сетевого
+обхода. ``local_cache`` держит последние ответы в памяти процесса, не больше
+``LOCAL_CACHE_MAX_ENTRIES`` записей и не дольше ``LOCAL_CACHE_TTL_SECONDS``.
+
+Согласованность между воркерами uvicorn и узлами: ``redis_cache.clear_all_users_key``
+сразу сбрасывает локальный уровень своего процесса и публикует имя ключа в
+канал ``INVALIDATION_CHANNEL``; ``cache_invalidation_subscriber`` в каждом
+процессе слушает канал и передаёт сообщение всем зарегистрированным кешам
+(``register``; так же подключён ``identity_cache``). Если подписка прервалась,
+сообщения могли потеряться — локальные кеши очищаются целиком. Без Redis
+межпроцессной инвалидации нет, устаревание ограничено TTL.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Protocol
+
+from config import settings
+from redis_cache import INVALIDATION_CHANNEL, redis_cache
+
+logger = logging.getLogger(__name__)
+
+# Пауза перед переподпиской после обрыва соединения с Redis
+_RESUBSCRIBE_DELAY_SECONDS = 5.0
+
+
+class LocalCache:
+    """LRU с TTL; записи сгруппированы по пространствам (market, banners, ...)."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[tuple[str, str], tuple[float, Any]] = OrderedDict()
+        # Эпоха пространства растёт при каждой инвалидации: загрузка, начатая
+        # до неё, не положит в кеш устаревший результат
+        self._epochs: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def epoch(self, namespace: str) -> int:
+        return self._epochs.setdefault(namespace, 0)
+
+    def get(self, namespace: str, variant: str) -> Optional[Any]:
+        entry = self._entries.get((namespace, variant))
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[(namespace, variant)]
+            return None
+        self._entries.move_to_end((namespace, variant))
+        return value
+
+    def put(self, namespace: str, variant: str, value: Any, epoch: int) -> None:
+        """Сохраняет значение, если с момента ``epoch`` пространство не инвалидировали."""
+        if epoch != self._epochs.get(namespace):
+            return
+        self._entries[(namespace, variant)] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end((namespace, variant))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, namespace: str) -> None:
+        # Пространства, которые здесь не загружались (чужие сообщения канала), не трогаем
+        if namespace not in self._epochs:
+            return
+        self._epochs[namespace] += 1
+        for entry_key in [k for k in self._entries if k[0] == namespace]:
+            del self._entries[entry_key]
+
+    def clear(self) -> None:
+        for namespace in list(self._epochs):
+            self._epochs[namespace] += 1
+        self._entries.clear()
+
+
+class InvalidatableCache(Protocol):
+    def invalidate(self, message: str) -> None: ...
+
+    def clear(self) -> None: ...
+
+
+class CacheInvalidationSubscriber:
+    """Фоновая подписка на ``INVALIDATION_CHANNEL`` с переподключением."""
+
+    def __init__(self):
+        self.caches: list[InvalidatableCache] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, cache: InvalidatableCache) -> None:
+        """Кеш получает сообщения канала и сбросы своего процесса (``redis_cache.publish_invalidation``)."""
+        self.caches.append(cache)
+        redis_cache.add_invalidation_listener(cache.invalidate)
+
+    def _clear_all(self) -> None:
+        for cache in self.caches:
+            cache.clear()
+
+    def start(self) -> None:
+        if not settings.REDIS_ENABLED:
+            return
+        if self._task is not None and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run(), name="cache-invalidation-subscriber")
+        logger.info("Подписка на инвалидацию кеша запущена")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            pubsub = None
+            try:
+                if not redis_cache.redis_client:
+                    await redis_cache.connect()
+                pubsub = redis_cache.redis_client.pubsub(ignore_subscribe_messages=True)
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                # Пока подписки не было, инвалидации могли пройти мимо
+                self._clear_all()
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        for cache in self.caches:
+                            cache.invalidate(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Подписка на инвалидацию кеша прервана, локальный кеш очищен: %s", e)
+                self._clear_all()
+            finally:
+                if pubsub is not None:
+                    try:
+                        await pubsub.aclose()
+                    except Exception:
+                        pass
+            await asyncio.sleep(_RESUBSCRIBE_DELAY_SECONDS)
+
+
+local_cache = LocalCache(
+    max_entries=settings.LOCAL_CACHE_MAX_ENTRIES,
+    ttl=settings.LOCAL_CACHE_TTL_SECONDS,
+)
+cache_invalidation_subscriber = CacheInvalidationSubscriber()
+cache_invalidation_subscriber.register(local_cache)
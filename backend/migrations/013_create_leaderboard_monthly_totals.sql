@@ -0,0 +1,32 @@
+-- Миграция: помесячные агрегаты рейтинга (получено/отправлено) вместо GROUP BY по всей transactions
+-- Дата: 2026-10-17
+
+CREATE TABLE IF NOT EXISTS leaderboard_monthly_totals (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    month DATE NOT NULL,
+    received_amount INTEGER NOT NULL DEFAULT 0,
+    sent_amount INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, month)
+);
+
+CREATE INDEX IF NOT EXISTS idx_leaderboard_totals_month_received ON leaderboard_monthly_totals(month, received_amount DESC);
+CREATE INDEX IF NOT EXISTS idx_leaderboard_totals_month_sent ON leaderboard_monthly_totals(month, sent_amount DESC);
+
+-- Первичное заполнение из существующей истории переводов
+INSERT INTO leaderboard_monthly_totals (user_id, month, received_amount, sent_amount)
+SELECT user_id, month, SUM(received_amount), SUM(sent_amount)
+FROM (
+    SELECT receiver_id AS user_id, date_trunc('month', timestamp)::date AS month, amount AS received_amount, 0 AS sent_amount
+    FROM transactions
+    WHERE timestamp IS NOT NULL
+    UNION ALL
+    SELECT sender_id AS user_id, date_trunc('month', timestamp)::date AS month, 0 AS received_amount, amount AS sent_amount
+    FROM transactions
+    WHERE timestamp IS NOT NULL
+) AS t
+GROUP BY user_id, month
+ON CONFLICT (user_id, month) DO UPDATE
+SET received_amount = EXCLUDED.received_amount,
+    sent_amount = EXCLUDED.sent_amount;
+
+COMMENT ON TABLE leaderboard_monthly_totals IS 'Помесячные суммы полученных/отправленных спасибок для рейтинга';
@@ -0,0 +1,20 @@
+-- Миграция: составные индексы для горячих запросов (лента, история, рейтинг, статистика)
+-- Дата: 2026-10-17
+-- Проверка планов: python explain_advisor.py
+
+-- Лента и keyset-пагинация: ORDER BY timestamp DESC, id DESC; фильтры статистики по периоду
+CREATE INDEX IF NOT EXISTS idx_transactions_timestamp_id ON transactions(timestamp DESC, id DESC);
+
+-- История пользователя (sender_id = ? OR receiver_id = ? → BitmapOr), рейтинг по получателям/отправителям
+CREATE INDEX IF NOT EXISTS idx_transactions_receiver_timestamp ON transactions(receiver_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_transactions_sender_timestamp ON transactions(sender_id, timestamp);
+
+-- Список уведомлений пользователя: WHERE user_id = ? ORDER BY created_at DESC
+CREATE INDEX IF NOT EXISTS idx_notifications_user_created_at ON notifications(user_id, created_at DESC);
+
+-- Статистика покупок и сессий за период
+CREATE INDEX IF NOT EXISTS idx_purchases_timestamp ON purchases(timestamp);
+CREATE INDEX IF NOT EXISTS idx_user_sessions_session_start ON user_sessions(session_start);
+
+-- idx_notifications_user_id покрывается новым составным индексом (user_id — ведущая колонка)
+DROP INDEX IF EXISTS idx_notifications_user_id;
@@ -0,0 +1,40 @@
+-- Миграция: фоновые рассылки с состоянием доставки по каждому получателю
+-- Дата: 2026-10-17
+
+CREATE TABLE IF NOT EXISTS broadcast_jobs (
+    id SERIAL PRIMARY KEY,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    subject VARCHAR(200) NOT NULL,
+    email_html TEXT,
+    email_text TEXT,
+    telegram_text TEXT,
+    created_by INTEGER,
+    total_email INTEGER NOT NULL DEFAULT 0,
+    total_telegram INTEGER NOT NULL DEFAULT 0,
+    sent_ok_email INTEGER NOT NULL DEFAULT 0,
+    sent_ok_telegram INTEGER NOT NULL DEFAULT 0,
+    failed_count INTEGER NOT NULL DEFAULT 0,
+    locked_until TIMESTAMP,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+    id SERIAL PRIMARY KEY,
+    job_id INTEGER NOT NULL REFERENCES broadcast_jobs(id) ON DELETE CASCADE,
+    channel VARCHAR(20) NOT NULL,
+    target VARCHAR(255) NOT NULL,
+    user_id INTEGER REFERENCES users(id) ON DELETE SET NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error VARCHAR(500),
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Воркер ищет незавершённые задания и pending-доставки задания по порядку id
+CREATE INDEX IF NOT EXISTS idx_broadcast_jobs_status ON broadcast_jobs(status) WHERE status <> 'completed';
+CREATE INDEX IF NOT EXISTS idx_broadcast_deliveries_job_status ON broadcast_deliveries(job_id, status, id);
+
+COMMENT ON TABLE broadcast_jobs IS 'Фоновые рассылки email/Telegram с прогрессом';
+COMMENT ON TABLE broadcast_deliveries IS 'Состояние доставки рассылки по каждому получателю и каналу';
@@ -0,0 +1,19 @@
+-- Миграция: transactional outbox для уведомлений о покупках и переводах
+-- Дата: 2026-10-17
+
+CREATE TABLE IF NOT EXISTS outbox_messages (
+    id SERIAL PRIMARY KEY,
+    kind VARCHAR(20) NOT NULL,
+    payload JSON NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    last_error VARCHAR(500),
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    sent_at TIMESTAMP
+);
+
+-- Диспетчер выбирает только недоставленные сообщения, у которых подошло время попытки
+CREATE INDEX IF NOT EXISTS idx_outbox_messages_pending ON outbox_messages(next_attempt_at, id) WHERE status = 'pending';
+
+COMMENT ON TABLE outbox_messages IS 'Исходящие уведомления (Telegram/email), доставляются фоновым диспетчером';
@@ -0,0 +1,14 @@
+-- Миграция: дневной лимит переводов привязан к дате, а не сбрасывается при чтении
+-- Дата: 2026-10-17
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS daily_transfer_date DATE;
+
+-- Раньше днём счётчика служил last_login_date
+UPDATE users
+SET daily_transfer_date = last_login_date::date
+WHERE daily_transfer_count > 0 AND last_login_date IS NOT NULL AND daily_transfer_date IS NULL;
+
+-- Счётчик без даты не относится ни к какому дню
+UPDATE users SET daily_transfer_count = 0 WHERE daily_transfer_count <> 0 AND daily_transfer_date IS NULL;
+
+COMMENT ON COLUMN users.daily_transfer_date IS 'День, к которому относится daily_transfer_count, в другой день счётчик считается нулевым';
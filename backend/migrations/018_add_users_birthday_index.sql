@@ -0,0 +1,7 @@
+-- Миграция: индекс для ежедневного начисления бонусов ко дню рождения
+-- Дата: 2026-10-17
+
+-- process_birthday_bonuses: WHERE EXTRACT(month FROM date_of_birth) = ? AND EXTRACT(day FROM date_of_birth) = ?
+-- Выражения должны совпадать с запросом дословно, иначе планировщик индекс не возьмёт
+CREATE INDEX IF NOT EXISTS idx_users_birthday_month_day
+    ON users ((EXTRACT(MONTH FROM date_of_birth)), (EXTRACT(DAY FROM date_of_birth)));
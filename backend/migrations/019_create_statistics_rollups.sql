@@ -0,0 +1,61 @@
+-- Миграция: дневные агрегаты админской статистики вместо GROUP BY по сырым transactions/purchases
+-- Дата: 2026-10-17
+
+CREATE TABLE IF NOT EXISTS daily_activity (
+    day DATE NOT NULL,
+    hour_msk INTEGER NOT NULL,
+    tx_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, hour_msk)
+);
+
+CREATE TABLE IF NOT EXISTS daily_user_activity (
+    day DATE NOT NULL,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    sent_count INTEGER NOT NULL DEFAULT 0,
+    received_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS daily_item_sales (
+    day DATE NOT NULL,
+    item_id INTEGER NOT NULL REFERENCES market_items(id) ON DELETE CASCADE,
+    purchase_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, item_id)
+);
+
+-- Первичное заполнение из существующей истории (то же, что rebuild_statistics_rollups.py)
+INSERT INTO daily_activity (day, hour_msk, tx_count)
+SELECT timestamp::date,
+       EXTRACT(HOUR FROM (timestamp AT TIME ZONE 'UTC') AT TIME ZONE 'Europe/Moscow')::int,
+       COUNT(*)
+FROM transactions
+WHERE timestamp IS NOT NULL
+GROUP BY 1, 2
+ON CONFLICT (day, hour_msk) DO UPDATE SET tx_count = EXCLUDED.tx_count;
+
+INSERT INTO daily_user_activity (day, user_id, sent_count, received_count)
+SELECT day, user_id, SUM(sent_count), SUM(received_count)
+FROM (
+    SELECT timestamp::date AS day, sender_id AS user_id, 1 AS sent_count, 0 AS received_count
+    FROM transactions
+    WHERE timestamp IS NOT NULL
+    UNION ALL
+    SELECT timestamp::date AS day, receiver_id AS user_id, 0 AS sent_count, 1 AS received_count
+    FROM transactions
+    WHERE timestamp IS NOT NULL
+) AS t
+GROUP BY day, user_id
+ON CONFLICT (day, user_id) DO UPDATE
+SET sent_count = EXCLUDED.sent_count,
+    received_count = EXCLUDED.received_count;
+
+INSERT INTO daily_item_sales (day, item_id, purchase_count)
+SELECT timestamp::date, item_id, COUNT(*)
+FROM purchases
+WHERE timestamp IS NOT NULL
+GROUP BY 1, 2
+ON CONFLICT (day, item_id) DO UPDATE SET purchase_count = EXCLUDED.purchase_count;
+
+COMMENT ON TABLE daily_activity IS 'Число переводов по дню (UTC) и часу по Москве';
+COMMENT ON TABLE daily_user_activity IS 'Отправлено/получено переводов пользователем за день (UTC)';
+COMMENT ON TABLE daily_item_sales IS 'Покупки товара за день (UTC)';
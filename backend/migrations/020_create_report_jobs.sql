@@ -0,0 +1,31 @@
+-- Миграция: фоновые выгрузки отчётов с сохранёнными файлами
+-- Дата: 2026-10-17
+
+CREATE TABLE IF NOT EXISTS report_jobs (
+    id SERIAL PRIMARY KEY,
+    report VARCHAR(50) NOT NULL,
+    start_date DATE NOT NULL,
+    end_date DATE NOT NULL,
+    data_version VARCHAR(64) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    storage VARCHAR(10),
+    location VARCHAR(500),
+    filename VARCHAR(255) NOT NULL,
+    size_bytes INTEGER,
+    error VARCHAR(500),
+    created_by INTEGER,
+    locked_until TIMESTAMP,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+-- Один живой (не failed) отчёт на отчёт, период и версию данных: повторный заказ
+-- получает его же, одновременные заказы не создают дубликатов
+CREATE UNIQUE INDEX IF NOT EXISTS uq_report_jobs_report_period_version
+    ON report_jobs(report, start_date, end_date, data_version)
+    WHERE status <> 'failed';
+-- Воркер ищет незавершённые задания
+CREATE INDEX IF NOT EXISTS idx_report_jobs_status ON report_jobs(status) WHERE status IN ('queued', 'running');
+
+COMMENT ON TABLE report_jobs IS 'Фоновые выгрузки отчётов: статус, версия данных и место хранения файла';
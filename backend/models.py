@@ -24,6 +24,7 @@ class User(Base):
     reserved_balance = Column(Integer, default=0)
     is_admin = Column(Boolean, default=False, nullable=False)
     daily_transfer_count = Column(Integer, default=0)
+    daily_transfer_date = Column(Date, nullable=True)  # День, к которому относится daily_transfer_count
     last_login_date: Mapped[datetime] = mapped_column(DateTime, nullable=True, onupdate=func.now())
     ticket_parts = Column(Integer, default=0)
     tickets = Column(Integer, default=0)
@@ -83,6 +84,44 @@ class Transaction(Base):
     sender = relationship("User", back_populates="sent_transactions", foreign_keys=[sender_id], lazy='selectin')
     receiver = relationship("User", back_populates="received_transactions", foreign_keys=[receiver_id], lazy='selectin')
 
+class LeaderboardMonthlyTotal(Base):
+    """Агрегат рейтинга: сколько пользователь получил и отправил за календарный месяц (UTC).
+
+    Поддерживается инкрементально в ``crud.create_transaction``; пересборка из
+    ``transactions`` — ``leaderboard_totals.rebuild_leaderboard_totals``.
+    """
+    __tablename__ = "leaderboard_monthly_totals"
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    month = Column(Date, primary_key=True)  # Первое число месяца
+    received_amount = Column(Integer, default=0, server_default="0", nullable=False)
+    sent_amount = Column(Integer, default=0, server_default="0", nullable=False)
+
+class DailyActivity(Base):
+    """Переводы по дню (UTC) и часу по Москве — почасовая активность в админке.
+
+    Пересчитывается фоном из ``transactions`` (``statistics_rollups.daily_activity_refresher``);
+    полная пересборка — ``statistics_rollups.rebuild_statistics_rollups``.
+    """
+    __tablename__ = "daily_activity"
+    day = Column(Date, primary_key=True)
+    hour_msk = Column(Integer, primary_key=True)
+    tx_count = Column(Integer, default=0, server_default="0", nullable=False)
+
+class DailyUserActivity(Base):
+    """Сколько переводов пользователь отправил и получил за день (UTC) — топы вовлечённости."""
+    __tablename__ = "daily_user_activity"
+    day = Column(Date, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    sent_count = Column(Integer, default=0, server_default="0", nullable=False)
+    received_count = Column(Integer, default=0, server_default="0", nullable=False)
+
+class DailyItemSales(Base):
+    """Покупки товара за день (UTC) — популярные товары."""
+    __tablename__ = "daily_item_sales"
+    day = Column(Date, primary_key=True)
+    item_id = Column(Integer, ForeignKey("market_items.id", ondelete="CASCADE"), primary_key=True)
+    purchase_count = Column(Integer, default=0, server_default="0", nullable=False)
+
 class MarketItem(Base):
     __tablename__ = "market_items"
     id = Column(Integer, primary_key=True, index=True)
@@ -220,3 +259,75 @@ class AppSettings(Base):
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), nullable=False)
     # URL картинок интерфейса (лето/зима), JSON: { "summer": {...}, "winter": {...} }
     theme_assets = Column(JSON, nullable=True)
+
+class BroadcastJob(Base):
+    """Фоновая рассылка (email/Telegram). Тексты сохраняются при постановке в очередь,
+    поэтому повтор отправляет ровно то же сообщение. Обрабатывается ``broadcast_jobs``."""
+    __tablename__ = "broadcast_jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    status = Column(String(20), default='queued', server_default='queued', nullable=False)  # queued / running / completed
+    subject = Column(String(200), nullable=False)
+    email_html = Column(String, nullable=True)
+    email_text = Column(String, nullable=True)
+    telegram_text = Column(String, nullable=True)
+    created_by = Column(Integer, nullable=True)  # id администратора; -1 — вход в панель по ADMIN_EMAILS
+    total_email = Column(Integer, default=0, server_default="0", nullable=False)
+    total_telegram = Column(Integer, default=0, server_default="0", nullable=False)
+    sent_ok_email = Column(Integer, default=0, server_default="0", nullable=False)
+    sent_ok_telegram = Column(Integer, default=0, server_default="0", nullable=False)
+    failed_count = Column(Integer, default=0, server_default="0", nullable=False)
+    locked_until = Column(DateTime, nullable=True)  # Аренда воркера; истекла — задание можно забрать
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+class BroadcastDelivery(Base):
+    """Доставка рассылки одному получателю по одному каналу: pending / sent / failed."""
+    __tablename__ = "broadcast_deliveries"
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, ForeignKey("broadcast_jobs.id", ondelete="CASCADE"), nullable=False)
+    channel = Column(String(20), nullable=False)  # email / telegram
+    target = Column(String(255), nullable=False)  # адрес почты или chat_id
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    status = Column(String(20), default='pending', server_default='pending', nullable=False)
+    attempts = Column(Integer, default=0, server_default="0", nullable=False)
+    error = Column(String(500), nullable=True)
+    updated_at = Column(DateTime, server_default=func.now(), nullable=True)
+
+class ReportJob(Base):
+    """Фоновая выгрузка отчёта за период. ``data_version`` — отпечаток исходных данных
+    на момент заказа: пока он не изменился, повторный заказ получает тот же файл.
+    Обрабатывается ``report_jobs``."""
+    __tablename__ = "report_jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    report = Column(String(50), nullable=False)  # consolidated
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=False)
+    data_version = Column(String(64), nullable=False)
+    status = Column(String(20), default='queued', server_default='queued', nullable=False)  # queued / running / completed / failed
+    storage = Column(String(10), nullable=True)  # s3 / local
+    location = Column(String(500), nullable=True)  # ключ объекта или путь к файлу
+    filename = Column(String(255), nullable=False)
+    size_bytes = Column(Integer, nullable=True)
+    error = Column(String(500), nullable=True)
+    created_by = Column(Integer, nullable=True)  # id администратора; -1 — вход в панель по ADMIN_EMAILS
+    locked_until = Column(DateTime, nullable=True)  # Аренда воркера; истекла — задание можно забрать
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+class OutboxMessage(Base):
+    """Исходящее уведомление (Telegram/email), записанное в одной транзакции с покупкой или переводом.
+
+    Доставляет ``outbox.outbox_dispatcher`` — минимум один раз, с повторами.
+    """
+    __tablename__ = "outbox_messages"
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(20), nullable=False)  # telegram / email
+    payload = Column(JSON, nullable=False)
+    status = Column(String(20), default='pending', server_default='pending', nullable=False)  # pending / sent / failed
+    attempts = Column(Integer, default=0, server_default="0", nullable=False)
+    next_attempt_at = Column(DateTime, server_default=func.now(), default=datetime.utcnow, nullable=False)
+    last_error = Column(String(500), nullable=True)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    sent_at = Column(DateTime, nullable=True)
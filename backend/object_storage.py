@@ -7,6 +7,13 @@ from botocore.exceptions import ClientError
 
 from config import settings
 
+# Коды ClientError, означающие «объекта нет» (GetObject отдаёт NoSuchKey, HeadObject — 404)
+_NOT_FOUND_CODES = {"NoSuchKey", "NotFound", "404"}
+
+
+class ObjectNotFoundError(RuntimeError):
+    """Объекта с таким ключом в бакете нет."""
+
 
 def is_object_storage_configured() -> bool:
     """Возвращает True, если заданы параметры для загрузки в бакет."""
@@ -34,32 +41,85 @@ def generate_media_object_key(prefix: str = "media") -> str:
     return f"{prefix}/{now:%Y/%m}/{unique}.avif"
 
 
-def upload_bytes(key: str, body: bytes, content_type: str) -> str:
-    """Загружает байты в бакет и возвращает публичный URL.
-
-    Raises:
-        RuntimeError: Ошибка API хранилища.
-    """
+def _client():
     session = boto3.session.Session()
-    client = session.client(
+    return session.client(
         service_name="s3",
         endpoint_url=settings.S3_ENDPOINT_URL.strip(),
         aws_access_key_id=settings.S3_ACCESS_KEY_ID.strip(),
         aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY.strip(),
         region_name=settings.S3_REGION.strip() or "ru-1",
     )
+
+
+def upload_bytes(key: str, body: bytes, content_type: str, public: bool = True) -> str:
+    """Загружает байты в бакет и возвращает публичный URL.
+
+    ``public=False`` — закрытый объект (выгрузки с персональными данными): без
+    ``S3_OBJECT_ACL`` и кеширования, читается только через ``download_bytes``.
+
+    Raises:
+        RuntimeError: Ошибка API хранилища.
+    """
     put_kwargs: dict[str, str | bytes] = {
         "Bucket": settings.S3_BUCKET.strip(),
         "Key": key,
         "Body": body,
         "ContentType": content_type,
-        "CacheControl": "public, max-age=31536000",
+        "CacheControl": "public, max-age=31536000" if public else "private, no-store",
     }
     acl = settings.S3_OBJECT_ACL.strip()
-    if acl:
+    if acl and public:
         put_kwargs["ACL"] = acl
     try:
-        client.put_object(**put_kwargs)
+        _client().put_object(**put_kwargs)
     except ClientError as exc:
         raise RuntimeError(f"Ошибка загрузки в объектное хранилище: {exc}") from exc
     return build_public_url(key)
+
+
+def download_bytes(key: str) -> bytes:
+    """Читает объект из бакета целиком.
+
+    Raises:
+        ObjectNotFoundError: Объекта нет.
+        RuntimeError: Ошибка API хранилища.
+    """
+    try:
+        response = _client().get_object(Bucket=settings.S3_BUCKET.strip(), Key=key)
+        return response["Body"].read()
+    except ClientError as exc:
+        if _is_not_found(exc):
+            raise ObjectNotFoundError(f"Объект {key} не найден в хранилище") from exc
+        raise RuntimeError(f"Ошибка чтения из объектного хранилища: {exc}") from exc
+
+
+def object_exists(key: str) -> bool:
+    """Есть ли объект в бакете (HEAD, без скачивания).
+
+    Raises:
+        RuntimeError: Ошибка API хранилища, кроме отсутствия объекта.
+    """
+    try:
+        _client().head_object(Bucket=settings.S3_BUCKET.strip(), Key=key)
+    except ClientError as exc:
+        if _is_not_found(exc):
+            return False
+        raise RuntimeError(f"Ошибка обращения к объектному хранилищу: {exc}") from exc
+    return True
+
+
+def _is_not_found(exc: ClientError) -> bool:
+    return exc.response.get("Error", {}).get("Code") in _NOT_FOUND_CODES
+
+
+def delete_object(key: str) -> None:
+    """Удаляет объект из бакета (отсутствующий объект — не ошибка).
+
+    Raises:
+        RuntimeError: Ошибка API хранилища.
+    """
+    try:
+        _client().delete_object(Bucket=settings.S3_BUCKET.strip(), Key=key)
+    except ClientError as exc:
+        raise RuntimeError(f"Ошибка удаления из объектного хранилища: {exc}") from exc
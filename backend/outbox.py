@@ -0,0 +1,198 @@
+"""Transactional outbox для уведомлений о покупках и переводах.
+
+Код покупки или перевода вызывает ``enqueue_telegram`` / ``enqueue_email`` до
+``commit`` — строка ``outbox_messages`` фиксируется вместе с движением денег,
+и API отвечает сразу. ``outbox_dispatcher`` в фоне забирает подошедшие
+сообщения пачкой (``FOR UPDATE SKIP LOCKED``, аренда через ``next_attempt_at``),
+доставляет их и отмечает ``sent``; при ошибке откладывает с экспоненциальной
+паузой, после ``max_attempts`` — ``failed``. Если процесс упал посреди пачки,
+сообщения снова станут доступны по истечении аренды: доставка «минимум один раз».
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+from config import settings
+from database import AsyncSessionLocal
+from email_service import send_purchase_confirmation_to_user, send_purchase_notification_to_admins
+from telegram_dispatcher import telegram_dispatcher
+
+logger = logging.getLogger(__name__)
+
+# Письма outbox: имя шаблона в payload → функция email_service с теми же kwargs
+EMAIL_TEMPLATES = {
+    "purchase_confirmation": send_purchase_confirmation_to_user,
+    "purchase_admins": send_purchase_notification_to_admins,
+}
+
+_MAX_BACKOFF_SECONDS = 3600
+
+
+def enqueue_telegram(
+    db: AsyncSession,
+    chat_id: int,
+    text: str,
+    message_thread_id: Optional[int] = None,
+    parse_mode: Optional[str] = 'HTML',
+) -> None:
+    """Добавляет сообщение Telegram в outbox текущей транзакции (коммит — у вызывающего)."""
+    db.add(models.OutboxMessage(
+        kind="telegram",
+        payload={
+            "chat_id": chat_id,
+            "text": text,
+            "message_thread_id": message_thread_id,
+            "parse_mode": parse_mode,
+        },
+    ))
+
+
+def enqueue_email(db: AsyncSession, template: str, **kwargs) -> None:
+    """Добавляет письмо из ``EMAIL_TEMPLATES`` в outbox текущей транзакции."""
+    if template not in EMAIL_TEMPLATES:
+        raise ValueError(f"Неизвестный шаблон письма outbox: {template}")
+    db.add(models.OutboxMessage(kind="email", payload={"template": template, "kwargs": kwargs}))
+
+
+async def purge_sent(db: AsyncSession, older_than_days: int = 7) -> int:
+    """Удаляет доставленные сообщения старше N дней; ``failed`` остаются для разбора."""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    result = await db.execute(
+        delete(models.OutboxMessage).where(
+            models.OutboxMessage.status == "sent",
+            models.OutboxMessage.sent_at < cutoff,
+        )
+    )
+    await db.commit()
+    return result.rowcount
+
+
+async def _deliver(message: models.OutboxMessage) -> None:
+    """Доставляет одно сообщение; исключение — попытка не удалась."""
+    payload = message.payload
+    if message.kind == "telegram":
+        await telegram_dispatcher.send(
+            payload["chat_id"],
+            payload["text"],
+            message_thread_id=payload.get("message_thread_id"),
+            parse_mode=payload.get("parse_mode"),
+        )
+    elif message.kind == "email":
+        if not await EMAIL_TEMPLATES[payload["template"]](**payload["kwargs"]):
+            raise RuntimeError("Письмо не отправлено (см. лог email_service)")
+    else:
+        raise ValueError(f"Неизвестный тип сообщения outbox: {message.kind}")
+
+
+class OutboxDispatcher:
+    """Фоновая доставка outbox: опрос раз в ``poll_interval`` или по ``wake()`` после коммита."""
+
+    def __init__(self, batch_size: int, poll_interval: float, lease_seconds: int, max_attempts: int):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def start(self) -> None:
+        if self._task is not None and not self._task.done():
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="outbox-dispatcher")
+        logger.info("Диспетчер outbox запущен")
+
+    async def stop(self) -> None:
+        """Останавливает диспетчер; взятые сообщения вернутся в работу по истечении аренды."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def wake(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                while await self._process_batch() == self.batch_size:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Диспетчер outbox: ошибка обработки пачки")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def _backoff(self, attempts: int) -> timedelta:
+        return timedelta(seconds=min(5 * 2 ** (attempts - 1), _MAX_BACKOFF_SECONDS))
+
+    async def _process_batch(self) -> int:
+        """Забирает, доставляет и отмечает одну пачку. Возвращает её размер."""
+        outbox = models.OutboxMessage
+        async with AsyncSessionLocal() as db:
+            now = datetime.utcnow()
+            result = await db.execute(
+                select(outbox)
+                .where(outbox.status == "pending", outbox.next_attempt_at <= now)
+                .order_by(outbox.next_attempt_at, outbox.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            batch = list(result.scalars().all())
+            if not batch:
+                return 0
+            # Аренда: пока идёт доставка, другие процессы эти строки не возьмут
+            for message in batch:
+                message.attempts += 1
+                message.next_attempt_at = now + timedelta(seconds=self.lease_seconds)
+            await db.commit()
+
+            results = await asyncio.gather(*(_deliver(m) for m in batch), return_exceptions=True)
+
+            now = datetime.utcnow()
+            for message, outcome in zip(batch, results):
+                if not isinstance(outcome, Exception):
+                    message.status = "sent"
+                    message.sent_at = now
+                    message.last_error = None
+                    continue
+                message.last_error = str(outcome)[:500]
+                if message.attempts >= self.max_attempts:
+                    message.status = "failed"
+                    logger.error(
+                        "Outbox %s (%s): доставка не удалась после %s попыток: %s",
+                        message.id, message.kind, message.attempts, outcome,
+                    )
+                else:
+                    message.next_attempt_at = now + self._backoff(message.attempts)
+                    logger.warning(
+                        "Outbox %s (%s): попытка %s не удалась, повтор позже: %s",
+                        message.id, message.kind, message.attempts, outcome,
+                    )
+            await db.commit()
+            return len(batch)
+
+
+outbox_dispatcher = OutboxDispatcher(
+    batch_size=settings.OUTBOX_BATCH_SIZE,
+    poll_interval=settings.OUTBOX_POLL_INTERVAL_SECONDS,
+    lease_seconds=settings.OUTBOX_LEASE_SECONDS,
+    max_attempts=settings.OUTBOX_MAX_ATTEMPTS,
+)
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Пересборка и сверка помесячных агрегатов рейтинга (leaderboard_monthly_totals).
+
+    python rebuild_leaderboard_totals.py          # пересобрать из transactions
+    python rebuild_leaderboard_totals.py --check  # только сверить, без изменений
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# Добавляем текущую директорию в путь для импорта модулей
+sys.path.append(str(Path(__file__).parent))
+
+from config import settings
+from database import AsyncSessionLocal
+from leaderboard_engine import leaderboard_engine
+from leaderboard_totals import find_leaderboard_totals_mismatches, rebuild_leaderboard_totals
+from redis_cache import redis_cache
+
+
+async def main(check_only: bool) -> int:
+    async with AsyncSessionLocal() as db:
+        if not check_only:
+            rows = await rebuild_leaderboard_totals(db)
+            print(f"✅ Агрегаты рейтинга пересобраны: {rows} строк")
+            if settings.REDIS_ENABLED:
+                await redis_cache.connect()
+                try:
+                    if await leaderboard_engine.rebuild(db):
+                        print("✅ Рейтинг в Redis пересобран")
+                finally:
+                    await redis_cache.disconnect()
+
+        mismatches = await find_leaderboard_totals_mismatches(db)
+        if not mismatches:
+            print("✅ Агрегаты совпадают с таблицей transactions")
+            return 0
+
+        print(f"❌ Найдено расхождений: {len(mismatches)} (показаны первые 100)")
+        for row in mismatches:
+            print(
+                f"  user_id={row['user_id']} month={row['month']}: "
+                f"received {row['actual_received']} (ожидалось {row['expected_received']}), "
+                f"sent {row['actual_sent']} (ожидалось {row['expected_sent']})"
+            )
+        return 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--check", action="store_true", help="только сверить агрегаты с transactions")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.check)))
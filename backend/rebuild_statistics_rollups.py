@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Пересборка и сверка дневных агрегатов статистики (daily_activity,
+daily_user_activity, daily_item_sales).
+
+    python rebuild_statistics_rollups.py          # пересобрать из transactions/purchases
+    python rebuild_statistics_rollups.py --check  # только сверить, без изменений
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# Добавляем текущую директорию в путь для импорта модулей
+sys.path.append(str(Path(__file__).parent))
+
+from database import AsyncSessionLocal
+from statistics_rollups import find_statistics_rollups_mismatches, rebuild_statistics_rollups
+
+
+async def main(check_only: bool) -> int:
+    async with AsyncSessionLocal() as db:
+        if not check_only:
+            counts = await rebuild_statistics_rollups(db)
+            for table, rows in counts.items():
+                print(f"✅ {table}: {rows} строк")
+
+        mismatches = await find_statistics_rollups_mismatches(db)
+        if not mismatches:
+            print("✅ Агрегаты совпадают с таблицами transactions и purchases")
+            return 0
+
+        print(f"❌ Найдено расхождений: {len(mismatches)} (не больше 100 на таблицу)")
+        for row in mismatches:
+            details = ", ".join(f"{key}={value}" for key, value in row.items() if key != "table")
+            print(f"  {row['table']}: {details}")
+        return 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--check", action="store_true", help="только сверить агрегаты с сырыми таблицами")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.check)))
@@ -1,47 +1,89 @@
-import json
 import logging
-from typing import Optional, Any
+import time
+import uuid
+from typing import Callable, NamedTuple, Optional, Any
 import redis.asyncio as aioredis
+
+import cache_codec
 from config import settings
 
 logger = logging.getLogger(__name__)
 
+# Поколение пространства ключей: значение ``cache:{user_id}:{key}`` хранится как
+# ``{поколение}|{свежо до, unix-время}|{данные cache_codec}``; INCR счётчика ``cache:gen:{key}``
+# за O(1) делает устаревшими все записи этого ключа у всех пользователей (они
+# доживают TTL).
+_GENERATION_KEY = "cache:gen:{key}"
+_GENERATION_SEPARATOR = b"|"
+_LOCK_KEY = "cache:lock:{name}"
+# Снятие блокировки только её владельцем (сравнение токена и DEL атомарно)
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+# Шаг SCAN и размер пачки UNLINK там, где перебор ключей действительно нужен
+_SCAN_COUNT = 500
+# Канал pub/sub: имя ключа, сброшенного clear_all_users_key, или иное сообщение
+# publish_invalidation (см. local_cache, identity_cache)
+INVALIDATION_CHANNEL = "cache:invalidate"
+
 _DEFAULT_TTL: dict[str, int] = {
     "feed": 60,
     "market": 120,
     "leaderboard": 60,
     "banners": 300,
     "history": 120,
+    "app_settings": 300,
+    "statix_bonus": 300,
+}
+
+# Stale-while-revalidate: сколько секунд после TTL (мягкого срока) запись ещё
+# живёт в Redis и отдаётся как устаревшая, пока один фоновый запрос её обновляет
+_STALE_TTL: dict[str, int] = {
+    "feed": 300,
+    "leaderboard": 300,
 }
 
 
+class CacheLookup(NamedTuple):
+    """Результат ``lookup``: значение (None — промах), поколение ключа и признак «мягкий срок истёк»."""
+
+    value: Optional[Any]
+    generation: int
+    stale: bool = False
+
+
+def _envelope(generation: int, fresh_until: int, payload: bytes) -> bytes:
+    return _GENERATION_SEPARATOR.join((str(generation).encode(), str(fresh_until).encode(), payload))
+
+
 class RedisCache:
     """Класс для работы с Redis кешем."""
     
     def __init__(self):
         self.redis_client: Optional[aioredis.Redis] = None
         self._connection_pool: Optional[aioredis.ConnectionPool] = None
+        # Значения кеша — байты cache_codec, поэтому для них отдельный клиент без decode_responses
+        self._values_client: Optional[aioredis.Redis] = None
+        self._values_pool: Optional[aioredis.ConnectionPool] = None
+        self._invalidation_listeners: list[Callable[[str], None]] = []
+    
+    def add_invalidation_listener(self, callback: Callable[[str], None]) -> None:
+        """Колбэк ``callback(key)`` вызывается в этом процессе при ``clear_all_users_key``."""
+        self._invalidation_listeners.append(callback)
     
     async def connect(self) -> None:
         """Подключается к Redis. При REDIS_ENABLED=false — без действий."""
         if not settings.REDIS_ENABLED:
             return
         try:
-            if settings.REDIS_URL:
-                self._connection_pool = aioredis.ConnectionPool.from_url(
-                    settings.REDIS_URL,
-                    decode_responses=True
-                )
-            else:
-                self._connection_pool = aioredis.ConnectionPool(
-                    host=settings.REDIS_HOST,
-                    port=settings.REDIS_PORT,
-                    db=settings.REDIS_DB,
-                    password=settings.REDIS_PASSWORD if settings.REDIS_PASSWORD else None,
-                    decode_responses=True
-                )
+            self._connection_pool = self._new_pool(decode_responses=True)
+            self._values_pool = self._new_pool(decode_responses=False)
             
             self.redis_client = aioredis.Redis(connection_pool=self._connection_pool)
+            self._values_client = aioredis.Redis(connection_pool=self._values_pool)
             
             await self.redis_client.ping()
             logger.info("✅ Redis подключен успешно")
@@ -49,56 +91,126 @@ class RedisCache:
             logger.error(f"❌ Ошибка подключения к Redis: {e}")
             raise
     
+    @staticmethod
+    def _new_pool(decode_responses: bool) -> aioredis.ConnectionPool:
+        if settings.REDIS_URL:
+            return aioredis.ConnectionPool.from_url(
+                settings.REDIS_URL,
+                decode_responses=decode_responses
+            )
+        return aioredis.ConnectionPool(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            password=settings.REDIS_PASSWORD if settings.REDIS_PASSWORD else None,
+            decode_responses=decode_responses
+        )
+    
     async def disconnect(self) -> None:
-        """Закрывает пул и клиент, если подключение было установлено."""
+        """Закрывает пулы и клиенты, если подключение было установлено."""
         had_connection = self.redis_client is not None or self._connection_pool is not None
-        if self.redis_client:
-            await self.redis_client.close()
-        if self._connection_pool:
-            await self._connection_pool.disconnect()
+        for client in (self.redis_client, self._values_client):
+            if client:
+                await client.close()
+        for pool in (self._connection_pool, self._values_pool):
+            if pool:
+                await pool.disconnect()
         self.redis_client = None
         self._connection_pool = None
+        self._values_client = None
+        self._values_pool = None
         if had_connection:
             logger.info("Redis отключен")
     
     def _get_key(self, user_id: int, key: str) -> str:
         """Формирует ключ для Redis с учетом user_id."""
         return f"cache:{user_id}:{key}"
+
+    async def lookup_global(self, key: str, variant: str = "all") -> CacheLookup:
+        """Общее для всех пользователей значение (ответ публичного эндпоинта) и поколение.
+
+        Ключ ``cache:global:{variant}:{key}`` живёт в том же поколении, что и
+        ``cache:*:{key}``, поэтому ``clear_all_users_key(key)`` сбрасывает и его.
+        """
+        return await self.lookup(f"global:{variant}", key)
+
+    async def set_global(
+        self,
+        key: str,
+        variant: str,
+        value: Any,
+        ttl: Optional[int] = None,
+        generation: Optional[int] = None,
+    ):
+        """Сохраняет общее значение; TTL по умолчанию — как у пользовательского ключа."""
+        await self.set(f"global:{variant}", key, value, ttl, generation)
     
-    async def get(self, user_id: int, key: str) -> Optional[Any]:
+    async def generation(self, key: str) -> int:
+        """Текущее поколение ключа (0, если ещё не инвалидировался)."""
+        value = await self.redis_client.get(_GENERATION_KEY.format(key=key))
+        return int(value) if value else 0
+
+    async def lookup(self, user_id: int, key: str) -> CacheLookup:
         """
-        Получает значение из кеша.
+        Получает значение и текущее поколение ключа за один запрос (MGET).
         
-        Args:
-            user_id: ID пользователя Telegram
-            key: Ключ кеша (feed, market, leaderboard, banners, history)
+        Поколение нужно передать в ``set`` после загрузки данных: если ключ
+        инвалидировали, пока данные грузились, запись сразу окажется устаревшей.
+        Запись после мягкого срока (см. ``_STALE_TTL``) возвращается со
+        ``stale=True`` — её можно отдать, но пора обновить.
         
         Returns:
-            Распарсенное значение или None
+            CacheLookup(значение или None, поколение, stale)
         """
         if not settings.REDIS_ENABLED:
-            return None
+            return CacheLookup(None, 0)
         if not self.redis_client:
             await self.connect()
         if not self.redis_client:
-            return None
+            return CacheLookup(None, 0)
         
         try:
             redis_key = self._get_key(user_id, key)
-            value = await self.redis_client.get(redis_key)
+            raw_generation, value = await self._values_client.mget(
+                _GENERATION_KEY.format(key=key), redis_key
+            )
+            generation = int(raw_generation) if raw_generation else 0
             
             if value is None:
-                return None
+                return CacheLookup(None, generation)
             
-            try:
-                return json.loads(value)
-            except json.JSONDecodeError:
-                return value
+            parts = value.split(_GENERATION_SEPARATOR, 2)
+            if len(parts) != 3 or parts[0] != str(generation).encode() or not parts[1].isdigit():
+                # Запись старого поколения (или прежнего формата) — промах
+                return CacheLookup(None, generation)
+            stale = int(parts[1]) <= time.time()
+            
+            return CacheLookup(cache_codec.decode(parts[2]), generation, stale)
         except Exception as e:
             logger.error(f"Ошибка при получении из кеша {key} для пользователя {user_id}: {e}")
-            return None
+            return CacheLookup(None, 0)
+
+    async def get(self, user_id: int, key: str) -> Optional[Any]:
+        """
+        Получает значение из кеша.
+        
+        Args:
+            user_id: ID пользователя Telegram
+            key: Ключ кеша (feed, market, leaderboard, banners, history)
+        
+        Returns:
+            Распарсенное значение или None
+        """
+        return (await self.lookup(user_id, key)).value
     
-    async def set(self, user_id: int, key: str, value: Any, ttl: Optional[int] = None):
+    async def set(
+        self,
+        user_id: int,
+        key: str,
+        value: Any,
+        ttl: Optional[int] = None,
+        generation: Optional[int] = None,
+    ):
         """
         Устанавливает значение в кеш.
         
@@ -106,7 +218,9 @@ class RedisCache:
             user_id: ID пользователя Telegram
             key: Ключ кеша
             value: Значение для сохранения
-            ttl: Время жизни в секундах (по умолчанию 1 час для feed/market, 5 минут для leaderboard)
+            ttl: Время жизни в секундах (по умолчанию 1 час для feed/market, 5 минут для leaderboard);
+                для ключей из ``_STALE_TTL`` это мягкий срок, запись живёт дольше
+            generation: Поколение из ``lookup`` до загрузки данных; None — текущее
         """
         if not settings.REDIS_ENABLED:
             return
@@ -121,13 +235,13 @@ class RedisCache:
             if ttl is None:
                 ttl = _DEFAULT_TTL.get(key, 120)
             
-            if isinstance(value, (dict, list)):
-                serialized_value = json.dumps(value, ensure_ascii=False)
-            else:
-                serialized_value = str(value)
+            if generation is None:
+                generation = await self.generation(key)
+            serialized_value = _envelope(generation, int(time.time()) + ttl, cache_codec.encode(value))
+            hard_ttl = ttl + _STALE_TTL.get(key, 0)
             
-            await self.redis_client.setex(redis_key, ttl, serialized_value)
-            logger.debug(f"Кеш установлен: {redis_key} (TTL: {ttl}s)")
+            await self._values_client.setex(redis_key, hard_ttl, serialized_value)
+            logger.debug(f"Кеш установлен: {redis_key} (TTL: {ttl}s, хранение {hard_ttl}s)")
         except Exception as e:
             logger.error(f"Ошибка при установке кеша {key} для пользователя {user_id}: {e}")
             raise
@@ -169,38 +283,65 @@ class RedisCache:
             return
 
         try:
-            pattern = self._get_key(user_id, "*")
-            keys = await self.redis_client.keys(pattern)
-            if keys:
-                await self.redis_client.delete(*keys)
-                logger.info(f"Очищен кеш для пользователя {user_id}: {len(keys)} ключей")
+            removed = await self.unlink_matching(self._get_key(user_id, "*"))
+            if removed:
+                logger.info(f"Очищен кеш для пользователя {user_id}: {removed} ключей")
         except Exception as e:
             logger.error(f"Ошибка при очистке кеша пользователя {user_id}: {e}")
 
+    async def unlink_matching(self, pattern: str) -> int:
+        """
+        Удаляет ключи по шаблону: SCAN (без блокировки Redis, в отличие от KEYS)
+        и UNLINK пачками (память освобождается в фоне). Возвращает число ключей.
+        """
+        removed = 0
+        batch: list[str] = []
+        async for redis_key in self.redis_client.scan_iter(match=pattern, count=_SCAN_COUNT):
+            batch.append(redis_key)
+            if len(batch) >= _SCAN_COUNT:
+                removed += await self.redis_client.unlink(*batch)
+                batch = []
+        if batch:
+            removed += await self.redis_client.unlink(*batch)
+        return removed
+
     async def clear_all_users_key(self, key: str):
         """
         Очищает кеш определенного ключа для всех пользователей.
-        Например: key='market' удалит все cache:*:market.
+        Например: key='market' сделает устаревшими все cache:*:market.
+        
+        Без перебора ключей: INCR поколения за O(1), старые записи не читаются
+        и удаляются Redis по TTL. Остальные процессы узнают о сбросе через
+        публикацию в ``INVALIDATION_CHANNEL``.
         """
-        if not settings.REDIS_ENABLED:
-            return
-        if not self.redis_client:
-            await self.connect()
-        if not self.redis_client:
-            return
+        if settings.REDIS_ENABLED:
+            # Ошибка подключения не должна помешать сбросу локальных кешей ниже
+            try:
+                if not self.redis_client:
+                    await self.connect()
+                generation = await self.redis_client.incr(_GENERATION_KEY.format(key=key))
+                logger.info(f"Очищен кеш для ключа '{key}' у всех пользователей (поколение {generation})")
+            except Exception as e:
+                logger.error(f"Ошибка при очистке кеша ключа '{key}' у всех пользователей: {e}")
+        await self.publish_invalidation(key)
 
+    async def publish_invalidation(self, message: str) -> None:
+        """
+        Сообщает о сбросе локальным кешам: сразу в этом процессе (колбэки
+        ``add_invalidation_listener``) и остальным — через ``INVALIDATION_CHANNEL``.
+        """
+        for callback in self._invalidation_listeners:
+            callback(message)
+        if not settings.REDIS_ENABLED or not self.redis_client:
+            return
         try:
-            pattern = f"cache:*:{key}"
-            keys = await self.redis_client.keys(pattern)
-            if keys:
-                await self.redis_client.delete(*keys)
-                logger.info(f"Очищен кеш для ключа '{key}' у всех пользователей: {len(keys)} ключей")
+            await self.redis_client.publish(INVALIDATION_CHANNEL, message)
         except Exception as e:
-            logger.error(f"Ошибка при очистке кеша ключа '{key}' у всех пользователей: {e}")
+            logger.error(f"Ошибка публикации инвалидации '{message}': {e}")
     
     async def exists(self, user_id: int, key: str) -> bool:
         """
-        Проверяет существование ключа в кеше.
+        Проверяет существование ключа в кеше (запись текущего поколения).
         
         Args:
             user_id: ID пользователя Telegram
@@ -209,18 +350,24 @@ class RedisCache:
         Returns:
             True если ключ существует, False иначе
         """
+        return (await self.lookup(user_id, key)).value is not None
+
+    async def acquire_lock(self, name: str, ttl: int) -> Optional[str]:
+        """
+        Блокировка между процессами (SET NX EX): токен владельца или None, если
+        её уже держит другой процесс. Истекает сама через ``ttl`` секунд.
+        """
         if not settings.REDIS_ENABLED:
-            return False
+            return None
         if not self.redis_client:
             await self.connect()
-        if not self.redis_client:
-            return False
+        token = uuid.uuid4().hex
+        if await self.redis_client.set(_LOCK_KEY.format(name=name), token, nx=True, ex=ttl):
+            return token
+        return None
 
-        try:
-            redis_key = self._get_key(user_id, key)
-            return await self.redis_client.exists(redis_key) > 0
-        except Exception as e:
-            logger.error(f"Ошибка при проверке существования кеша {key} для пользователя {user_id}: {e}")
-            return False
+    async def release_lock(self, name: str, token: str) -> None:
+        """Снимает блокировку, если она всё ещё принадлежит ``token``."""
+        await self.redis_client.eval(_RELEASE_LOCK_SCRIPT, 1, _LOCK_KEY.format(name=name), token)
 
 redis_cache = RedisCache()
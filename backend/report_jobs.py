@@ -0,0 +1,452 @@
+"""Фоновые выгрузки отчётов с сохранёнными файлами.
+
+``request_report`` считает отпечаток исходных данных отчёта за период
+(``data_version``) и ищет живое задание с тем же отчётом, периодом и
+отпечатком: готовый файл отдаётся сразу, а задание в очереди или в работе —
+как есть, поэтому повторные клики не запускают тяжёлые запросы ещё раз. Иначе
+создаётся новое задание ``report_jobs``, и HTTP-запрос сразу отвечает.
+
+``report_worker`` забирает задание с арендой (``locked_until``,
+``FOR UPDATE SKIP LOCKED``, как у ``broadcast_jobs``), собирает книгу через
+``table_export``, продлевая аренду по мере записи пачек, и сохраняет её в закрытый объект S3
+(``object_storage.upload_bytes``), а без S3 — в ``REPORT_STORAGE_DIR``.
+Результат записывается, только если аренда всё ещё своя: задание, перехваченное
+другим воркером после истечения аренды, не перезаписывается. Файлы заданий того
+же отчёта и периода с устаревшим отпечатком удаляются.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import IO, Awaitable, Callable, Optional
+
+from fastapi import Response
+from fastapi.responses import FileResponse
+from sqlalchemy import or_, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import crud
+import models
+import table_export
+from job_leases import JobLease, LeaseLost
+from config import settings
+from database import AsyncSessionLocal
+from object_storage import (
+    ObjectNotFoundError,
+    delete_object,
+    download_bytes,
+    is_object_storage_configured,
+    object_exists,
+    upload_bytes,
+)
+
+logger = logging.getLogger(__name__)
+
+# Всё, из чего собирается сводный отчёт за период: переводы, покупки и сессии
+# периода, пользователи (имена, статусы, даты входа) и цены товаров
+_CONSOLIDATED_VERSION_SQL = text(
+    """
+    SELECT
+        (SELECT count(*) || ':' || coalesce(max(id), 0)
+         FROM transactions WHERE timestamp BETWEEN :start AND :end),
+        (SELECT count(*) || ':' || coalesce(max(id), 0)
+         FROM purchases WHERE timestamp BETWEEN :start AND :end),
+        (SELECT count(*) || ':' || coalesce(max(last_seen)::text, '')
+         FROM user_sessions WHERE session_start BETWEEN :start AND :end),
+        (SELECT md5(coalesce(string_agg(
+            concat_ws('|', id, status, first_name, last_name, position, department,
+                      registration_date, last_login_date), ',' ORDER BY id), ''))
+         FROM users),
+        (SELECT md5(coalesce(string_agg(concat_ws('|', id, name, price), ',' ORDER BY id), ''))
+         FROM market_items)
+    """
+)
+
+_GENERAL_STATS_TITLES = {
+    "new_users_count": "Всего пользователей",
+    "active_users_count": "Активные пользователи",
+    "transactions_count": "Всего транзакций",
+    "store_purchases_count": "Покупок в магазине",
+    "total_turnover": "Оборот 'спасибок'",
+    "total_store_spent": "Потрачено в магазине",
+    "average_session_duration_minutes": "Среднее время сессии (мин)",
+}
+
+
+async def consolidated_data_version(db: AsyncSession, start_date: date, end_date: date) -> str:
+    """Отпечаток данных сводного отчёта: меняется вместе с любым его листом."""
+    start, end_inclusive = crud._prepare_dates(start_date, end_date)
+    row = (await db.execute(_CONSOLIDATED_VERSION_SQL, {"start": start, "end": end_inclusive})).one()
+    return hashlib.sha256("|".join(row).encode()).hexdigest()
+
+
+async def write_consolidated_report(
+    db: AsyncSession, export: table_export.XlsxExport, start_date: date, end_date: date
+) -> None:
+    """Листы сводного отчёта: общая статистика, лидеры, товары и неактивные пользователи."""
+    general_stats = await crud.get_general_statistics(db, start_date, end_date)
+    avg_session_stats = await crud.get_average_session_duration(db, start_date, end_date)
+    engagement_data = await crud.get_user_engagement_stats(db, start_date, end_date)
+    popular_items_data = await crud.get_popular_items_stats(db, start_date, end_date)
+
+    general_stats["average_session_duration_minutes"] = avg_session_stats["average_duration_minutes"]
+
+    await export.add_sheet(
+        "Общая статистика",
+        ["Метрика", "Значение"],
+        [[_GENERAL_STATS_TITLES.get(key, key), value] for key, value in general_stats.items()],
+    )
+    await export.add_sheet(
+        "Топ Донаторы",
+        ["#", "Имя", "Фамилия", "Должность", "Отправлено"],
+        [
+            [i, row[0].first_name, row[0].last_name, row[0].position, row.sent_count]
+            for i, row in enumerate(engagement_data["top_senders"], 1)
+        ],
+    )
+    await export.add_sheet(
+        "Топ Инфлюенсеры",
+        ["#", "Имя", "Фамилия", "Должность", "Получено"],
+        [
+            [i, row[0].first_name, row[0].last_name, row[0].position, row.received_count]
+            for i, row in enumerate(engagement_data["top_receivers"], 1)
+        ],
+    )
+    await export.add_sheet(
+        "Популярные товары",
+        ["#", "Название товара", "Цена", "Кол-во покупок"],
+        [[i, row[0].name, row[0].price, row.purchase_count] for i, row in enumerate(popular_items_data, 1)],
+    )
+
+    # Неактивных может быть почти весь штат — читаем курсором и пишем пачками
+    inactive_sheet = await export.add_sheet(
+        "Неактивные пользователи",
+        ["Имя", "Фамилия", "Должность", "Отдел", "Дата регистрации", "Последний вход"],
+    )
+    inactive_batches = table_export.scalar_batches(
+        db,
+        crud.inactive_users_query(start_date, end_date),
+        lambda user: [
+            user.first_name,
+            user.last_name,
+            user.position,
+            user.department,
+            table_export.format_dt_moscow(user.registration_date),
+            table_export.format_dt_moscow(user.last_login_date),
+        ],
+    )
+    async for batch in inactive_batches:
+        await export.append_rows(inactive_sheet, batch)
+
+
+@dataclass(frozen=True)
+class _Report:
+    filename: Callable[[date, date], str]
+    data_version: Callable[[AsyncSession, date, date], Awaitable[str]]
+    write: Callable[[AsyncSession, table_export.XlsxExport, date, date], Awaitable[None]]
+
+
+REPORTS = {
+    "consolidated": _Report(
+        filename=lambda start_date, end_date: f"consolidated_report_{start_date}_to_{end_date}.xlsx",
+        data_version=consolidated_data_version,
+        write=write_consolidated_report,
+    ),
+}
+
+
+def default_period(start_date: Optional[date], end_date: Optional[date]) -> tuple[date, date]:
+    """Период по умолчанию — последние 30 дней, как у синхронной выгрузки."""
+    if end_date is None:
+        end_date = datetime.utcnow().date()
+    if start_date is None:
+        start_date = end_date - timedelta(days=30)
+    return start_date, end_date
+
+
+def _storage_dir() -> Path:
+    if settings.REPORT_STORAGE_DIR.strip():
+        return Path(settings.REPORT_STORAGE_DIR)
+    return Path(tempfile.gettempdir()) / "reports"
+
+
+async def _artifact_lost(job: models.ReportJob) -> bool:
+    """Файл мог пропасть (очистка tmp, другой узел, удаление из бакета) — тогда отчёт собирается заново."""
+    if job.status != "completed":
+        return False
+    if job.storage == "local":
+        return not Path(job.location).is_file()
+    try:
+        return not await asyncio.to_thread(object_exists, job.location)
+    except RuntimeError as exc:
+        # Хранилище недоступно — это не повод пересобирать, отдача файла сообщит об ошибке
+        logger.warning("Отчёт %s: не удалось проверить %s: %s", job.id, job.location, exc)
+        return False
+
+
+async def _mark_artifact_lost(db: AsyncSession, job: models.ReportJob) -> None:
+    """Переводит задание в ``failed``: следующий заказ того же отчёта соберёт его заново."""
+    logger.warning("Отчёт %s: файл %s не найден, собираем заново", job.id, job.location)
+    job.status = "failed"
+    job.error = "Файл отчёта не найден"
+    await db.commit()
+
+
+async def _find_live_job(
+    db: AsyncSession, report: str, start_date: date, end_date: date, data_version: str
+) -> Optional[models.ReportJob]:
+    job_model = models.ReportJob
+    result = await db.execute(
+        select(job_model).where(
+            job_model.report == report,
+            job_model.start_date == start_date,
+            job_model.end_date == end_date,
+            job_model.data_version == data_version,
+            job_model.status != "failed",
+        )
+    )
+    return result.scalar_one_or_none()
+
+
+async def request_report(
+    db: AsyncSession, report: str, start_date: date, end_date: date, created_by: Optional[int]
+) -> models.ReportJob:
+    """Готовый или уже заказанный отчёт с теми же данными — либо новое задание в очередь."""
+    spec = REPORTS[report]
+    data_version = await spec.data_version(db, start_date, end_date)
+    job = await _find_live_job(db, report, start_date, end_date, data_version)
+    if job is not None and not await _artifact_lost(job):
+        return job
+    if job is not None:
+        await _mark_artifact_lost(db, job)
+
+    job = models.ReportJob(
+        report=report,
+        start_date=start_date,
+        end_date=end_date,
+        data_version=data_version,
+        filename=spec.filename(start_date, end_date),
+        created_by=created_by,
+    )
+    db.add(job)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Такой же отчёт только что заказали параллельным запросом
+        await db.rollback()
+        return await _find_live_job(db, report, start_date, end_date, data_version)
+    await db.refresh(job)
+    report_worker.wake()
+    return job
+
+
+async def artifact_response(db: AsyncSession, job: models.ReportJob) -> Optional[Response]:
+    """Файл готового отчёта; ``None`` — файла нет (пропавший файл помечает задание ``failed``)."""
+    disposition = {"Content-Disposition": f"attachment; filename={job.filename}"}
+    if job.storage == "local":
+        if not Path(job.location).is_file():
+            await _mark_artifact_lost(db, job)
+            return None
+        return FileResponse(job.location, media_type=table_export.XLSX_MEDIA_TYPE, headers=disposition)
+    try:
+        body = await asyncio.to_thread(download_bytes, job.location)
+    except ObjectNotFoundError:
+        await _mark_artifact_lost(db, job)
+        return None
+    except RuntimeError as exc:
+        logger.error("Отчёт %s: не удалось прочитать %s: %s", job.id, job.location, exc)
+        return None
+    return Response(content=body, media_type=table_export.XLSX_MEDIA_TYPE, headers=disposition)
+
+
+def _write_local(file: IO[bytes], path: Path) -> int:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_suffix(".part")
+    with open(partial, "wb") as target:
+        shutil.copyfileobj(file, target)
+    os.replace(partial, path)
+    return path.stat().st_size
+
+
+def _remove_artifact(storage: Optional[str], location: Optional[str]) -> None:
+    if not location:
+        return
+    if storage == "local":
+        Path(location).unlink(missing_ok=True)
+    elif storage == "s3":
+        delete_object(location)
+
+
+class ReportWorker:
+    """Цикл сборки отчётов: опрос раз в ``poll_interval`` или по ``wake()``."""
+
+    def __init__(self, poll_interval: float, lease_seconds: int):
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def start(self) -> None:
+        if self._task is not None and not self._task.done():
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="report-worker")
+        logger.info("Воркер отчётов запущен")
+
+    async def stop(self) -> None:
+        """Останавливает воркер; прерванное задание подхватится после истечения аренды."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def wake(self) -> None:
+        """Разбудить воркер сразу после постановки задания (без ожидания опроса)."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                while await self._process_next_job():
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Воркер отчётов: ошибка обработки задания")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _claim_job(self, db: AsyncSession) -> Optional[models.ReportJob]:
+        """Забирает задание без активной аренды; ``running`` с истёкшей арендой — упавший воркер."""
+        job_model = models.ReportJob
+        now = datetime.utcnow()
+        result = await db.execute(
+            select(job_model)
+            .where(
+                job_model.status.in_(("queued", "running")),
+                or_(job_model.locked_until.is_(None), job_model.locked_until < now),
+            )
+            .order_by(job_model.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        job = result.scalar_one_or_none()
+        if job is None:
+            return None
+        if job.status == "running":
+            logger.warning("Отчёт %s: аренда истекла, собираем заново", job.id)
+        job.status = "running"
+        job.started_at = now
+        job.locked_until = now + timedelta(seconds=self.lease_seconds)
+        await db.commit()
+        return job
+
+    async def _process_next_job(self) -> bool:
+        """Собирает и сохраняет один отчёт. ``False`` — заданий в очереди нет."""
+        async with AsyncSessionLocal() as db:
+            job = await self._claim_job(db)
+            if job is None:
+                return False
+            job_id = job.id
+            lease = JobLease(models.ReportJob, job_id, job.locked_until, self.lease_seconds)
+            logger.info("Отчёт %s (%s, %s — %s): начата сборка", job_id, job.report, job.start_date, job.end_date)
+            try:
+                storage, location, size = await self._build(db, job, lease)
+            except LeaseLost as exc:
+                logger.warning("Отчёт %s: %s, сборка прервана", job_id, exc)
+                return True
+            except Exception as exc:
+                logger.exception("Отчёт %s: ошибка сборки", job_id)
+                await db.rollback()
+                try:
+                    await lease.update(
+                        db, status="failed", error=str(exc)[:500], locked_until=None, finished_at=datetime.utcnow()
+                    )
+                except LeaseLost:
+                    return True
+                await db.commit()
+                return True
+            try:
+                await lease.update(
+                    db,
+                    status="completed",
+                    storage=storage,
+                    location=location,
+                    size_bytes=size,
+                    finished_at=datetime.utcnow(),
+                    locked_until=None,
+                )
+            except LeaseLost:
+                # Задание уже собирает другой воркер — его файл будет записан им, наш лишний
+                await db.rollback()
+                logger.warning("Отчёт %s: аренда перехвачена, собранный файл удаляется", job_id)
+                await asyncio.to_thread(_remove_artifact, storage, location)
+                return True
+            await db.commit()
+            logger.info("Отчёт %s готов: %s, %s байт", job_id, storage, size)
+            await self._discard_superseded(db, job)
+            return True
+
+    async def _build(self, db: AsyncSession, job: models.ReportJob, lease: JobLease) -> tuple[str, str, int]:
+        export = table_export.XlsxExport(on_progress=lease.renew)
+        await REPORTS[job.report].write(db, export, job.start_date, job.end_date)
+        file = await export.save()
+        # Своё имя у каждой сборки: перехватившая задание сборка не затрёт этот файл и наоборот
+        name = f"{job.id}-{uuid.uuid4().hex[:8]}.xlsx"
+        try:
+            await lease.renew()
+            if is_object_storage_configured():
+                key = f"reports/{job.report}/{name}"
+                body = await asyncio.to_thread(file.read)
+                await asyncio.to_thread(upload_bytes, key, body, table_export.XLSX_MEDIA_TYPE, False)
+                return "s3", key, len(body)
+            path = _storage_dir() / name
+            size = await asyncio.to_thread(_write_local, file, path)
+            return "local", str(path), size
+        finally:
+            file.close()
+
+    async def _discard_superseded(self, db: AsyncSession, job: models.ReportJob) -> None:
+        """Удаляет готовые отчёты того же периода по устаревшим данным вместе с файлами."""
+        job_model = models.ReportJob
+        result = await db.execute(
+            select(job_model).where(
+                job_model.report == job.report,
+                job_model.start_date == job.start_date,
+                job_model.end_date == job.end_date,
+                job_model.id < job.id,
+                job_model.status.in_(("completed", "failed")),
+            )
+        )
+        for old in result.scalars().all():
+            try:
+                await asyncio.to_thread(_remove_artifact, old.storage, old.location)
+            except Exception as exc:
+                logger.warning("Отчёт %s: не удалось удалить файл %s: %s", old.id, old.location, exc)
+                continue
+            await db.delete(old)
+        await db.commit()
+
+
+report_worker = ReportWorker(
+    poll_interval=settings.REPORT_POLL_INTERVAL_SECONDS,
+    lease_seconds=settings.REPORT_LEASE_SECONDS,
+)
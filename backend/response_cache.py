@@ -0,0 +1,309 @@
+"""Cache-aside для горячих публичных GET-эндпоинтов: один ключ на всех пользователей.
+
+В кеше лежит готовый ответ — ``CachedResponse``: JSON-тело в байтах (так, как
+его отдал бы ``response_model``), ETag от тела и дополнительные заголовки.
+Попадание отдаётся как есть через ``to_response`` без валидации Pydantic и
+повторной сериализации; клиент с совпавшим ``If-None-Match`` получает 304.
+
+В Redis ответ пишется через ``redis_cache.set_global``. Ключ
+``cache:global:{variant}:{namespace}`` живёт в поколении ``namespace``, так что
+``crud._invalidate_market_cache``, ``_invalidate_feed_and_leaderboard`` и
+``_invalidate_banners_cache`` сбрасывают его вместе с пользовательскими ключами.
+Запись помечается поколением, прочитанным до загрузки: если инвалидация
+случилась во время запроса к БД, устаревший ответ в кеш не попадёт.
+
+Для пространств из ``LOCAL_NAMESPACES`` перед Redis стоит ``local_cache`` —
+ответ из памяти процесса без сетевого обхода. Счётчики попаданий и промахов
+по уровням — ``response_cache.stats()``.
+
+Промахи схлопываются внутри процесса (single-flight): в Postgres идёт один
+запрос на ключ, остальные ждут его результат. ``get_or_refresh`` (лента,
+рейтинг) вдобавок отдаёт запись после мягкого срока как есть и обновляет её
+одной фоновой задачей на все процессы — без лавины запросов в конце TTL. Недоступный Redis не ломает
+эндпоинт — данные просто читаются из БД. ``None`` (например, товар Statix не
+настроен) не кешируется.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Optional
+
+import orjson
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal
+from local_cache import local_cache
+from redis_cache import CacheLookup, redis_cache
+
+logger = logging.getLogger(__name__)
+
+# Редко меняющиеся ответы, которые держим и в памяти процесса
+LOCAL_NAMESPACES = frozenset({"market", "banners", "app_settings", "statix_bonus"})
+# Блокировка фонового обновления живёт не дольше этого (если процесс упал посреди запроса)
+_REFRESH_LOCK_SECONDS = 30
+# Разделитель служебной части (ETag, заголовки) и тела в записи Redis
+_META_SEPARATOR = b"\n"
+
+ResponseHeaders = Callable[[Any], dict[str, str]]
+
+
+@lru_cache(maxsize=None)
+def _adapter(response_model: Any) -> TypeAdapter:
+    return TypeAdapter(response_model)
+
+
+def dump(response_model: Any, value: Any) -> Any:
+    """ORM-объекты/словари → JSON-совместимые данные по схеме ответа."""
+    return jsonable_encoder(_adapter(response_model).validate_python(value, from_attributes=True))
+
+
+def _variant(params: dict[str, Any]) -> str:
+    if not params:
+        return "all"
+    return "&".join(f"{name}={params[name]}" for name in sorted(params))
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    """Готовый JSON-ответ: тело, ETag и дополнительные заголовки (например, X-Next-Cursor)."""
+
+    body: bytes
+    etag: str
+    headers: dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def from_data(cls, data: Any, headers: Optional[dict[str, str]] = None) -> "CachedResponse":
+        body = orjson.dumps(data)
+        etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+        return cls(body, etag, headers or {})
+
+    def pack(self) -> bytes:
+        meta = orjson.dumps({"etag": self.etag, "headers": self.headers})
+        return meta + _META_SEPARATOR + self.body
+
+    @classmethod
+    def unpack(cls, raw: Any) -> Optional["CachedResponse"]:
+        """Запись из Redis; прежний формат (данные без тела) — None, т. е. промах."""
+        if not isinstance(raw, bytes) or _META_SEPARATOR not in raw:
+            return None
+        meta, body = raw.split(_META_SEPARATOR, 1)
+        meta = orjson.loads(meta)
+        return cls(body, meta["etag"], meta["headers"])
+
+    def to_response(self, request: Request) -> Response:
+        headers = {"ETag": self.etag, **self.headers}
+        if _etag_matches(request.headers.get("if-none-match"), self.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=self.body, media_type="application/json", headers=headers)
+
+
+class ResponseCache:
+    """Общий кеш ответов с single-flight на промахах."""
+
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._refreshing: dict[str, asyncio.Task] = {}
+        self._counters = {tier: {"hits": 0, "misses": 0} for tier in ("local", "redis")}
+        self._counters["redis"].update(stale=0, refreshes=0)
+
+    def stats(self) -> dict[str, Any]:
+        """Попадания и промахи по уровням в этом процессе (с момента запуска)."""
+        return {
+            "local": {**self._counters["local"], "entries": len(local_cache)},
+            "redis": dict(self._counters["redis"]),
+        }
+
+    async def _lookup(self, namespace: str, variant: str) -> CacheLookup:
+        try:
+            return await redis_cache.lookup_global(namespace, variant)
+        except Exception as e:
+            logger.warning("Кеш %s недоступен, чтение из БД: %s", namespace, e)
+            return CacheLookup(None, None)
+
+    async def get_or_load(
+        self,
+        namespace: str,
+        loader: Callable[[], Awaitable[Any]],
+        response_model: Optional[Any] = None,
+        *,
+        response_headers: Optional[ResponseHeaders] = None,
+        **params: Any,
+    ) -> Optional[CachedResponse]:
+        """Ответ из кеша или результат ``loader()``, сериализованный по ``response_model``.
+
+        ``namespace`` — ключ инвалидации (market, banners, feed, leaderboard),
+        ``params`` — параметры запроса, от которых зависит ответ,
+        ``response_headers(value)`` — заголовки ответа по результату загрузки.
+        None — ``loader`` вернул None.
+        """
+        variant = _variant(params)
+        local = namespace in LOCAL_NAMESPACES
+        epoch = 0
+        if local:
+            cached = local_cache.get(namespace, variant)
+            if cached is not None:
+                self._counters["local"]["hits"] += 1
+                return cached
+            self._counters["local"]["misses"] += 1
+            epoch = local_cache.epoch(namespace)
+
+        entry = await self._lookup(namespace, variant)
+        cached = CachedResponse.unpack(entry.value)
+        if cached is not None:
+            self._counters["redis"]["hits"] += 1
+            if local:
+                local_cache.put(namespace, variant, cached, epoch)
+            return cached
+        self._counters["redis"]["misses"] += 1
+
+        on_loaded = (lambda loaded: local_cache.put(namespace, variant, loaded, epoch)) if local else None
+        return await self._load(
+            namespace, variant, loader, response_model, response_headers, entry.generation, on_loaded
+        )
+
+    async def get_or_refresh(
+        self,
+        namespace: str,
+        loader: Callable[[AsyncSession], Awaitable[Any]],
+        response_model: Optional[Any] = None,
+        *,
+        response_headers: Optional[ResponseHeaders] = None,
+        **params: Any,
+    ) -> Optional[CachedResponse]:
+        """Как ``get_or_load``, но со stale-while-revalidate для ключей из ``redis_cache._STALE_TTL``.
+
+        После мягкого срока запрос сразу получает устаревшее значение, а обновляет
+        его одна фоновая задача на все процессы (блокировка в Redis). ``loader(db)``
+        получает собственную сессию — он может выполняться уже после ответа клиенту.
+        """
+        variant = _variant(params)
+        entry = await self._lookup(namespace, variant)
+        cached = CachedResponse.unpack(entry.value)
+        if cached is not None:
+            self._counters["redis"]["hits"] += 1
+            if entry.stale:
+                self._counters["redis"]["stale"] += 1
+                self._schedule_refresh(
+                    namespace, variant, loader, response_model, response_headers, entry.generation
+                )
+            return cached
+        self._counters["redis"]["misses"] += 1
+        return await self._load(
+            namespace, variant, lambda: _with_session(loader), response_model, response_headers, entry.generation
+        )
+
+    def _schedule_refresh(
+        self,
+        namespace: str,
+        variant: str,
+        loader: Callable[[AsyncSession], Awaitable[Any]],
+        response_model: Optional[Any],
+        response_headers: Optional[ResponseHeaders],
+        generation: Optional[int],
+    ) -> None:
+        flight_key = f"{namespace}:{variant}"
+        if flight_key in self._refreshing:
+            return
+        task = asyncio.create_task(
+            self._refresh(namespace, variant, loader, response_model, response_headers, generation),
+            name=f"cache-refresh-{flight_key}",
+        )
+        self._refreshing[flight_key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(flight_key, None))
+
+    async def _refresh(
+        self,
+        namespace: str,
+        variant: str,
+        loader: Callable[[AsyncSession], Awaitable[Any]],
+        response_model: Optional[Any],
+        response_headers: Optional[ResponseHeaders],
+        generation: Optional[int],
+    ) -> None:
+        """Фоновое обновление устаревшей записи; без блокировки — обновляет другой процесс."""
+        lock_name = f"refresh:{namespace}:{variant}"
+        try:
+            token = await redis_cache.acquire_lock(lock_name, _REFRESH_LOCK_SECONDS)
+            if token is None:
+                return
+            try:
+                self._counters["redis"]["refreshes"] += 1
+                await self._load(
+                    namespace, variant, lambda: _with_session(loader), response_model, response_headers, generation
+                )
+            finally:
+                await redis_cache.release_lock(lock_name, token)
+        except Exception as e:
+            logger.warning("Фоновое обновление кеша %s:%s не удалось: %s", namespace, variant, e)
+
+    async def _load(
+        self,
+        namespace: str,
+        variant: str,
+        loader: Callable[[], Awaitable[Any]],
+        response_model: Optional[Any],
+        response_headers: Optional[ResponseHeaders],
+        generation: Optional[int],
+        on_loaded: Optional[Callable[[CachedResponse], None]] = None,
+    ) -> Optional[CachedResponse]:
+        """Загрузка с single-flight внутри процесса и сохранением в Redis."""
+        flight_key = f"{namespace}:{variant}"
+        inflight = self._inflight.get(flight_key)
+        if inflight is not None:
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # Загружавший запрос отменён (клиент ушёл) — загружаем сами
+
+        future = asyncio.get_running_loop().create_future()
+        # Ошибку загрузки получает вызывающий; ждущих может не оказаться
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[flight_key] = future
+        try:
+            value = await loader()
+            data = dump(response_model, value) if response_model is not None else jsonable_encoder(value)
+            loaded = None
+            if data is not None:
+                loaded = CachedResponse.from_data(data, response_headers(value) if response_headers else None)
+                try:
+                    await redis_cache.set_global(namespace, variant, loaded.pack(), generation=generation)
+                except Exception as e:
+                    logger.warning("Не удалось сохранить %s в кеш: %s", flight_key, e)
+                if on_loaded is not None:
+                    on_loaded(loaded)
+            future.set_result(loaded)
+            return loaded
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            if self._inflight.get(flight_key) is future:
+                del self._inflight[flight_key]
+
+
+async def _with_session(loader: Callable[[AsyncSession], Awaitable[Any]]) -> Any:
+    async with AsyncSessionLocal() as db:
+        return await loader(db)
+
+
+response_cache = ResponseCache()
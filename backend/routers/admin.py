@@ -2,21 +2,20 @@ from fastapi import APIRouter, Depends, HTTPException, Response, Query, status
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import select, func, union_all, literal, case
-from sqlalchemy.orm import selectinload
+from sqlalchemy import select, func, union_all, literal, case, null, String, Select, ColumnElement
+from sqlalchemy.orm import aliased, selectinload
 from typing import List, Optional
-from datetime import date, datetime, timedelta
-from zoneinfo import ZoneInfo
+from datetime import date, datetime
+import broadcast_jobs
+import report_jobs
 import crud
 import schemas
 import models
-import io
-from fastapi.responses import StreamingResponse
+import table_export
 from dependencies import get_current_admin_user
-from database import get_db
+from database import AsyncSessionLocal, get_db
 from config import settings
-from openpyxl import Workbook
-from openpyxl.worksheet.worksheet import Worksheet
+from response_cache import response_cache
 
 router = APIRouter(
     prefix="/admin",
@@ -432,12 +431,51 @@ async def broadcast_email_preview_route(
     )
 
 
-@router.post("/users/broadcast-email", response_model=schemas.BroadcastEmailResponse)
+async def _broadcast_job_response(db: AsyncSession, job: models.BroadcastJob) -> schemas.BroadcastJobResponse:
+    """Статус рассылки: счётчики из задания, число оставшихся и первые ошибки доставки."""
+    pending = await broadcast_jobs.get_pending_count(db, job.id)
+    failed = await broadcast_jobs.get_failed_deliveries(db, job.id)
+    parts: list[str] = []
+    if job.email_html is not None:
+        parts.append(f"Email: {job.sent_ok_email}/{job.total_email}")
+    if job.telegram_text is not None:
+        parts.append(f"Telegram: {job.sent_ok_telegram}/{job.total_telegram}")
+    progress = "; ".join(parts) if parts else "Ничего не отправлено"
+    prefix = {"queued": "В очереди", "running": "Идёт рассылка", "completed": "Рассылка завершена"}[job.status]
+    return schemas.BroadcastJobResponse(
+        job_id=job.id,
+        status=job.status,
+        message=f"{prefix}. {progress}",
+        recipient_count_email=job.total_email,
+        recipient_count_telegram=job.total_telegram,
+        sent_ok_email=job.sent_ok_email,
+        sent_ok_telegram=job.sent_ok_telegram,
+        failed_count=job.failed_count,
+        pending_count=pending,
+        failed=[
+            schemas.BroadcastEmailFailedItem(channel=d.channel, target=d.target, detail=d.error or "")
+            for d in failed
+        ],
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+    )
+
+
+@router.post(
+    "/users/broadcast-email",
+    response_model=schemas.BroadcastJobResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+)
 async def broadcast_email_route(
     request: schemas.BroadcastEmailRequest,
     db: AsyncSession = Depends(get_db),
+    admin_user: models.User = Depends(get_current_admin_user),
 ):
-    """Рассылка в email, Telegram или оба канала: одобренные пользователи, не заблокированы."""
+    """Ставит рассылку (email, Telegram или оба канала) в фоновую очередь.
+
+    Прогресс — ``GET /admin/broadcast-jobs/{job_id}``.
+    """
     if request.send_email:
         smtp_user = getattr(settings, "SMTP_USERNAME", None) or ""
         smtp_pass = getattr(settings, "SMTP_PASSWORD", None) or ""
@@ -453,7 +491,7 @@ async def broadcast_email_route(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 detail="Telegram бот не настроен (TELEGRAM_BOT_TOKEN).",
             )
-    result = await crud.broadcast_announcement_to_users(
+    job = await crud.create_broadcast_job(
         db,
         subject=request.subject,
         body_plain=request.body,
@@ -461,25 +499,39 @@ async def broadcast_email_route(
         append_login_url=request.append_login_url,
         send_email=request.send_email,
         send_telegram=request.send_telegram,
+        created_by=admin_user.id,
     )
-    parts: list[str] = []
-    if request.send_email:
-        parts.append(
-            f"Email: {result['sent_ok_email']}/{result['recipient_count_email']}",
-        )
-    if request.send_telegram:
-        parts.append(
-            f"Telegram: {result['sent_ok_telegram']}/{result['recipient_count_telegram']}",
-        )
-    msg = "; ".join(parts) if parts else "Ничего не отправлено"
-    return schemas.BroadcastEmailResponse(
-        message=msg,
-        recipient_count_email=result["recipient_count_email"],
-        recipient_count_telegram=result["recipient_count_telegram"],
-        sent_ok_email=result["sent_ok_email"],
-        sent_ok_telegram=result["sent_ok_telegram"],
-        failed=[schemas.BroadcastEmailFailedItem(**f) for f in result["failed"]],
+    broadcast_jobs.broadcast_worker.wake()
+    return await _broadcast_job_response(db, job)
+
+
+@router.get("/broadcast-jobs", response_model=List[schemas.BroadcastJobResponse])
+async def list_broadcast_jobs_route(
+    limit: int = Query(10, ge=1, le=50),
+    db: AsyncSession = Depends(get_db),
+):
+    """Последние рассылки (новые сверху)."""
+    result = await db.execute(
+        select(models.BroadcastJob).order_by(models.BroadcastJob.id.desc()).limit(limit)
     )
+    return [await _broadcast_job_response(db, job) for job in result.scalars().all()]
+
+
+@router.get("/broadcast-jobs/{job_id}", response_model=schemas.BroadcastJobResponse)
+async def get_broadcast_job_route(job_id: int, db: AsyncSession = Depends(get_db)):
+    job = await db.get(models.BroadcastJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Рассылка не найдена")
+    return await _broadcast_job_response(db, job)
+
+
+@router.post("/broadcast-jobs/{job_id}/retry", response_model=schemas.BroadcastJobResponse)
+async def retry_broadcast_job_route(job_id: int, db: AsyncSession = Depends(get_db)):
+    """Повторно отправляет только неудавшиеся доставки рассылки."""
+    job = await broadcast_jobs.retry_failed(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Рассылка не найдена")
+    return await _broadcast_job_response(db, job)
 
 
 @router.get("/statistics/general", response_model=schemas.GeneralStatsResponse)
@@ -546,33 +598,25 @@ async def get_average_session_duration_route(
 @router.get("/statistics/user_engagement/export")
 async def export_user_engagement(db: AsyncSession = Depends(get_db)):
     engagement_data = await crud.get_user_engagement_stats(db)
-    top_senders = engagement_data["top_senders"]
-    top_receivers = engagement_data["top_receivers"]
 
-    workbook = Workbook()
-    
-    ws_senders = workbook.active
-    ws_senders.title = "Топ Донаторы"
-    ws_senders.append(["#", "Имя", "Фамилия", "Должность", "Отдел", "Отправлено"])
-    for i, sender_row in enumerate(top_senders, 1):
-        user, count = sender_row[0], sender_row.sent_count
-        ws_senders.append([i, user.first_name, user.last_name, user.position, user.department, count])
-
-    ws_receivers = workbook.create_sheet("Топ Инфлюенсеры")
-    ws_receivers.append(["#", "Имя", "Фамилия", "Должность", "Отдел", "Получено"])
-    for i, receiver_row in enumerate(top_receivers, 1):
-        user, count = receiver_row[0], receiver_row.received_count
-        ws_receivers.append([i, user.first_name, user.last_name, user.position, user.department, count])
-
-    file_stream = io.BytesIO()
-    workbook.save(file_stream)
-    file_stream.seek(0)
-
-    return StreamingResponse(
-        file_stream,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": "attachment; filename=leaders_report.xlsx"}
+    export = table_export.XlsxExport()
+    await export.add_sheet(
+        "Топ Донаторы",
+        ["#", "Имя", "Фамилия", "Должность", "Отдел", "Отправлено"],
+        [
+            [i, row[0].first_name, row[0].last_name, row[0].position, row[0].department, row.sent_count]
+            for i, row in enumerate(engagement_data["top_senders"], 1)
+        ],
     )
+    await export.add_sheet(
+        "Топ Инфлюенсеры",
+        ["#", "Имя", "Фамилия", "Должность", "Отдел", "Получено"],
+        [
+            [i, row[0].first_name, row[0].last_name, row[0].position, row[0].department, row.received_count]
+            for i, row in enumerate(engagement_data["top_receivers"], 1)
+        ],
+    )
+    return await export.response("leaders_report.xlsx")
 
 @router.get("/statistics/export/consolidated")
 async def export_consolidated_report(
@@ -580,121 +624,111 @@ async def export_consolidated_report(
     end_date: Optional[date] = Query(None),
     db: AsyncSession = Depends(get_db)
 ):
-    if end_date is None: end_date = datetime.utcnow().date()
-    if start_date is None: start_date = end_date - timedelta(days=30)
-
-    general_stats = await crud.get_general_statistics(db, start_date, end_date)
-    avg_session_stats = await crud.get_average_session_duration(db, start_date, end_date)
-    engagement_data = await crud.get_user_engagement_stats(db, start_date, end_date)
-    popular_items_data = await crud.get_popular_items_stats(db, start_date, end_date)
-    inactive_users_data = await crud.get_inactive_users(db, start_date, end_date)
-    
-    general_stats['average_session_duration_minutes'] = avg_session_stats['average_duration_minutes']
-
-    moscow_tz = ZoneInfo("Europe/Moscow")
-    output = io.BytesIO()
-
-    general_stats_translation = {
-        "new_users_count": "Всего пользователей",
-        "active_users_count": "Активные пользователи",
-        "transactions_count": "Всего транзакций",
-        "store_purchases_count": "Покупок в магазине",
-        "total_turnover": "Оборот 'спасибок'",
-        "total_store_spent": "Потрачено в магазине",
-        "average_session_duration_minutes": "Среднее время сессии (мин)"
-    }
-
-    translated_stats = {
-        general_stats_translation.get(key, key): value
-        for key, value in general_stats.items()
-    }
-
-    workbook = Workbook()
-    ws_general = workbook.active
-    ws_general.title = "Общая статистика"
-    ws_general.append(["Метрика", "Значение"])
-    for metric, value in translated_stats.items():
-        ws_general.append([metric, value])
-
-    senders_list = [
-        {"#": i, "Имя": row[0].first_name, "Фамилия": row[0].last_name, "Должность": row[0].position, "Отправлено": row.sent_count}
-        for i, row in enumerate(engagement_data["top_senders"], 1)
-    ]
-    _append_dict_rows_sheet(workbook, "Топ Донаторы", senders_list)
+    """Синхронная сборка сводного отчёта; панель заказывает его через ``POST /admin/report-jobs``."""
+    start_date, end_date = report_jobs.default_period(start_date, end_date)
+    export = table_export.XlsxExport()
+    await report_jobs.write_consolidated_report(db, export, start_date, end_date)
+    return await export.response(report_jobs.REPORTS["consolidated"].filename(start_date, end_date))
+
+
+def _report_job_response(job: models.ReportJob) -> schemas.ReportJobResponse:
+    return schemas.ReportJobResponse(
+        job_id=job.id,
+        report=job.report,
+        status=job.status,
+        start_date=job.start_date,
+        end_date=job.end_date,
+        filename=job.filename,
+        download_url=str(router.url_path_for("download_report_job_route", job_id=job.id)),
+        size_bytes=job.size_bytes,
+        error=job.error,
+        created_at=job.created_at,
+        finished_at=job.finished_at,
+    )
 
-    receivers_list = [
-        {"#": i, "Имя": row[0].first_name, "Фамилия": row[0].last_name, "Должность": row[0].position, "Получено": row.received_count}
-        for i, row in enumerate(engagement_data["top_receivers"], 1)
-    ]
-    _append_dict_rows_sheet(workbook, "Топ Инфлюенсеры", receivers_list)
 
-    items_list = [
-        {"#": i, "Название товара": row[0].name, "Цена": row[0].price, "Кол-во покупок": row.purchase_count}
-        for i, row in enumerate(popular_items_data, 1)
+@router.post(
+    "/report-jobs",
+    response_model=schemas.ReportJobResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def create_report_job_route(
+    request: schemas.ReportJobRequest,
+    db: AsyncSession = Depends(get_db),
+    admin_user: models.User = Depends(get_current_admin_user),
+):
+    """Заказывает отчёт за период. Пока данные не менялись, возвращается уже готовый
+    (или уже собираемый) файл; прогресс — ``GET /admin/report-jobs/{job_id}``."""
+    start_date, end_date = report_jobs.default_period(request.start_date, request.end_date)
+    if start_date > end_date:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Дата начала позже даты окончания")
+    job = await report_jobs.request_report(db, request.report, start_date, end_date, created_by=admin_user.id)
+    return _report_job_response(job)
+
+
+@router.get("/report-jobs/{job_id}", response_model=schemas.ReportJobResponse)
+async def get_report_job_route(job_id: int, db: AsyncSession = Depends(get_db)):
+    job = await db.get(models.ReportJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Отчёт не найден")
+    return _report_job_response(job)
+
+
+@router.get("/report-jobs/{job_id}/download")
+async def download_report_job_route(job_id: int, db: AsyncSession = Depends(get_db)):
+    job = await db.get(models.ReportJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Отчёт не найден")
+    if job.status != "completed":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Отчёт ещё не готов")
+    response = await report_jobs.artifact_response(db, job)
+    if response is None:
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Файл отчёта удалён, закажите отчёт заново")
+    return response
+
+_USER_EXPORT_HEADERS = [
+    "ID", "Telegram ID", "Имя", "Фамилия", "Username", "Отдел", "Должность",
+    "Баланс", "Билеты", "Статус", "Админ", "Дата регистрации", "Последний вход",
+]
+
+def _user_export_row(user: models.User) -> list:
+    return [
+        user.id,
+        user.telegram_id,
+        user.first_name,
+        user.last_name,
+        user.username,
+        user.department,
+        user.position,
+        user.balance,
+        user.tickets,
+        user.status,
+        "Да" if user.is_admin else "Нет",
+        table_export.format_dt_moscow(user.registration_date),
+        table_export.format_dt_moscow(user.last_login_date),
     ]
-    _append_dict_rows_sheet(workbook, "Популярные товары", items_list)
 
-    inactive_list = [
-        {
-            "Имя": user.first_name,
-            "Фамилия": user.last_name,
-            "Должность": user.position,
-            "Отдел": user.department,
-            "Дата регистрации": _format_dt_moscow(user.registration_date, moscow_tz),
-            "Последний вход": _format_dt_moscow(user.last_login_date, moscow_tz),
-        }
-        for user in inactive_users_data
-    ]
-    _append_dict_rows_sheet(workbook, "Неактивные пользователи", inactive_list)
-
-    workbook.save(output)
-    output.seek(0)
-    filename = f"consolidated_report_{start_date}_to_{end_date}.xlsx"
-    return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
-    )
-    
 @router.get("/users/export")
-async def export_all_users(db: AsyncSession = Depends(get_db)):
-    all_users = await crud.get_all_users_for_admin(db)
+async def export_all_users(
+    format: str = Query("xlsx", pattern="^(xlsx|csv)$"),
+    db: AsyncSession = Depends(get_db)
+):
+    filename = f"all_users_{datetime.utcnow().date()}.{format}"
 
-    moscow_tz = ZoneInfo("Europe/Moscow")
+    if format == "csv":
+        async def csv_batches():
+            # Тело CSV отправляется после выхода из эндпоинта — своя сессия на время курсора
+            async with AsyncSessionLocal() as session:
+                async for batch in table_export.scalar_batches(session, crud.all_users_for_admin_query(), _user_export_row):
+                    yield batch
 
-    users_list = [
-        {
-            "ID": user.id,
-            "Telegram ID": user.telegram_id,
-            "Имя": user.first_name,
-            "Фамилия": user.last_name,
-            "Username": user.username,
-            "Отдел": user.department,
-            "Должность": user.position,
-            "Баланс": user.balance,
-            "Билеты": user.tickets,
-            "Статус": user.status,
-            "Админ": "Да" if user.is_admin else "Нет",
-            "Дата регистрации": _format_dt_moscow(user.registration_date, moscow_tz),
-            "Последний вход": _format_dt_moscow(user.last_login_date, moscow_tz),
-        }
-        for user in all_users
-    ]
+        return table_export.csv_response(_USER_EXPORT_HEADERS, csv_batches, filename)
 
-    output = io.BytesIO()
-    workbook = Workbook()
-    ws = workbook.active
-    ws.title = "Все пользователи"
-    _write_dict_rows_on_sheet(ws, users_list)
-    workbook.save(output)
-    output.seek(0)
-
-    filename = f"all_users_{datetime.utcnow().date()}.xlsx"
-    return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
-    )
+    export = table_export.XlsxExport()
+    sheet = await export.add_sheet("Все пользователи", _USER_EXPORT_HEADERS)
+    async for batch in table_export.scalar_batches(db, crud.all_users_for_admin_query(), _user_export_row):
+        await export.append_rows(sheet, batch)
+    return await export.response(filename)
 
 @router.delete("/market-items/{item_id}/permanent", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_item_permanently_route(
@@ -783,6 +817,12 @@ async def trigger_leaderboard_test_banner_generation(
         raise HTTPException(status_code=500, detail="Не удалось сгенерировать тестовые баннеры")
 
 
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """Попадания/промахи кеша ответов по уровням (локальный, Redis) в обработавшем запрос процессе."""
+    return response_cache.stats()
+
+
 @router.get("/purchases/all", response_model=schemas.UnifiedPurchaseListResponse)
 async def get_all_purchases(
     type: Optional[str] = Query(None, description="regular, local, statix, shared"),
@@ -796,146 +836,151 @@ async def get_all_purchases(
     return schemas.UnifiedPurchaseListResponse(items=items, total=total)
 
 
-async def _get_all_purchases_from_db(
-    db: AsyncSession,
-    purchase_type: Optional[str],
-    status_filter: Optional[str],
-    page: int,
-    per_page: int,
-) -> tuple[list[schemas.UnifiedPurchaseResponse], int]:
-    """Собирает и объединяет все покупки из разных таблиц."""
-    result_items: list[schemas.UnifiedPurchaseResponse] = []
+def _full_name(user) -> ColumnElement:
+    return func.trim(func.coalesce(user.first_name, '') + ' ' + func.coalesce(user.last_name, ''))
+
+
+# Колонки UNION ALL в порядке schemas.UnifiedPurchaseResponse
+_UNIFIED_PURCHASE_COLUMNS = (
+    "id", "purchase_type", "user_name", "user_id", "item_name", "item_id", "amount", "status",
+    "created_at", "city", "website_url", "phone_number", "first_name", "last_name",
+    "position", "email", "telegram_username",
+)
+
+
+def _unified_purchase_select(*columns: ColumnElement) -> Select:
+    return select(*(column.label(name) for column, name in zip(columns, _UNIFIED_PURCHASE_COLUMNS, strict=True)))
+
+
+def _unified_purchase_branches(purchase_type: Optional[str]) -> list[Select]:
+    """Обычные покупки, локальные подарки и совместные подарки в одних колонках.
+
+    Фильтр по типу отбрасывает лишние ветки; пустая дата — текущий момент (UTC).
+    """
+    now_utc = func.timezone('utc', func.now())
+    no_text = null().cast(String)
+    branches: list[Select] = []
 
     # --- Regular purchases ---
-    if not purchase_type or purchase_type == 'regular':
+    if not purchase_type or purchase_type in ('regular', 'statix'):
+        user = aliased(models.User)
+        is_statix = func.lower(models.MarketItem.name).contains('statix')
         q = (
-            select(models.Purchase)
+            _unified_purchase_select(
+                models.Purchase.id,
+                case((is_statix, literal('statix', String)), else_=literal('regular', String)),
+                _full_name(user),
+                models.Purchase.user_id,
+                models.MarketItem.name,
+                models.Purchase.item_id,
+                models.MarketItem.price,
+                literal('completed', String),
+                func.coalesce(models.Purchase.timestamp, now_utc),
+                no_text,
+                no_text,
+                user.phone_number,
+                user.first_name,
+                user.last_name,
+                user.position,
+                user.email,
+                user.username,
+            )
             .join(models.MarketItem, models.Purchase.item_id == models.MarketItem.id)
-            .join(models.User, models.Purchase.user_id == models.User.id)
-            .options(selectinload(models.Purchase.user), selectinload(models.Purchase.item))
+            .join(user, models.Purchase.user_id == user.id)
             .where(models.MarketItem.is_local_purchase == False)  # noqa: E712
             .where(models.MarketItem.is_shared_gift == False)  # noqa: E712
         )
-        rows = (await db.execute(q)).scalars().all()
-        for p in rows:
-            is_statix = p.item and 'statix' in (p.item.name or '').lower()
-            ptype = 'statix' if is_statix else 'regular'
-            if purchase_type and ptype != purchase_type:
-                continue
-            u = p.user
-            result_items.append(schemas.UnifiedPurchaseResponse(
-                id=p.id,
-                purchase_type=ptype,
-                user_name=f"{u.first_name or ''} {u.last_name or ''}".strip(),
-                user_id=p.user_id,
-                item_name=p.item.name if p.item else "—",
-                item_id=p.item_id,
-                amount=p.item.price if p.item else 0,
-                status="completed",
-                created_at=p.timestamp or datetime.utcnow(),
-                phone_number=u.phone_number,
-                first_name=u.first_name,
-                last_name=u.last_name,
-                position=u.position,
-                email=u.email,
-                telegram_username=u.username,
-            ))
+        if purchase_type == 'statix':
+            q = q.where(is_statix)
+        elif purchase_type == 'regular':
+            q = q.where(~is_statix)
+        branches.append(q)
 
     # --- Local purchases ---
     if not purchase_type or purchase_type == 'local':
-        q = (
-            select(models.LocalGift)
-            .options(selectinload(models.LocalGift.user), selectinload(models.LocalGift.item))
+        user = aliased(models.User)
+        item = aliased(models.MarketItem)
+        branches.append(
+            _unified_purchase_select(
+                models.LocalGift.id,
+                literal('local', String),
+                _full_name(user),
+                models.LocalGift.user_id,
+                func.coalesce(item.name, '—'),
+                models.LocalGift.item_id,
+                models.LocalGift.reserved_amount,
+                models.LocalGift.status,
+                func.coalesce(models.LocalGift.created_at, now_utc),
+                models.LocalGift.city,
+                models.LocalGift.website_url,
+                user.phone_number,
+                user.first_name,
+                user.last_name,
+                user.position,
+                user.email,
+                user.username,
+            )
+            .join(user, models.LocalGift.user_id == user.id)
+            .outerjoin(item, models.LocalGift.item_id == item.id)
         )
-        rows = (await db.execute(q)).scalars().all()
-        for lp in rows:
-            u = lp.user
-            result_items.append(schemas.UnifiedPurchaseResponse(
-                id=lp.id,
-                purchase_type='local',
-                user_name=f"{u.first_name or ''} {u.last_name or ''}".strip(),
-                user_id=lp.user_id,
-                item_name=lp.item.name if lp.item else "—",
-                item_id=lp.item_id,
-                amount=lp.reserved_amount,
-                status=lp.status,
-                created_at=lp.created_at or datetime.utcnow(),
-                city=lp.city,
-                website_url=lp.website_url,
-                phone_number=u.phone_number,
-                first_name=u.first_name,
-                last_name=u.last_name,
-                position=u.position,
-                email=u.email,
-                telegram_username=u.username,
-            ))
 
     # --- Shared gifts ---
     if not purchase_type or purchase_type == 'shared':
-        q = (
-            select(models.SharedGiftInvitation)
-            .options(
-                selectinload(models.SharedGiftInvitation.buyer),
-                selectinload(models.SharedGiftInvitation.invited_user),
-                selectinload(models.SharedGiftInvitation.item),
+        buyer = aliased(models.User)
+        invited = aliased(models.User)
+        item = aliased(models.MarketItem)
+        buyer_name = case((buyer.id.is_(None), '—'), else_=_full_name(buyer))
+        invited_name = _full_name(invited)
+        branches.append(
+            _unified_purchase_select(
+                models.SharedGiftInvitation.id,
+                literal('shared', String),
+                case((invited_name != '', buyer_name + ' + ' + invited_name), else_=buyer_name),
+                models.SharedGiftInvitation.buyer_id,
+                func.coalesce(item.name, '—'),
+                models.SharedGiftInvitation.item_id,
+                func.coalesce(item.price, 0),
+                models.SharedGiftInvitation.status,
+                func.coalesce(models.SharedGiftInvitation.created_at, now_utc),
+                no_text,
+                no_text,
+                buyer.phone_number,
+                buyer.first_name,
+                buyer.last_name,
+                buyer.position,
+                buyer.email,
+                buyer.username,
             )
+            .outerjoin(buyer, models.SharedGiftInvitation.buyer_id == buyer.id)
+            .outerjoin(invited, models.SharedGiftInvitation.invited_user_id == invited.id)
+            .outerjoin(item, models.SharedGiftInvitation.item_id == item.id)
         )
-        rows = (await db.execute(q)).scalars().all()
-        for sg in rows:
-            buyer = sg.buyer
-            buyer_name = f"{buyer.first_name or ''} {buyer.last_name or ''}".strip() if buyer else "—"
-            invited_name = f"{sg.invited_user.first_name or ''} {sg.invited_user.last_name or ''}".strip() if sg.invited_user else ""
-            result_items.append(schemas.UnifiedPurchaseResponse(
-                id=sg.id,
-                purchase_type='shared',
-                user_name=f"{buyer_name} + {invited_name}" if invited_name else buyer_name,
-                user_id=sg.buyer_id,
-                item_name=sg.item.name if sg.item else "—",
-                item_id=sg.item_id,
-                amount=sg.item.price if sg.item else 0,
-                status=sg.status,
-                created_at=sg.created_at or datetime.utcnow(),
-                phone_number=buyer.phone_number if buyer else None,
-                first_name=buyer.first_name if buyer else None,
-                last_name=buyer.last_name if buyer else None,
-                position=buyer.position if buyer else None,
-                email=buyer.email if buyer else None,
-                telegram_username=buyer.username if buyer else None,
-            ))
-
-    # --- Status filter ---
-    if status_filter:
-        result_items = [i for i in result_items if i.status == status_filter]
-
-    # --- Sort by date ---
-    result_items.sort(key=lambda x: x.created_at, reverse=True)
-    total = len(result_items)
-
-    # --- Paginate ---
-    offset = (page - 1) * per_page
-    page_items = result_items[offset:offset + per_page]
-
-    return page_items, total
-
-
-def _format_dt_moscow(dt: Optional[datetime], tz: ZoneInfo) -> Optional[str]:
-    """Форматирует aware-datetime в локальное время Москвы."""
-    if dt is None:
-        return None
-    return dt.astimezone(tz).strftime("%Y-%m-%d %H:%M")
-
-
-def _write_dict_rows_on_sheet(ws: Worksheet, rows: list[dict[str, object]]) -> None:
-    """Записывает заголовки и строки из списка словарей на существующий лист."""
-    if not rows:
-        return
-    headers = list(rows[0].keys())
-    ws.append(headers)
-    for row in rows:
-        ws.append([row.get(h) for h in headers])
-
-
-def _append_dict_rows_sheet(workbook: Workbook, title: str, rows: list[dict[str, object]]) -> None:
-    """Создаёт лист и пишет таблицу из списка словарей (ключи первой строки — заголовки)."""
-    ws = workbook.create_sheet(title)
-    _write_dict_rows_on_sheet(ws, rows)
+
+    return branches
+
+
+async def _get_all_purchases_from_db(
+    db: AsyncSession,
+    purchase_type: Optional[str],
+    status_filter: Optional[str],
+    page: int,
+    per_page: int,
+) -> tuple[list[schemas.UnifiedPurchaseResponse], int]:
+    """Все виды покупок одним UNION ALL: фильтры, сортировка, страница и total — в Postgres."""
+    branches = _unified_purchase_branches(purchase_type)
+    if not branches:
+        return [], 0
+    purchases = union_all(*branches).subquery("unified_purchases")
+    filters = [purchases.c.status == status_filter] if status_filter else []
+
+    total = (await db.execute(select(func.count()).select_from(purchases).where(*filters))).scalar_one()
+
+    rows = (await db.execute(
+        select(purchases)
+        .where(*filters)
+        .order_by(purchases.c.created_at.desc(), purchases.c.id.desc())
+        .limit(per_page)
+        .offset((page - 1) * per_page)
+    )).all()
+
+    return [schemas.UnifiedPurchaseResponse(**row._mapping) for row in rows], total
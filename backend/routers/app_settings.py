@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 
 import app_settings_crud
@@ -6,14 +6,19 @@ import schemas
 from database import get_db
 from dependencies import get_current_admin_user
 from models import User
+from response_cache import response_cache
 
 router = APIRouter(prefix="/app-settings", tags=["app-settings"])
 
 
 @router.get("/", response_model=schemas.AppSettingsResponse)
-async def get_app_settings_route(db: AsyncSession = Depends(get_db)):
-    row = await app_settings_crud.get_app_settings(db)
-    return app_settings_crud.app_settings_to_response(row)
+async def get_app_settings_route(request: Request, db: AsyncSession = Depends(get_db)):
+    async def load():
+        row = await app_settings_crud.get_app_settings(db)
+        return app_settings_crud.app_settings_to_response(row)
+
+    cached = await response_cache.get_or_load("app_settings", load, schemas.AppSettingsResponse)
+    return cached.to_response(request)
 
 
 @router.put("/", response_model=schemas.AppSettingsResponse)
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
@@ -7,12 +7,16 @@ import schemas
 from database import get_db
 from dependencies import get_current_admin_user
 from models import User
+from response_cache import response_cache
 
 router = APIRouter()
 
 @router.get("/banners", response_model=List[schemas.BannerResponse])
-async def get_active_banners_route(db: AsyncSession = Depends(get_db)):
-    return await crud.get_active_banners(db)
+async def get_active_banners_route(request: Request, db: AsyncSession = Depends(get_db)):
+    cached = await response_cache.get_or_load(
+        "banners", lambda: crud.get_active_banners(db), List[schemas.BannerResponse]
+    )
+    return cached.to_response(request)
 
 @router.get("/admin/banners", response_model=List[schemas.BannerResponse])
 async def get_all_banners_route(
@@ -1,8 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException
 from typing import Optional, Any
 from pydantic import BaseModel
-from dependencies import get_current_user
-import models
+from dependencies import get_current_identity
+from identity_cache import UserIdentity
 from redis_cache import redis_cache
 import logging
 
@@ -11,7 +11,7 @@ logger = logging.getLogger(__name__)
 router = APIRouter(
     prefix="/cache",
     tags=["cache"],
-    dependencies=[Depends(get_current_user)]
+    dependencies=[Depends(get_current_identity)]
 )
 
 class CacheGetResponse(BaseModel):
@@ -30,7 +30,7 @@ class CacheDeleteRequest(BaseModel):
 @router.get("/{key}", response_model=CacheGetResponse)
 async def get_cache(
     key: str,
-    current_user: models.User = Depends(get_current_user)
+    current_user: UserIdentity = Depends(get_current_identity)
 ):
     if not current_user.telegram_id or current_user.telegram_id < 0:
         raise HTTPException(status_code=400, detail="Telegram ID не доступен")
@@ -52,7 +52,7 @@ async def get_cache(
 async def set_cache(
     key: str,
     request: CacheSetRequest,
-    current_user: models.User = Depends(get_current_user)
+    current_user: UserIdentity = Depends(get_current_identity)
 ):
     if not current_user.telegram_id or current_user.telegram_id < 0:
         raise HTTPException(status_code=400, detail="Telegram ID не доступен")
@@ -72,7 +72,7 @@ async def set_cache(
 @router.delete("/{key}", status_code=200)
 async def delete_cache(
     key: str,
-    current_user: models.User = Depends(get_current_user)
+    current_user: UserIdentity = Depends(get_current_identity)
 ):
     if not current_user.telegram_id or current_user.telegram_id < 0:
         raise HTTPException(status_code=400, detail="Telegram ID не доступен")
@@ -86,7 +86,7 @@ async def delete_cache(
 
 @router.delete("/", status_code=200)
 async def clear_all_cache(
-    current_user: models.User = Depends(get_current_user)
+    current_user: UserIdentity = Depends(get_current_identity)
 ):
     if not current_user.telegram_id or current_user.telegram_id < 0:
         raise HTTPException(status_code=400, detail="Telegram ID не доступен")
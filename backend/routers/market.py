@@ -1,15 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List 
+from typing import List, Optional
 import crud
 import schemas
 from database import get_db
+from response_cache import response_cache
 
 router = APIRouter()
 
 @router.get("/market/items", response_model=list[schemas.MarketItemResponse])
-async def list_items(db: AsyncSession = Depends(get_db)):
-    return await crud.get_active_items(db)
+async def list_items(http_request: Request, db: AsyncSession = Depends(get_db)):
+    cached = await response_cache.get_or_load(
+        "market", lambda: crud.get_active_items(db), list[schemas.MarketItemResponse]
+    )
+    return cached.to_response(http_request)
 
 @router.post("/market/purchase", response_model=schemas.PurchaseResponse)
 async def purchase_item(
@@ -48,14 +52,18 @@ async def purchase_local_item(
         )
 
 @router.get("/market/statix-bonus", response_model=schemas.StatixBonusItemResponse)
-async def get_statix_bonus_item(db: AsyncSession = Depends(get_db)):
-    item = await crud.get_statix_bonus_item(db)
-    if not item:
+async def get_statix_bonus_item(http_request: Request, db: AsyncSession = Depends(get_db)):
+    cached = await response_cache.get_or_load(
+        "statix_bonus",
+        lambda: crud.get_statix_bonus_item(db),
+        Optional[schemas.StatixBonusItemResponse],
+    )
+    if cached is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Statix Bonus товар не настроен"
         )
-    return item
+    return cached.to_response(http_request)
 
 @router.post("/market/statix-bonus/purchase", response_model=schemas.StatixBonusPurchaseResponse)
 async def purchase_statix_bonus(
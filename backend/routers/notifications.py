@@ -6,7 +6,8 @@ from typing import Optional
 import models
 import schemas
 from database import get_db
-from dependencies import get_current_user
+from dependencies import get_current_identity
+from identity_cache import UserIdentity
 
 router = APIRouter(
     prefix="/notifications",
@@ -19,7 +20,7 @@ async def list_notifications(
     type: Optional[str] = Query(None, description="Filter by type: purchase, profile, system, transfer, shared_gift"),
     page: int = Query(1, ge=1),
     per_page: int = Query(50, ge=1, le=100),
-    user: models.User = Depends(get_current_user),
+    user: UserIdentity = Depends(get_current_identity),
     db: AsyncSession = Depends(get_db),
 ) -> schemas.NotificationListResponse:
     """Возвращает список уведомлений текущего пользователя."""
@@ -57,7 +58,7 @@ async def list_notifications(
 
 @router.get("/unread-count")
 async def get_unread_count(
-    user: models.User = Depends(get_current_user),
+    user: UserIdentity = Depends(get_current_identity),
     db: AsyncSession = Depends(get_db),
 ) -> dict:
     """Возвращает количество непрочитанных уведомлений."""
@@ -73,7 +74,7 @@ async def get_unread_count(
 @router.put("/{notification_id}/read")
 async def mark_as_read(
     notification_id: int,
-    user: models.User = Depends(get_current_user),
+    user: UserIdentity = Depends(get_current_identity),
     db: AsyncSession = Depends(get_db),
 ) -> dict:
     """Помечает уведомление как прочитанное."""
@@ -87,7 +88,7 @@ async def mark_as_read(
 
 @router.put("/read-all")
 async def mark_all_as_read(
-    user: models.User = Depends(get_current_user),
+    user: UserIdentity = Depends(get_current_identity),
     db: AsyncSession = Depends(get_db),
 ) -> dict:
     """Помечает все уведомления пользователя как прочитанные."""
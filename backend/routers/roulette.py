@@ -1,14 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-import crud, schemas, models
+import crud, schemas
 from database import get_db
-from dependencies import get_current_user
+from dependencies import get_current_identity
+from identity_cache import UserIdentity
 
 router = APIRouter(prefix="/roulette", tags=["roulette"])
 
 @router.post("/assemble", response_model=schemas.UserResponse)
-async def assemble_tickets_route(user: models.User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+async def assemble_tickets_route(user: UserIdentity = Depends(get_current_identity), db: AsyncSession = Depends(get_db)):
     try:
         updated_user = await crud.assemble_tickets(db, user.id)
         return updated_user
@@ -16,7 +17,7 @@ async def assemble_tickets_route(user: models.User = Depends(get_current_user),
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 @router.post("/spin", response_model=schemas.SpinResponse)
-async def spin_roulette_route(user: models.User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+async def spin_roulette_route(user: UserIdentity = Depends(get_current_identity), db: AsyncSession = Depends(get_db)):
     try:
         result = await crud.spin_roulette(db, user.id)
         return result
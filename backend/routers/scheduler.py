@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Header
 from sqlalchemy.ext.asyncio import AsyncSession
 import crud
+import outbox
 from database import get_db, settings
 
 router = APIRouter()
@@ -13,7 +14,7 @@ async def verify_cron_secret(x_cron_secret: str = Header(...)):
 async def run_daily_tasks(db: AsyncSession = Depends(get_db)):
     birthdays_processed = await crud.process_birthday_bonuses(db)
     await crud.reset_tickets(db)
-    await crud.reset_daily_transfer_limits(db)
+    await outbox.purge_sent(db)
     return {"status": "ok", "birthdays_processed": birthdays_processed}
 
 @router.post("/run-monthly-tasks")
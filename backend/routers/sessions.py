@@ -3,19 +3,19 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 import crud
 import schemas
-import models
 from database import get_db
-from dependencies import get_current_user
+from dependencies import get_current_identity
+from identity_cache import UserIdentity
 
 router = APIRouter(
     prefix="/sessions",
     tags=["sessions"],
-    dependencies=[Depends(get_current_user)]
+    dependencies=[Depends(get_current_identity)]
 )
 
 @router.post("/start", response_model=schemas.SessionResponse)
 async def start_session(
-    current_user: models.User = Depends(get_current_user),
+    current_user: UserIdentity = Depends(get_current_identity),
     db: AsyncSession = Depends(get_db)
 ):
     new_session = await crud.start_user_session(db=db, user_id=current_user.id)
@@ -7,7 +7,14 @@ from fastapi import APIRouter, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 
 import crud
-from bot import answer_callback_query, escape_html, send_telegram_message
+from bot import (
+    FILE_DOWNLOAD_URL,
+    GET_FILE_URL,
+    answer_callback_query,
+    escape_html,
+    get_telegram_client,
+    send_telegram_message,
+)
 from database import AsyncSessionLocal, settings
 
 logger = logging.getLogger(__name__)
@@ -143,61 +150,61 @@ async def _dispatch_telegram_webhook_body(
                 file_id = document["file_id"]
                 print(f"Processing pkpass file for user {user.id}, file_id: {file_id}")
 
+                # Файлы могут быть крупными — таймаут длиннее, чем у обычных вызовов Bot API
                 timeout = httpx.Timeout(60.0, read=30.0)
-                async with httpx.AsyncClient(timeout=timeout) as client:
-                    file_path_res = await client.get(
-                        f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/getFile?file_id={file_id}"
+                client = get_telegram_client()
+                file_path_res = await client.get(
+                    GET_FILE_URL, params={"file_id": file_id}, timeout=timeout
+                )
+                file_path_res.raise_for_status()
+                file_path_data = file_path_res.json()
+
+                if not file_path_data.get("ok") or "result" not in file_path_data:
+                    print(f"Failed to get file path: {file_path_data}")
+                    await safe_send_message(
+                        user.telegram_id,
+                        "❌ Ошибка при получении файла. Попробуйте отправить файл еще раз.",
+                    )
+                    return
+
+                file_path = file_path_data["result"]["file_path"]
+                print(f"File path retrieved: {file_path}")
+
+                file_res = await client.get(f"{FILE_DOWNLOAD_URL}{file_path}", timeout=timeout)
+                file_res.raise_for_status()
+                file_content = file_res.content
+
+                if not file_content or len(file_content) == 0:
+                    print("Empty file content received")
+                    await safe_send_message(
+                        user.telegram_id,
+                        "❌ Файл пустой. Попробуйте отправить файл еще раз.",
+                    )
+                    return
+
+                print(f"File downloaded, size: {len(file_content)} bytes")
+
+                result = await crud.process_pkpass_file(db, user.id, file_content)
+                if result:
+                    print(f"Pkpass file processed successfully for user {user.id}")
+                    await safe_send_message(
+                        user.telegram_id,
+                        "✅ Ваша бонусная карта успешно добавлена в профиль!",
+                    )
+                    await crud._create_notification(
+                        db,
+                        user.id,
+                        "system",
+                        "Бонусная карта добавлена",
+                        "Ваша бонусная карта успешно добавлена в профиль.",
+                    )
+                    await db.commit()
+                else:
+                    print(f"Failed to process pkpass file for user {user.id}")
+                    await safe_send_message(
+                        user.telegram_id,
+                        "❌ Ошибка при обработке файла. Убедитесь, что файл .pkpass корректен.",
                     )
-                    file_path_res.raise_for_status()
-                    file_path_data = file_path_res.json()
-
-                    if not file_path_data.get("ok") or "result" not in file_path_data:
-                        print(f"Failed to get file path: {file_path_data}")
-                        await safe_send_message(
-                            user.telegram_id,
-                            "❌ Ошибка при получении файла. Попробуйте отправить файл еще раз.",
-                        )
-                        return
-
-                    file_path = file_path_data["result"]["file_path"]
-                    print(f"File path retrieved: {file_path}")
-
-                    file_url = f"https://api.telegram.org/file/bot{settings.TELEGRAM_BOT_TOKEN}/{file_path}"
-                    file_res = await client.get(file_url)
-                    file_res.raise_for_status()
-                    file_content = file_res.content
-
-                    if not file_content or len(file_content) == 0:
-                        print("Empty file content received")
-                        await safe_send_message(
-                            user.telegram_id,
-                            "❌ Файл пустой. Попробуйте отправить файл еще раз.",
-                        )
-                        return
-
-                    print(f"File downloaded, size: {len(file_content)} bytes")
-
-                    result = await crud.process_pkpass_file(db, user.id, file_content)
-                    if result:
-                        print(f"Pkpass file processed successfully for user {user.id}")
-                        await safe_send_message(
-                            user.telegram_id,
-                            "✅ Ваша бонусная карта успешно добавлена в профиль!",
-                        )
-                        await crud._create_notification(
-                            db,
-                            user.id,
-                            "system",
-                            "Бонусная карта добавлена",
-                            "Ваша бонусная карта успешно добавлена в профиль.",
-                        )
-                        await db.commit()
-                    else:
-                        print(f"Failed to process pkpass file for user {user.id}")
-                        await safe_send_message(
-                            user.telegram_id,
-                            "❌ Ошибка при обработке файла. Убедитесь, что файл .pkpass корректен.",
-                        )
 
             except httpx.ReadTimeout as e:
                 print(f"Read timeout while processing pkpass file: {e}")
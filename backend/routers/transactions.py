@@ -1,14 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Literal
+from typing import Literal, Optional
 import crud
 import schemas
 from database import get_db
-from dependencies import get_current_user
-import models
+from dependencies import get_current_identity
+from identity_cache import UserIdentity
+from response_cache import response_cache
 
 router = APIRouter()
 
+# Курсор следующей страницы отдаётся заголовком: тело ответа остаётся списком для старых клиентов
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
 @router.post("/points/transfer", response_model=schemas.UserResponse)
 async def create_new_transaction(tr: schemas.TransferRequest, db: AsyncSession = Depends(get_db)):
     try:
@@ -19,32 +23,57 @@ async def create_new_transaction(tr: schemas.TransferRequest, db: AsyncSession =
 
 @router.get("/transactions/feed", response_model=list[schemas.FeedItem])
 async def get_feed(
+    request: Request,
     days: int = 7,
-    limit: int = 200,
-    db: AsyncSession = Depends(get_db)
+    limit: int = Query(200, ge=1, le=200),
+    cursor: Optional[str] = None,
 ):
     """
     Получает ленту транзакций.
     Параметры:
     - days: количество дней для выборки (по умолчанию 7)
     - limit: максимальное количество записей (по умолчанию 200)
+    - cursor: курсор следующей страницы из заголовка X-Next-Cursor
     """
-    return await crud.get_feed(db, days=days, limit=limit)
+    def cursor_header(items: list) -> dict[str, str]:
+        next_cursor = crud.next_transaction_cursor(items, limit)
+        return {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+
+    try:
+        cached = await response_cache.get_or_refresh(
+            "feed",
+            lambda db: crud.get_feed(db, days=days, limit=limit, cursor=cursor),
+            list[schemas.FeedItem],
+            response_headers=cursor_header,
+            days=days,
+            limit=limit,
+            cursor=cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return cached.to_response(request)
 
 @router.get("/leaderboard/", response_model=list[schemas.LeaderboardItem])
 async def get_leaderboard(
+    request: Request,
     period: Literal['current_month', 'last_month', 'all_time'] = 'current_month',
     type: Literal['received', 'sent'] = 'received',
-    db: AsyncSession = Depends(get_db)
 ):
-    return await crud.get_leaderboard_data(db, period=period, leaderboard_type=type)
+    cached = await response_cache.get_or_refresh(
+        "leaderboard",
+        lambda db: crud.get_leaderboard_data(db, period=period, leaderboard_type=type),
+        list[schemas.LeaderboardItem],
+        period=period,
+        type=type,
+    )
+    return cached.to_response(request)
 
 
 @router.get("/leaderboard/my-rank", response_model=schemas.MyRankResponse)
 async def get_my_rank(
     period: Literal['current_month', 'last_month', 'all_time'] = 'current_month',
     type: Literal['received', 'sent'] = 'received',
-    user: models.User = Depends(get_current_user),
+    user: UserIdentity = Depends(get_current_identity),
     db: AsyncSession = Depends(get_db)
 ):
     return await crud.get_user_rank(db, user_id=user.id, period=period, leaderboard_type=type)
@@ -1,10 +1,13 @@
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, status, Header
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, UploadFile, status, Header
 from sqlalchemy.ext.asyncio import AsyncSession
 import crud, schemas, models
 from database import get_db
-from dependencies import get_current_user
-from crud import verify_password, get_password_hash
+from dependencies import get_current_identity, get_current_user
+import identity_cache
+from identity_cache import UserIdentity
+from crud import verify_password_async, get_password_hash_async
+from routers.transactions import NEXT_CURSOR_HEADER
 
 router = APIRouter(
     prefix="/users",
@@ -50,6 +53,7 @@ async def login_user(
                 if telegram_photo_url:
                     user.telegram_photo_url = telegram_photo_url
                 await db.commit()
+                await identity_cache.invalidate_user(user.id)
                 await db.refresh(user)
             elif user.telegram_id == tg_id and telegram_photo_url:
                 user.telegram_photo_url = telegram_photo_url
@@ -109,7 +113,7 @@ async def register_user(request: schemas.RegisterRequest, db: AsyncSession = Dep
 
 @router.get("/", response_model=list[schemas.UserResponse])
 async def list_users(
-    user: models.User = Depends(get_current_user),
+    user: UserIdentity = Depends(get_current_identity),
     db: AsyncSession = Depends(get_db),
 ):
     users = await crud.get_users(db)
@@ -122,7 +126,7 @@ async def get_self(user: models.User = Depends(get_current_user)):
 @router.put("/me", response_model=schemas.UserResponse)
 async def update_me(
     user_data: schemas.UserUpdate,
-    user: models.User = Depends(get_current_user),
+    user: UserIdentity = Depends(get_current_identity),
     db: AsyncSession = Depends(get_db)
 ):
     updated = await crud.update_user_profile(db, user_id=user.id, data=user_data)
@@ -146,15 +150,27 @@ async def request_profile_update_route(
 @router.get("/{user_id}/transactions", response_model=list[schemas.FeedItem])
 async def get_user_transactions_route(
     user_id: int,
+    response: Response,
     days: int = 7,
+    limit: int = Query(200, ge=1, le=200),
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db)
 ):
     """
     Получает транзакции пользователя.
     Параметры:
     - days: количество дней для выборки (по умолчанию 7)
+    - limit: размер страницы (по умолчанию 200)
+    - cursor: курсор следующей страницы из заголовка X-Next-Cursor
     """
-    return await crud.get_user_transactions(db, user_id=user_id, days=days)
+    try:
+        items = await crud.get_user_transactions(db, user_id=user_id, days=days, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    next_cursor = crud.next_transaction_cursor(items, limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return items
 
 @router.post("/me/card", response_model=schemas.UserResponse)
 async def upload_card(
@@ -194,7 +210,7 @@ async def upload_card(
 
 @router.delete("/me/card", response_model=schemas.UserResponse)
 async def delete_card(
-    user: models.User = Depends(get_current_user), 
+    user: UserIdentity = Depends(get_current_identity),
     db: AsyncSession = Depends(get_db)
 ):
     u = await crud.delete_user_card(db, user.id)
@@ -204,7 +220,7 @@ async def delete_card(
 async def search_users(
     query: str, 
     db: AsyncSession = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: UserIdentity = Depends(get_current_identity)
 ):
     if not query.strip():
         return []
@@ -214,7 +230,7 @@ async def search_users(
 
 @router.post("/me/complete-onboarding", response_model=schemas.UserResponse)
 async def complete_onboarding_route(
-    user: models.User = Depends(get_current_user),
+    user: UserIdentity = Depends(get_current_identity),
     db: AsyncSession = Depends(get_db)
 ):
     u = await crud.mark_onboarding_as_seen(db, user_id=user.id)
@@ -233,7 +249,7 @@ async def change_password_route(
         )
     
     # Проверяем текущий пароль
-    if not verify_password(password_data.current_password, user.password_hash):
+    if not await verify_password_async(password_data.current_password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Неверный текущий пароль"
@@ -247,7 +263,7 @@ async def change_password_route(
         )
     
     # Устанавливаем новый пароль
-    user.password_hash = get_password_hash(password_data.new_password)
+    user.password_hash = await get_password_hash_async(password_data.new_password)
     await db.commit()
     await db.refresh(user)
     
@@ -36,6 +36,8 @@ class UserResponse(UserBase):
     balance: int
     reserved_balance: int = 0
     daily_transfer_count: int
+    # День счётчика; вчерашний счётчик не сбрасывается в БД, а отдаётся как 0
+    daily_transfer_date: Optional[date] = Field(default=None, exclude=True)
     is_admin: bool
     status: Optional[str] = 'approved' 
     telegram_photo_url: Optional[str] = None
@@ -53,6 +55,13 @@ class UserResponse(UserBase):
     browser_auth_enabled: bool = False
     registration_date: Optional[datetime] = None
 
+    @model_validator(mode='after')
+    def _current_day_transfer_count(self):
+        # Дата есть только при чтении из ORM; в сериализованный ответ она не попадает
+        if self.daily_transfer_date is not None and self.daily_transfer_date != date.today():
+            self.daily_transfer_count = 0
+        return self
+
     @field_serializer('date_of_birth')
     def serialize_date(self, dob: Optional[date], _info):
         if dob is None:
@@ -514,13 +523,42 @@ class BroadcastEmailFailedItem(BaseModel):
     target: str
     detail: str
 
-class BroadcastEmailResponse(BaseModel):
+class BroadcastJobResponse(BaseModel):
+    """Фоновая рассылка: прогресс по каналам и первые ошибки доставки."""
+
+    job_id: int
+    status: Literal["queued", "running", "completed"]
     message: str
     recipient_count_email: int = 0
     recipient_count_telegram: int = 0
     sent_ok_email: int = 0
     sent_ok_telegram: int = 0
+    failed_count: int = 0
+    pending_count: int = 0
     failed: List[BroadcastEmailFailedItem] = []
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class ReportJobRequest(BaseModel):
+    report: Literal["consolidated"] = "consolidated"
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+
+class ReportJobResponse(BaseModel):
+    """Фоновая выгрузка отчёта; ``download_url`` отдаёт файл, когда ``status`` = completed."""
+
+    job_id: int
+    report: str
+    status: Literal["queued", "running", "completed", "failed"]
+    start_date: date
+    end_date: date
+    filename: str
+    download_url: str
+    size_bytes: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
 
 class BroadcastEmailPreviewResponse(BaseModel):
     recipient_count_email: int
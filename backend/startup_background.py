@@ -13,7 +13,8 @@ from pathlib import Path
 from sqlalchemy import select, text
 
 from config import settings
-from database import Base, engine
+from database import AsyncSessionLocal, Base, engine
+from leaderboard_engine import leaderboard_engine
 from redis_cache import redis_cache
 
 logger = logging.getLogger(__name__)
@@ -206,4 +207,10 @@ async def run_background_startup() -> None:
             "⚠️ Не удалось подключиться к Redis: %s. Кеширование будет недоступно.",
             e,
         )
+    else:
+        try:
+            async with AsyncSessionLocal() as db:
+                await leaderboard_engine.rebuild(db)
+        except Exception as e:
+            logger.warning("⚠️ Не удалось пересобрать рейтинг в Redis: %s. Рейтинг читается из БД.", e)
     logger.success("Сервис готов к работе (БД, миграции; Redis по настройкам).")
@@ -0,0 +1,233 @@
+"""Дневные агрегаты админской статистики.
+
+``daily_user_activity`` (отправлено/получено пользователем за день) и
+``daily_item_sales`` (покупки товара за день) пополняются в той же транзакции
+БД, что и перевод или покупка: их строки разные у разных пользователей и
+товаров. ``daily_activity`` (переводы по дню и часу по Москве) — одна строка на
+час для всех, и инкремент в транзакции перевода выстроил бы все переводы в
+очередь за её блокировкой. Поэтому её пересчитывает из ``transactions`` фоновый
+``daily_activity_refresher`` раз в ``STATISTICS_REFRESH_INTERVAL_SECONDS``
+(последние дни целиком), и почасовой график отстаёт на этот интервал.
+Статистика за период читает несколько сотен строк агрегатов вместо
+``AT TIME ZONE`` и ``GROUP BY`` по сырым ``transactions`` / ``purchases``.
+
+День — календарная дата UTC, как и границы периодов в ``crud._prepare_dates``.
+Переводы и покупки не удаляются и не меняются, поэтому агрегаты только растут;
+пересборка и сверка — ``rebuild_statistics_rollups.py``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+from config import settings
+from database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# daily_activity за дни начиная с :since — пересчёт хвоста в daily_activity_refresher
+_DAILY_ACTIVITY_SINCE_SQL = """
+    SELECT timestamp::date AS day,
+           EXTRACT(HOUR FROM (timestamp AT TIME ZONE 'UTC') AT TIME ZONE 'Europe/Moscow')::int AS hour_msk,
+           COUNT(*) AS tx_count
+    FROM transactions
+    WHERE timestamp >= :since
+    GROUP BY 1, 2
+"""
+
+# (таблица, ключ, значения, тот же агрегат напрямую из сырых таблиц)
+_ROLLUPS = (
+    (
+        "daily_activity",
+        ("day", "hour_msk"),
+        ("tx_count",),
+        """
+        SELECT timestamp::date AS day,
+               EXTRACT(HOUR FROM (timestamp AT TIME ZONE 'UTC') AT TIME ZONE 'Europe/Moscow')::int AS hour_msk,
+               COUNT(*) AS tx_count
+        FROM transactions
+        WHERE timestamp IS NOT NULL
+        GROUP BY 1, 2
+        """,
+    ),
+    (
+        "daily_user_activity",
+        ("day", "user_id"),
+        ("sent_count", "received_count"),
+        """
+        SELECT day, user_id, SUM(sent_count) AS sent_count, SUM(received_count) AS received_count
+        FROM (
+            SELECT timestamp::date AS day, sender_id AS user_id, 1 AS sent_count, 0 AS received_count
+            FROM transactions
+            WHERE timestamp IS NOT NULL
+            UNION ALL
+            SELECT timestamp::date AS day, receiver_id AS user_id, 0 AS sent_count, 1 AS received_count
+            FROM transactions
+            WHERE timestamp IS NOT NULL
+        ) AS t
+        GROUP BY day, user_id
+        """,
+    ),
+    (
+        "daily_item_sales",
+        ("day", "item_id"),
+        ("purchase_count",),
+        """
+        SELECT timestamp::date AS day, item_id, COUNT(*) AS purchase_count
+        FROM purchases
+        WHERE timestamp IS NOT NULL
+        GROUP BY 1, 2
+        """,
+    ),
+)
+
+
+def day_range(start_date: date, end_date_inclusive: date) -> tuple[date, date]:
+    """Границы ``crud._prepare_dates`` (конец — полночь следующего дня) → первый и последний день."""
+    return start_date, end_date_inclusive - timedelta(days=1)
+
+
+async def _increment(db: AsyncSession, model, keys: tuple[str, ...], rows: list[dict]) -> None:
+    table = model.__table__
+    stmt = pg_insert(table).values(rows)
+    values = [column for column in rows[0] if column not in keys]
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c[key] for key in keys],
+        set_={column: table.c[column] + stmt.excluded[column] for column in values},
+    )
+    await db.execute(stmt)
+
+
+async def record_transfer(db: AsyncSession, sender_id: int, receiver_id: int, timestamp: datetime) -> None:
+    """Добавляет перевод в дневные агрегаты. Коммит — на стороне вызывающего кода."""
+    # daily_activity здесь не трогаем — её досчитывает daily_activity_refresher
+    day = timestamp.date()
+    if sender_id == receiver_id:
+        rows = [{"day": day, "user_id": sender_id, "sent_count": 1, "received_count": 1}]
+    else:
+        # Строки в порядке user_id: встречные переводы блокируют их в одном порядке
+        rows = sorted(
+            [
+                {"day": day, "user_id": sender_id, "sent_count": 1, "received_count": 0},
+                {"day": day, "user_id": receiver_id, "sent_count": 0, "received_count": 1},
+            ],
+            key=lambda row: row["user_id"],
+        )
+    await _increment(db, models.DailyUserActivity, ("day", "user_id"), rows)
+
+
+async def record_purchase(db: AsyncSession, item_id: int, timestamp: datetime) -> None:
+    """Добавляет покупку в дневные агрегаты. Коммит — на стороне вызывающего кода."""
+    await _increment(
+        db, models.DailyItemSales, ("day", "item_id"),
+        [{"day": timestamp.date(), "item_id": item_id, "purchase_count": 1}],
+    )
+
+
+async def refresh_daily_activity(db: AsyncSession) -> int:
+    """Пересчитывает ``daily_activity`` с последнего дня в агрегате (минус день запаса) по сегодня.
+
+    Строки дней заменяются целиком, поэтому пересчёт идемпотентен и не теряет
+    переводы, закоммиченные позже соседних. День запаса покрывает переводы около
+    полуночи UTC, закоммиченные уже после прошлого пересчёта. Пустой агрегат
+    считается с начала истории.
+    """
+    await db.execute(text("LOCK TABLE daily_activity IN EXCLUSIVE MODE"))
+    last_day = (await db.execute(select(func.max(models.DailyActivity.day)))).scalar()
+    since = last_day - timedelta(days=1) if last_day else date(1970, 1, 1)
+    await db.execute(text("DELETE FROM daily_activity WHERE day >= :since"), {"since": since})
+    result = await db.execute(
+        text(f"INSERT INTO daily_activity (day, hour_msk, tx_count) {_DAILY_ACTIVITY_SINCE_SQL}"),
+        {"since": datetime.combine(since, datetime.min.time())},
+    )
+    await db.commit()
+    return result.rowcount
+
+
+class DailyActivityRefresher:
+    """Периодический ``refresh_daily_activity``; несколько процессов разводит блокировка таблицы."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is not None and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run(), name="daily-activity-refresher")
+        logger.info("Пересчёт почасовой активности запущен")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                async with AsyncSessionLocal() as db:
+                    await refresh_daily_activity(db)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Пересчёт daily_activity не удался")
+            await asyncio.sleep(self.interval)
+
+
+async def rebuild_statistics_rollups(db: AsyncSession) -> dict[str, int]:
+    """Пересобирает все дневные агрегаты из сырых таблиц. Возвращает число строк по таблицам."""
+    counts = {}
+    for table, keys, values, raw_sql in _ROLLUPS:
+        columns = ", ".join(keys + values)
+        await db.execute(text(f"LOCK TABLE {table} IN EXCLUSIVE MODE"))
+        await db.execute(text(f"DELETE FROM {table}"))
+        result = await db.execute(text(f"INSERT INTO {table} ({columns}) {raw_sql}"))
+        counts[table] = result.rowcount
+    await db.commit()
+    logger.info("Дневные агрегаты статистики пересобраны: %s", counts)
+    return counts
+
+
+async def find_statistics_rollups_mismatches(db: AsyncSession, limit: int = 100) -> list[dict]:
+    """Сверяет агрегаты с сырыми таблицами; возвращает расхождения (пусто — всё согласовано)."""
+    mismatches = []
+    for table, keys, values, raw_sql in _ROLLUPS:
+        key_columns = ", ".join(f"COALESCE(raw.{key}, agg.{key}) AS {key}" for key in keys)
+        value_columns = ", ".join(
+            f"COALESCE(raw.{value}, 0) AS expected_{value}, COALESCE(agg.{value}, 0) AS actual_{value}"
+            for value in values
+        )
+        join_on = " AND ".join(f"agg.{key} = raw.{key}" for key in keys)
+        differs = " OR ".join(f"COALESCE(raw.{value}, 0) <> COALESCE(agg.{value}, 0)" for value in values)
+        result = await db.execute(
+            text(
+                f"""
+                WITH raw AS ({raw_sql})
+                SELECT {key_columns}, {value_columns}
+                FROM raw
+                FULL OUTER JOIN {table} agg ON {join_on}
+                WHERE {differs}
+                ORDER BY {", ".join(keys)}
+                LIMIT :limit
+                """
+            ),
+            {"limit": limit},
+        )
+        mismatches.extend({"table": table, **row._mapping} for row in result.all())
+    return mismatches
+
+
+daily_activity_refresher = DailyActivityRefresher(interval=settings.STATISTICS_REFRESH_INTERVAL_SECONDS)
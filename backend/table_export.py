@@ -0,0 +1,145 @@
+"""Потоковые выгрузки админки в XLSX и CSV с постоянным расходом памяти.
+
+Строки читаются из БД серверным курсором (``stream_scalars`` + ``yield_per``)
+пачками по ``EXPORT_BATCH_ROWS``, ORM-объекты пачки сразу превращаются в
+списки значений и отпускаются.
+
+XLSX собирается openpyxl в режиме ``write_only``: ``append`` пишет строку во
+временный файл листа, в памяти её не остаётся. Запись пачек и упаковка zip
+(``save``) идут в потоке через ``asyncio.to_thread``, event loop не
+блокируется. Готовая книга лежит во временном файле и отдаётся клиенту
+кусками по ``_CHUNK_SIZE``, после чего файл удаляется.
+
+CSV пишется прямо в ответ по мере чтения курсора (``csv_response``); сессию БД
+такой ответ открывает сам — к началу отправки тела сессия эндпоинта может
+быть уже закрыта.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import csv
+import io
+import tempfile
+from collections.abc import AsyncIterator, Awaitable, Callable, Sequence
+from datetime import datetime
+from typing import IO, Any, Optional
+from zoneinfo import ZoneInfo
+
+from fastapi.responses import StreamingResponse
+from openpyxl import Workbook
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_MEDIA_TYPE = "text/csv; charset=utf-8"
+MOSCOW_TZ = ZoneInfo("Europe/Moscow")
+
+# Строк из курсора БД за одну выборку и за один переход в поток openpyxl
+EXPORT_BATCH_ROWS = 1000
+# Размер куска тела ответа
+_CHUNK_SIZE = 64 * 1024
+
+Row = Sequence[Any]
+
+
+async def scalar_batches(
+    db: AsyncSession,
+    query: Select,
+    to_row: Callable[[Any], Row],
+    batch_size: int = EXPORT_BATCH_ROWS,
+) -> AsyncIterator[list[Row]]:
+    """Читает ``query`` серверным курсором и отдаёт пачки строк таблицы."""
+    result = await db.stream_scalars(query.execution_options(yield_per=batch_size))
+    async for partition in result.partitions():
+        # identity map сессии держит объекты по слабым ссылкам — после пачки они освобождаются
+        yield [to_row(obj) for obj in partition]
+
+
+class XlsxExport:
+    """Книга ``write_only``: листы пишутся по мере поступления строк, сборка — в потоке."""
+
+    def __init__(self, on_progress: Optional[Callable[[], Awaitable[None]]] = None):
+        self._workbook = Workbook(write_only=True)
+        # Вызывается после каждой записанной пачки (например, продление аренды задания)
+        self._on_progress = on_progress
+
+    async def add_sheet(self, title: str, headers: Row, rows: Sequence[Row] = ()):
+        """Новый лист с заголовком; ``rows`` — небольшие таблицы, которые уже в памяти."""
+        sheet = self._workbook.create_sheet(title)
+        await self.append_rows(sheet, [headers, *rows])
+        return sheet
+
+    async def append_rows(self, sheet, rows: Sequence[Row]) -> None:
+        await asyncio.to_thread(_append_rows, sheet, rows)
+        if self._on_progress is not None:
+            await self._on_progress()
+
+    async def save(self) -> IO[bytes]:
+        """Упаковывает книгу во временный файл (позиция — в начале); закрывает вызывающий код."""
+        file = tempfile.TemporaryFile()
+        try:
+            await asyncio.to_thread(self._save, file)
+        except BaseException:
+            file.close()
+            raise
+        return file
+
+    async def response(self, filename: str) -> StreamingResponse:
+        """Упаковывает книгу во временный файл и отдаёт его кусками."""
+        file = await self.save()
+        return StreamingResponse(
+            _iter_file(file),
+            media_type=XLSX_MEDIA_TYPE,
+            headers={"Content-Disposition": f"attachment; filename={filename}"},
+        )
+
+    def _save(self, file: IO[bytes]) -> None:
+        self._workbook.save(file)
+        file.seek(0)
+
+
+def format_dt_moscow(dt: Optional[datetime]) -> Optional[str]:
+    """Форматирует aware-datetime в локальное время Москвы."""
+    if dt is None:
+        return None
+    return dt.astimezone(MOSCOW_TZ).strftime("%Y-%m-%d %H:%M")
+
+
+def _append_rows(sheet, rows: Sequence[Row]) -> None:
+    for row in rows:
+        sheet.append(row)
+
+
+async def _iter_file(file: IO[bytes]) -> AsyncIterator[bytes]:
+    try:
+        while chunk := await asyncio.to_thread(file.read, _CHUNK_SIZE):
+            yield chunk
+    finally:
+        file.close()
+
+
+def csv_response(
+    headers: Row,
+    batches: Callable[[], AsyncIterator[list[Row]]],
+    filename: str,
+) -> StreamingResponse:
+    """CSV, который пишется в ответ по мере того, как ``batches()`` отдаёт пачки строк."""
+
+    async def body() -> AsyncIterator[bytes]:
+        # BOM — чтобы Excel открыл кириллицу в UTF-8 без мастера импорта
+        yield "\ufeff".encode() + _csv_lines([headers])
+        async for batch in batches():
+            yield _csv_lines(batch)
+
+    return StreamingResponse(
+        body(),
+        media_type=CSV_MEDIA_TYPE,
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+
+def _csv_lines(rows: Sequence[Row]) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode()
@@ -0,0 +1,221 @@
+"""Исходящая очередь сообщений Telegram с ограничением скорости.
+
+Bot API допускает ~30 сообщений в секунду на бота и ~1 сообщение в секунду в
+один чат; сверх этого приходит 429 с ``retry_after``. Диспетчер держит общий
+token bucket, интервал на чат и ограниченное число воркеров. На 429 вся
+отправка приостанавливается на ``retry_after``, затем сообщение повторяется.
+
+Каждое сообщение получает ``job_id`` и ``future`` с результатом
+``send_telegram_message`` (или исключением после исчерпания попыток)::
+
+    message = await telegram_dispatcher.submit(chat_id, text)
+    await message.future
+
+Массовые отправки (рассылки, выдача учётных данных) ставятся с
+``PRIORITY_BULK``: воркеры берут их, только когда в очереди нет обычных
+сообщений, поэтому уведомления outbox о покупках и переводах не ждут хвост
+большой рассылки (и не переживают аренду outbox, уходя дважды).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Optional
+
+from bot import TelegramRetryAfter, send_telegram_message
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+_QUEUE_MAXSIZE = 10000
+# Приоритеты очереди: меньше — раньше
+PRIORITY_NORMAL = 0
+PRIORITY_BULK = 1
+# Сколько «отработавших» чатов держать в таблице интервалов до чистки
+_CHAT_SLOTS_PRUNE_THRESHOLD = 5000
+
+
+class TokenBucket:
+    """Классический token bucket: ``rate`` токенов в секунду, не больше ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+@dataclass
+class OutboundMessage:
+    """Сообщение в очереди: параметры ``send_telegram_message`` и future с итогом."""
+
+    chat_id: int
+    text: str
+    reply_markup: Optional[dict] = None
+    message_thread_id: Optional[int] = None
+    parse_mode: Optional[str] = 'HTML'
+    job_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    attempts: int = 0
+    future: asyncio.Future = field(default_factory=lambda: asyncio.get_running_loop().create_future())
+
+
+class TelegramDispatcher:
+    """Очередь с глобальным token bucket, интервалом на чат и ограниченной параллельностью."""
+
+    def __init__(
+        self,
+        global_rate: float,
+        per_chat_interval: float,
+        concurrency: int,
+        max_retries: int,
+    ):
+        self.per_chat_interval = per_chat_interval
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self._bucket = TokenBucket(global_rate, capacity=global_rate)
+        self._queue: Optional[asyncio.PriorityQueue[tuple[int, int, OutboundMessage]]] = None
+        # Порядковый номер: внутри одного приоритета — FIFO
+        self._sequence = itertools.count()
+        self._workers: list[asyncio.Task] = []
+        self._chat_next_slot: dict[int, float] = {}
+        self._paused_until = 0.0
+
+    def _ensure_started(self) -> None:
+        """Воркеры поднимаются лениво в текущем event loop (lifespan или скрипт)."""
+        if self._workers and not all(w.done() for w in self._workers):
+            return
+        self._queue = asyncio.PriorityQueue(maxsize=_QUEUE_MAXSIZE)
+        self._workers = [
+            asyncio.create_task(self._worker(i), name=f"telegram-dispatcher-{i}")
+            for i in range(self.concurrency)
+        ]
+        logger.info("Очередь Telegram запущена: %s воркеров", self.concurrency)
+
+    async def start(self) -> None:
+        self._ensure_started()
+
+    async def stop(self) -> None:
+        """Останавливает воркеры; неотправленные сообщения завершаются ошибкой."""
+        for worker in self._workers:
+            worker.cancel()
+        for worker in self._workers:
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+        self._workers = []
+        if self._queue is not None:
+            while not self._queue.empty():
+                _, _, message = self._queue.get_nowait()
+                if not message.future.done():
+                    message.future.set_exception(RuntimeError("Очередь Telegram остановлена"))
+            self._queue = None
+
+    async def submit(
+        self,
+        chat_id: int,
+        text: str,
+        reply_markup: Optional[dict] = None,
+        message_thread_id: Optional[int] = None,
+        parse_mode: Optional[str] = 'HTML',
+        priority: int = PRIORITY_NORMAL,
+    ) -> OutboundMessage:
+        """Ставит сообщение в очередь (ждёт, если очередь заполнена); ``PRIORITY_BULK`` — для массовых отправок."""
+        self._ensure_started()
+        message = OutboundMessage(
+            chat_id=chat_id,
+            text=text,
+            reply_markup=reply_markup,
+            message_thread_id=message_thread_id,
+            parse_mode=parse_mode,
+        )
+        await self._queue.put((priority, next(self._sequence), message))
+        return message
+
+    async def send(self, chat_id: int, text: str, **kwargs):
+        """Поставить в очередь и дождаться результата (как ``send_telegram_message``)."""
+        message = await self.submit(chat_id, text, **kwargs)
+        return await message.future
+
+    def _reserve_chat_slot(self, chat_id: int) -> float:
+        """Резервирует ближайшее разрешённое время отправки в чат; возвращает задержку."""
+        now = time.monotonic()
+        if len(self._chat_next_slot) > _CHAT_SLOTS_PRUNE_THRESHOLD:
+            self._chat_next_slot = {c: t for c, t in self._chat_next_slot.items() if t > now}
+        slot = max(now, self._chat_next_slot.get(chat_id, 0.0))
+        self._chat_next_slot[chat_id] = slot + self.per_chat_interval
+        return slot - now
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            _, _, message = await self._queue.get()
+            try:
+                await self._deliver(message)
+            except asyncio.CancelledError:
+                if not message.future.done():
+                    message.future.set_exception(RuntimeError("Очередь Telegram остановлена"))
+                raise
+            except Exception:
+                logger.exception("Воркер очереди Telegram %s: необработанная ошибка", index)
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, message: OutboundMessage) -> None:
+        while True:
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            delay = self._reserve_chat_slot(message.chat_id)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self._bucket.acquire()
+
+            message.attempts += 1
+            try:
+                result = await send_telegram_message(
+                    message.chat_id,
+                    message.text,
+                    reply_markup=message.reply_markup,
+                    message_thread_id=message.message_thread_id,
+                    parse_mode=message.parse_mode,
+                )
+            except TelegramRetryAfter as e:
+                # 429 — лимит бота целиком: притормаживаем все воркеры, не только этот чат
+                self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+                if message.attempts <= self.max_retries:
+                    logger.warning(
+                        "Telegram 429 для чата %s: пауза %s с, попытка %s/%s",
+                        message.chat_id, e.retry_after, message.attempts, self.max_retries,
+                    )
+                    continue
+                message.future.set_exception(e)
+            except Exception as e:
+                message.future.set_exception(e)
+            else:
+                message.future.set_result(result)
+            return
+
+
+telegram_dispatcher = TelegramDispatcher(
+    global_rate=settings.TELEGRAM_GLOBAL_RATE_PER_SECOND,
+    per_chat_interval=settings.TELEGRAM_PER_CHAT_INTERVAL_SECONDS,
+    concurrency=settings.TELEGRAM_SEND_CONCURRENCY,
+    max_retries=settings.TELEGRAM_SEND_MAX_RETRIES,
+)
@@ -135,7 +135,12 @@ export const requestProfileUpdate = (updateData) =>
 export const updateMe = (updateData) =>
   apiClient.put('/users/me', updateData, getAuthHeaders());
 
-export const getFeed = () => apiClient.get('/transactions/feed');
+// Курсор следующей страницы ленты/истории; null — страница последняя
+export const getNextCursor = (response) => response.headers?.['x-next-cursor'] || null;
+
+// cursor — значение заголовка X-Next-Cursor предыдущей страницы
+export const getFeed = (cursor) =>
+  apiClient.get('/transactions/feed', cursor ? { params: { cursor } } : undefined);
 
 export const getLeaderboard = ({ period, type }) =>
   apiClient.get(`/leaderboard/?period=${period}&type=${type}`, getAuthHeaders());
@@ -162,8 +167,8 @@ export const purchaseLocalItem = (userId, itemId, city, websiteUrl) => {
   });
 };
 
-export const getUserTransactions = (userId) => {
-  return apiClient.get(`/users/${userId}/transactions`);
+export const getUserTransactions = (userId, cursor) => {
+  return apiClient.get(`/users/${userId}/transactions`, cursor ? { params: { cursor } } : undefined);
 };
 
 export const addPointsToAll = (data) =>
@@ -274,6 +279,15 @@ export const getBroadcastEmailPreview = (onlyBrowserUsers) =>
 export const broadcastEmail = (payload) =>
   apiClient.post('/admin/users/broadcast-email', payload, getAuthHeaders());
 
+export const getBroadcastJobs = (limit = 10) =>
+  apiClient.get('/admin/broadcast-jobs', { params: { limit }, ...getAuthHeaders() });
+
+export const getBroadcastJob = (jobId) =>
+  apiClient.get(`/admin/broadcast-jobs/${jobId}`, getAuthHeaders());
+
+export const retryBroadcastJob = (jobId) =>
+  apiClient.post(`/admin/broadcast-jobs/${jobId}/retry`, null, getAuthHeaders());
+
 // --- НОВЫЕ ФУНКЦИИ ДЛЯ СТАТИСТИКИ АДМИН-ПАНЕЛИ ---
 
 // Добавляем startDate и endDate в параметры
@@ -331,18 +345,23 @@ export const exportUserEngagement = () => {
     });
 };
 
-// --- ВЫГРУЗКА СВОДНОГО ОТЧЕТА ---
-export const exportConsolidatedReport = (startDate, endDate) => {
-    // Формируем строку с параметрами дат
-    const params = new URLSearchParams();
-    if (startDate) params.append('start_date', startDate);
-    if (endDate) params.append('end_date', endDate);
+// --- ВЫГРУЗКА СВОДНОГО ОТЧЕТА (фоновое задание, готовый файл переиспользуется) ---
+export const createReportJob = (report, startDate, endDate) =>
+  apiClient.post(
+    '/admin/report-jobs',
+    { report, start_date: startDate || null, end_date: endDate || null },
+    getAuthHeaders(),
+  );
 
-    return apiClient.get(`/admin/statistics/export/consolidated?${params.toString()}`, {
-        ...getAuthHeaders(),
-        responseType: 'blob', // Указываем, что ждем файл
-    });
-};
+export const getReportJob = (jobId) =>
+  apiClient.get(`/admin/report-jobs/${jobId}`, getAuthHeaders());
+
+// downloadUrl — из ответа задания, файл отдаётся, когда status === 'completed'
+export const downloadReportFile = (downloadUrl) =>
+  apiClient.get(downloadUrl, {
+    ...getAuthHeaders(),
+    responseType: 'blob',
+  });
 
 // --- ВЫГРУЗКА ВСЕГО СПИСКА ПОЛЬЗОВАТЕЛЕЙ ---
 export const exportAllUsers = () => {
@@ -1,7 +1,7 @@
 // frontend/src/pages/HistoryPage.jsx
 
 import React, { useState, useEffect } from 'react';
-import { getUserTransactions } from '../api';
+import { getUserTransactions, getNextCursor } from '../api';
 import styles from './HistoryPage.module.css';
 import PageLayout from '../components/PageLayout';
 import { formatToMsk } from '../utils/dateFormatter'; // <-- 1. ИМПОРТИРУЕМ НАШУ ФУНКЦИЮ
@@ -9,6 +9,8 @@ import { formatToMsk } from '../utils/dateFormatter'; // <-- 1. ИМПОРТИР
 function HistoryPage({ user, onBack }) {
     const [transactions, setTransactions] = useState([]);
     const [isLoading, setIsLoading] = useState(true);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [isLoadingMore, setIsLoadingMore] = useState(false);
 
     useEffect(() => {
         if (user) {
@@ -16,6 +18,7 @@ function HistoryPage({ user, onBack }) {
                 try {
                     const response = await getUserTransactions(user.id);
                     setTransactions(response.data);
+                    setNextCursor(getNextCursor(response));
                 } catch (error) {
                     console.error("Failed to fetch transactions", error);
                 } finally {
@@ -26,6 +29,20 @@ function HistoryPage({ user, onBack }) {
         }
     }, [user]);
 
+    // История отдаётся страницами: следующая — по курсору из заголовка X-Next-Cursor
+    const loadMore = async () => {
+        setIsLoadingMore(true);
+        try {
+            const response = await getUserTransactions(user.id, nextCursor);
+            setTransactions(prev => [...prev, ...response.data]);
+            setNextCursor(getNextCursor(response));
+        } catch (error) {
+            console.error("Failed to fetch more transactions", error);
+        } finally {
+            setIsLoadingMore(false);
+        }
+    };
+
     return (
         <PageLayout title="История">
             <button onClick={onBack} className={styles.backButton}>&larr; Назад</button>
@@ -53,6 +70,11 @@ function HistoryPage({ user, onBack }) {
                                 <p className={styles.timestamp}>{formatToMsk(tx.timestamp)}</p>
                             </div>
                         ))}
+                        {nextCursor && (
+                            <button onClick={loadMore} disabled={isLoadingMore} className={styles.loadMoreButton}>
+                                {isLoadingMore ? 'Загрузка...' : 'Показать ещё'}
+                            </button>
+                        )}
                     </div>
                 ) : <p>У вас пока нет транзакций.</p>
             )}
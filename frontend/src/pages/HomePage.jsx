@@ -1,7 +1,7 @@
 // frontend/src/pages/HomePage.jsx
 
 import React, { useState, useEffect, useMemo, useRef } from 'react';
-import { getFeed, getBanners } from '../api';
+import { getFeed, getBanners, getNextCursor } from '../api';
 import styles from './HomePage.module.css';
 import { getCachedData } from '../storage';
 import { formatToMsk, formatFeedDate } from '../utils/dateFormatter';
@@ -10,6 +10,9 @@ import LeaderboardBanner from '../components/LeaderboardBanner';
 import Garland from '../components/Garland';
 import { resolveSeasonAssets } from '../themeAssetDefaults';
 
+// Размер страницы ленты на сервере (limit по умолчанию в /transactions/feed)
+const FEED_PAGE_SIZE = 200;
+
 function HomePage({ user, onNavigate, telegramPhotoUrl, isDesktop, seasonTheme, themeAssets }) {
     const isWinterTheme = seasonTheme === 'winter';
     const seasonKey = isWinterTheme ? 'winter' : 'summer';
@@ -22,6 +25,9 @@ function HomePage({ user, onNavigate, telegramPhotoUrl, isDesktop, seasonTheme,
     const [feed, setFeed] = useState(() => getCachedData('feed'));
     const [banners, setBanners] = useState(() => getCachedData('banners') || []);
     const [isLoading, setIsLoading] = useState(!feed);
+    // undefined — курсор неизвестен (лента из кэша), null — больше страниц нет
+    const [feedCursor, setFeedCursor] = useState(undefined);
+    const [isLoadingMore, setIsLoadingMore] = useState(false);
     const [currentSlide, setCurrentSlide] = useState(0);
     const autoSlideTimerRef = useRef(null);
 
@@ -42,7 +48,10 @@ function HomePage({ user, onNavigate, telegramPhotoUrl, isDesktop, seasonTheme,
             if (!feed) {
                 promises.push(
                     getFeed()
-                        .then(response => setFeed(response.data))
+                        .then(response => {
+                            setFeed(response.data);
+                            setFeedCursor(getNextCursor(response));
+                        })
                         .catch(error => console.error("Failed to fetch feed", error))
                 );
             }
@@ -60,6 +69,33 @@ function HomePage({ user, onNavigate, telegramPhotoUrl, isDesktop, seasonTheme,
         // eslint-disable-next-line react-hooks/exhaustive-deps
     }, []);
 
+    const hasMoreFeed = feedCursor === undefined ? (feed?.length || 0) >= FEED_PAGE_SIZE : Boolean(feedCursor);
+
+    const loadMoreFeed = async () => {
+        setIsLoadingMore(true);
+        try {
+            let loaded = feed || [];
+            let cursor = feedCursor;
+            if (cursor === undefined) {
+                // Лента из кэша без курсора: перечитываем первую страницу, чтобы продолжить без пропусков
+                const firstPage = await getFeed();
+                loaded = firstPage.data;
+                cursor = getNextCursor(firstPage);
+            }
+            if (cursor) {
+                const response = await getFeed(cursor);
+                loaded = [...loaded, ...response.data];
+                cursor = getNextCursor(response);
+            }
+            setFeed(loaded);
+            setFeedCursor(cursor);
+        } catch (error) {
+            console.error("Failed to fetch more feed", error);
+        } finally {
+            setIsLoadingMore(false);
+        }
+    };
+
     const mainBanners = banners.filter(b => b.position === 'main');
 
     // Функции для ручного переключения баннеров
@@ -289,6 +325,11 @@ function HomePage({ user, onNavigate, telegramPhotoUrl, isDesktop, seasonTheme,
                             ) : <p>Лента активности пуста.</p>
                         )}
                     </div>
+                    {!isLoading && hasMoreFeed && (
+                        <button onClick={loadMoreFeed} disabled={isLoadingMore} className={styles.loadMoreButton}>
+                            {isLoadingMore ? 'Загрузка...' : 'Показать ещё'}
+                        </button>
+                    )}
                 </div>
             </div>
         </div>
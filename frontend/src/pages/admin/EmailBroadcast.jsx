@@ -2,11 +2,19 @@
 
 import React, { useState, useEffect, useCallback } from 'react';
 import { FaEnvelope, FaSync, FaPaperPlane } from 'react-icons/fa';
-import { getBroadcastEmailPreview, broadcastEmail } from '../../api';
+import {
+  getBroadcastEmailPreview,
+  broadcastEmail,
+  getBroadcastJobs,
+  getBroadcastJob,
+  retryBroadcastJob,
+} from '../../api';
 import styles from '../AdminPage.module.css';
 import { useModalAlert } from '../../contexts/ModalAlertContext';
 import { useConfirmation } from '../../contexts/ConfirmationContext';
 
+const JOB_POLL_INTERVAL_MS = 3000;
+
 const DEFAULT_BODY_SUGGESTION =
   'Здравствуйте!\n\nУ приложения новая ссылка для входа. Пожалуйста, переходите по ней при работе в браузере.\n\nС уважением, администрация.';
 
@@ -23,6 +31,9 @@ function EmailBroadcast() {
   const [recipientCountTelegram, setRecipientCountTelegram] = useState(null);
   const [previewLoading, setPreviewLoading] = useState(false);
   const [sending, setSending] = useState(false);
+  // Рассылка выполняется в фоне на сервере: здесь — последнее задание и его прогресс
+  const [job, setJob] = useState(null);
+  const [retrying, setRetrying] = useState(false);
 
   const loadPreview = useCallback(async () => {
     setPreviewLoading(true);
@@ -44,6 +55,64 @@ function EmailBroadcast() {
     loadPreview();
   }, [loadPreview]);
 
+  useEffect(() => {
+    getBroadcastJobs(1)
+      .then((response) => setJob(response.data[0] ?? null))
+      .catch(() => setJob(null));
+  }, []);
+
+  const reportFinishedJob = useCallback(
+    (data) => {
+      const totalOk = (data.sent_ok_email ?? 0) + (data.sent_ok_telegram ?? 0);
+      if (totalOk === 0) {
+        showAlert(
+          data.failed_count
+            ? `${data.message}. Проверьте SMTP, Telegram и список получателей.`
+            : 'Нет получателей или не удалось отправить сообщения.',
+          'error'
+        );
+      } else if (data.failed_count > 0) {
+        showAlert(`${data.message}. Ошибок доставки: ${data.failed_count}.`, 'error');
+        console.warn('Broadcast failures', data.failed);
+      } else {
+        showAlert(data.message, 'success');
+      }
+    },
+    [showAlert]
+  );
+
+  const jobId = job?.job_id;
+  const jobActive = job != null && job.status !== 'completed';
+
+  useEffect(() => {
+    if (!jobActive) return undefined;
+    const timer = setInterval(async () => {
+      try {
+        const response = await getBroadcastJob(jobId);
+        setJob(response.data);
+        if (response.data.status === 'completed') {
+          reportFinishedJob(response.data);
+        }
+      } catch (error) {
+        console.warn('Broadcast status polling failed', error);
+      }
+    }, JOB_POLL_INTERVAL_MS);
+    return () => clearInterval(timer);
+  }, [jobId, jobActive, reportFinishedJob]);
+
+  async function handleRetry() {
+    setRetrying(true);
+    try {
+      const response = await retryBroadcastJob(jobId);
+      setJob(response.data);
+    } catch (error) {
+      const errorMsg = error.response?.data?.detail || 'Не удалось повторить рассылку';
+      showAlert(errorMsg, 'error');
+    } finally {
+      setRetrying(false);
+    }
+  }
+
   async function handleSubmit(e) {
     e.preventDefault();
     if (!sendEmail && !sendTelegram) {
@@ -92,24 +161,13 @@ function EmailBroadcast() {
         send_telegram: sendTelegram,
       });
       const data = response.data;
-      const failedCount = data.failed?.length ?? 0;
-      const totalOk = (data.sent_ok_email ?? 0) + (data.sent_ok_telegram ?? 0);
-      if (totalOk === 0) {
-        showAlert(
-          failedCount
-            ? `${data.message}. Проверьте SMTP, Telegram и список получателей.`
-            : 'Нет получателей или не удалось отправить сообщения.',
-          'error'
-        );
-      } else if (failedCount > 0) {
-        showAlert(`${data.message}. Ошибок доставки: ${failedCount}.`, 'error');
-        console.warn('Broadcast failures', data.failed);
-      } else {
-        showAlert(data.message, 'success');
+      setJob(data);
+      if (data.status === 'completed') {
+        reportFinishedJob(data);
       }
       await loadPreview();
     } catch (error) {
-      const errorMsg = error.response?.data?.detail || 'Не удалось выполнить рассылку';
+      const errorMsg = error.response?.data?.detail || 'Не удалось поставить рассылку в очередь';
       showAlert(errorMsg, 'error');
     } finally {
       setSending(false);
@@ -232,10 +290,35 @@ function EmailBroadcast() {
             Добавить ссылку для входа (WEB_APP_LOGIN_URL) — в письме и в Telegram
           </label>
 
-          <button type="submit" disabled={sending} className={styles.buttonGreen} style={{ marginTop: '16px' }}>
-            {sending ? 'Отправка…' : 'Отправить рассылку'}
+          <button
+            type="submit"
+            disabled={sending || jobActive}
+            className={styles.buttonGreen}
+            style={{ marginTop: '16px' }}
+          >
+            {sending ? 'Постановка в очередь…' : jobActive ? 'Идёт рассылка…' : 'Отправить рассылку'}
           </button>
         </form>
+
+        {job && (
+          <div style={{ marginTop: '20px', color: '#444', lineHeight: 1.5 }}>
+            <div style={{ fontWeight: 'bold' }}>Последняя рассылка: «{job.message}»</div>
+            <div>
+              Осталось отправить: {job.pending_count} · Ошибок доставки: {job.failed_count}
+            </div>
+            {job.status === 'completed' && job.failed_count > 0 && (
+              <button
+                type="button"
+                onClick={handleRetry}
+                disabled={retrying}
+                className={styles.buttonGrey}
+                style={{ marginTop: '8px' }}
+              >
+                {retrying ? 'Повтор…' : 'Повторить только неудачные'}
+              </button>
+            )}
+          </div>
+        )}
       </div>
     </div>
   );
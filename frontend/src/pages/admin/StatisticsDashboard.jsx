@@ -4,7 +4,7 @@ import React, { useState } from 'react';
 import styles from './StatisticsDashboard.module.css';
 import { FaChartBar, FaHourglassHalf, FaStar, FaChartLine, FaUsersSlash, FaCoins, FaSignInAlt, FaChartPie, FaFileExcel, FaClock } from 'react-icons/fa';
 import DateRangePicker from '../../components/DateRangePicker';
-import { exportConsolidatedReport } from '../../api';
+import { createReportJob, getReportJob, downloadReportFile } from '../../api';
 
 // Импорты всех компонентов-отчётов
 import GeneralStats from './stats/GeneralStats';
@@ -18,6 +18,16 @@ import ActiveUserRatioPage from './stats/ActiveUserRatioPage';
 import AverageSessionDurationPage from './stats/AverageSessionDurationPage';
 import { formatDateForApiFromDate } from '../../utils/dateFormatter';
 
+const REPORT_POLL_INTERVAL_MS = 2000;
+
+const waitForReport = async (job) => {
+    while (job.status === 'queued' || job.status === 'running') {
+        await new Promise((resolve) => setTimeout(resolve, REPORT_POLL_INTERVAL_MS));
+        job = (await getReportJob(job.job_id)).data;
+    }
+    return job;
+};
+
 const StatisticsDashboard = () => {
     const [activeTab, setActiveTab] = useState('general');
     const [startDate, setStartDate] = useState(null);
@@ -30,12 +40,18 @@ const StatisticsDashboard = () => {
             const formattedStartDate = formatDateForApiFromDate(startDate);
             const formattedEndDate = formatDateForApiFromDate(endDate);
             
-            const response = await exportConsolidatedReport(formattedStartDate, formattedEndDate);
+            // Тот же период без изменений в данных — сервер сразу вернёт готовый файл
+            const created = await createReportJob('consolidated', formattedStartDate, formattedEndDate);
+            const job = await waitForReport(created.data);
+            if (job.status !== 'completed') {
+                throw new Error(job.error || 'Отчёт не собран');
+            }
+            const response = await downloadReportFile(job.download_url);
             
             const url = window.URL.createObjectURL(new Blob([response.data]));
             const link = document.createElement('a');
             link.href = url;
-            link.setAttribute('download', `consolidated_report.xlsx`);
+            link.setAttribute('download', job.filename);
             document.body.appendChild(link);
             link.click();
             link.parentNode.removeChild(link);